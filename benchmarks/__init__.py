@@ -0,0 +1,4 @@
+"""Benchmark suite for typst-api.
+
+Run ``python -m benchmarks --help`` from the repository root.
+"""
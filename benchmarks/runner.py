@@ -0,0 +1,350 @@
+"""Run benchmark workloads against CompilerService or the HTTP API.
+
+Results are written as JSON: one entry per (workload, mode) with latency
+percentiles, throughput, error count and peak RSS.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .workloads import WORKLOADS, Workload, load
+
+MODES = ("service", "http")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``samples`` (``q`` in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class RssSampler:
+    """Track peak resident memory of this process and its compile workers."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self) -> None:
+        from typst_api.services.compiler import compiler_service
+        from typst_api.services.executor import current_rss
+
+        # Process-backend workers report their RSS after every compile
+        workers = compiler_service.backend.stats().get("rss", [])
+        self.peak = max(self.peak, current_rss() + sum(workers))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+
+def measure(
+    call: Callable[[], None], iterations: int, concurrency: int, warmup: int
+) -> Dict[str, Any]:
+    """Run ``call`` ``iterations`` times on ``concurrency`` threads."""
+    for _ in range(warmup):
+        call()
+
+    def timed(_) -> Tuple[float, Optional[str]]:
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            return time.perf_counter() - start, str(e)
+        return time.perf_counter() - start, None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        outcomes = list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "min": round(min(latencies), 3) if latencies else 0.0,
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+    }
+
+
+def service_call(workload: Workload) -> Callable[[], None]:
+    """Render ``workload`` through ``CompilerService`` directly."""
+    from typst_api.services.compiler import CompileOptions, compiler_service
+    from typst_api.services.project import ProjectFiles
+
+    project = ProjectFiles(workload.files)
+    options = CompileOptions(output_format=workload.output_format, ppi=workload.ppi)
+
+    def call() -> None:
+        pages, _ = compiler_service.render_project(project, workload.entrypoint, options)
+        if not pages:
+            raise RuntimeError("Compilation produced no output")
+
+    return call
+
+
+def http_call(workload: Workload, base_url: str) -> Callable[[], None]:
+    """Render ``workload`` over HTTP with one keep-alive connection per thread."""
+    url = urlsplit(base_url)
+    local = threading.local()
+
+    if len(workload.files) == 1:
+        path = url.path.rstrip("/") + "/render/raw"
+        payload: Dict[str, Any] = {
+            "source": workload.files[workload.entrypoint].decode("utf-8"),
+            "format": workload.output_format,
+            "ppi": workload.ppi,
+        }
+        if workload.pages:
+            payload["pages"] = workload.pages
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+    else:
+        path = url.path.rstrip("/") + "/render"
+        fields = {
+            "entrypoint": workload.entrypoint,
+            "format": workload.output_format,
+            "ppi": str(workload.ppi),
+        }
+        if workload.pages:
+            fields["pages"] = workload.pages
+        body, content_type = _multipart(fields, ("file", "project.zip", workload.zip_bytes()))
+        headers = {"Content-Type": content_type}
+
+    def call() -> None:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {data[:200]!r}")
+
+    return call
+
+
+def start_local_server(app) -> Tuple[Any, str]:
+    """Serve ``app`` on an ephemeral port in a background thread."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs) -> None:
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Describe every result whose p95 exceeds the baseline by ``tolerance``."""
+    previous = {
+        (r["workload"], r["mode"]): r["latency_ms"]["p95"] for r in baseline["results"]
+    }
+    regressions = []
+    for result in results:
+        before = previous.get((result["workload"], result["mode"]))
+        after = result["latency_ms"]["p95"]
+        if before and after > before * (1 + tolerance):
+            regressions.append(
+                f"{result['workload']} ({result['mode']}): "
+                f"p95 {before:.1f}ms -> {after:.1f}ms"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="typst-api benchmark suite"
+    )
+    parser.add_argument(
+        "-w", "--workload", action="append", choices=list(WORKLOADS),
+        help="workload to run (repeatable; default: all)",
+    )
+    parser.add_argument(
+        "-m", "--mode", action="append", choices=MODES,
+        help="drive CompilerService directly or the HTTP API (default: both)",
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs per workload")
+    parser.add_argument(
+        "--url", help="benchmark a running server instead of an in-process one (http mode)"
+    )
+    parser.add_argument("--config", default="production", help="app config name")
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE",
+        help="config override, e.g. --set COMPILE_BACKEND=process (repeatable)",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="keep the render cache enabled"
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare p95 latency against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="allowed p95 slowdown against --baseline (default: 0.2 = 20%%)",
+    )
+    args = parser.parse_args(argv)
+
+    overrides = dict(item.split("=", 1) for item in args.set)
+    if not args.cache:
+        overrides.setdefault("RENDER_CACHE_MAX_BYTES", "0")
+    for key, value in overrides.items():
+        os.environ[f"TYPST_API_{key}"] = value
+
+    import typst
+
+    from typst_api import create_app
+
+    app = create_app(args.config)
+    modes = args.mode or list(MODES)
+    server = None
+    base_url = args.url
+    if "http" in modes and not base_url:
+        server, base_url = start_local_server(app)
+
+    results = []
+    try:
+        for workload in load(args.workload):
+            for mode in modes:
+                call = (
+                    service_call(workload)
+                    if mode == "service"
+                    else http_call(workload, base_url)
+                )
+                # RSS of a remote server is not visible from here
+                track_rss = mode == "service" or not args.url
+                sampler = RssSampler() if track_rss else None
+                if sampler:
+                    with sampler:
+                        stats = measure(call, args.iterations, args.concurrency, args.warmup)
+                else:
+                    stats = measure(call, args.iterations, args.concurrency, args.warmup)
+                result = {
+                    "workload": workload.name,
+                    "description": workload.description,
+                    "mode": mode,
+                    "format": workload.output_format,
+                    "input_bytes": workload.size,
+                    **stats,
+                    "peak_rss_bytes": sampler.peak if sampler else None,
+                }
+                results.append(result)
+                print(_summary_line(result), file=sys.stderr)
+    finally:
+        if server is not None:
+            server.shutdown()
+        from typst_api.services.compiler import compiler_service
+
+        compiler_service.backend.shutdown()
+
+    report = {
+        "meta": {
+            "run_id": uuid.uuid4().hex,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "typst": getattr(typst, "__version__", None),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": args.config,
+            "overrides": overrides,
+            "url": args.url,
+        },
+        "results": results,
+    }
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+def _summary_line(result: Dict[str, Any]) -> str:
+    latency = result["latency_ms"]
+    rss = result["peak_rss_bytes"]
+    return (
+        f"{result['workload']:<16} {result['mode']:<8} "
+        f"p50 {latency['p50']:>9.1f}ms  p95 {latency['p95']:>9.1f}ms  "
+        f"p99 {latency['p99']:>9.1f}ms  {result['throughput_rps']:>7.2f} req/s  "
+        f"rss {rss / 2**20 if rss else 0:>7.1f}MiB  errors {result['errors']}"
+    )
+
+
+def _multipart(
+    fields: Dict[str, str], file: Tuple[str, str, bytes]
+) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode("utf-8")
+        )
+    name, filename, data = file
+    parts.append(
+        (
+            f"--{boundary}\r\nContent-Disposition: form-data; "
+            f'name="{name}"; filename="{filename}"\r\n'
+            "Content-Type: application/zip\r\n\r\n"
+        ).encode("utf-8")
+        + data
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
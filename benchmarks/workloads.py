@@ -0,0 +1,178 @@
+"""Benchmark workloads: generated Typst projects of different shapes."""
+
+import io
+import random
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+@dataclass
+class Workload:
+    """A project plus the render options it is benchmarked with."""
+
+    name: str
+    description: str
+    files: Dict[str, bytes]
+    entrypoint: str = "main.typ"
+    output_format: str = "pdf"
+    ppi: float = 144.0
+    # PNG/SVG page selection sent over HTTP ("all" for multi-page output)
+    pages: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for data in self.files.values())
+
+    def zip_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+            for path, data in self.files.items():
+                archive.writestr(path, data)
+        return buf.getvalue()
+
+
+def hello() -> Workload:
+    """``examples/hello.typ``: a one-page document with a table."""
+    return Workload(
+        name="hello",
+        description="examples/hello.typ (single file, one page)",
+        files={"main.typ": (EXAMPLES_DIR / "hello.typ").read_bytes()},
+    )
+
+
+def multi_file(chapters: int = 20) -> Workload:
+    """A book split across many imported chapter files."""
+    rng = random.Random(1)
+    files = {
+        "main.typ": (
+            '#import "lib/style.typ": *\n#show: book\n'
+            + "".join(f'#include "chapters/ch{i:02d}.typ"\n' for i in range(chapters))
+        ).encode()
+    }
+    files["lib/style.typ"] = (
+        "#let book(body) = {\n"
+        '  set page(numbering: "1")\n'
+        "  set heading(numbering: \"1.1\")\n"
+        "  body\n"
+        "}\n"
+        "#let note(body) = block(fill: luma(230), inset: 8pt, body)\n"
+    ).encode()
+    for i in range(chapters):
+        paragraphs = "\n\n".join(_lorem(rng, 120) for _ in range(4))
+        files[f"chapters/ch{i:02d}.typ"] = (
+            '#import "../lib/style.typ": note\n'
+            f"= Chapter {i + 1}\n{paragraphs}\n"
+            f"#note[Summary of chapter {i + 1}.]\n"
+            "#table(columns: 3, ..range(12).map(n => [#n]))\n"
+        ).encode()
+    return Workload(
+        name="multi_file",
+        description=f"ZIP project with {chapters} imported chapter files",
+        files=files,
+    )
+
+
+def cjk(pages: int = 10) -> Workload:
+    """Dense CJK text, exercising font fallback and shaping."""
+    rng = random.Random(2)
+    chars_per_page = 1200
+    body = "\n\n".join(
+        "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(chars_per_page))
+        for _ in range(pages)
+    )
+    source = (
+        '#set text(lang: "zh", font: ("Noto Sans CJK SC", "Noto Sans CJK TC"))\n'
+        "= 基准测试\n" + body + "\n"
+    )
+    return Workload(
+        name="cjk",
+        description=f"single file, ~{pages * chars_per_page} CJK characters",
+        files={"main.typ": source.encode("utf-8")},
+    )
+
+
+def images(count: int = 24, size: int = 256) -> Workload:
+    """A ZIP with many incompressible PNG images placed on pages."""
+    rng = random.Random(3)
+    files = {}
+    figures = []
+    for i in range(count):
+        name = f"img/{i:03d}.png"
+        files[name] = _noise_png(rng, size, size)
+        figures.append(f'#image("{name}", width: 45%)')
+    files["main.typ"] = ("= Image gallery\n" + "\n".join(figures) + "\n").encode()
+    return Workload(
+        name="images",
+        description=f"ZIP project with {count} {size}x{size} PNG images",
+        files=files,
+    )
+
+
+def multi_page_png(pages: int = 30) -> Workload:
+    """A long document rendered to PNG, every page."""
+    rng = random.Random(4)
+    body = "\n".join(
+        f"= Section {i + 1}\n{_lorem(rng, 250)}\n#pagebreak()" for i in range(pages)
+    )
+    return Workload(
+        name="multi_page_png",
+        description=f"{pages} pages rendered to PNG at 144 ppi",
+        files={"main.typ": body.encode()},
+        output_format="png",
+        pages="all",
+    )
+
+
+WORKLOADS: Dict[str, Callable[[], Workload]] = {
+    "hello": hello,
+    "multi_file": multi_file,
+    "cjk": cjk,
+    "images": images,
+    "multi_page_png": multi_page_png,
+}
+
+
+def load(names: Optional[List[str]] = None) -> List[Workload]:
+    """Build the named workloads (all of them by default)."""
+    return [WORKLOADS[name]() for name in (names or list(WORKLOADS))]
+
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam"
+).split()
+
+
+def _lorem(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _noise_png(rng: random.Random, width: int, height: int) -> bytes:
+    """Encode random RGB pixels as a PNG without an imaging library."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    row_bytes = width * 3
+    raw = b"".join(
+        b"\x00" + rng.getrandbits(row_bytes * 8).to_bytes(row_bytes, "big")
+        for _ in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
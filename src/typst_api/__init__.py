@@ -2,26 +2,143 @@
 
 __version__ = "2.0.0"
 
-from flask import Flask
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:  # Flask is imported by the factories, not by ``import typst_api``
+    from flask import Flask
 
-def create_app(config_name: str = "default") -> Flask:
+
+def create_app(config_name: str = "default") -> "Flask":
     """Application factory pattern."""
-    from .config import get_config
+    from .routes.assets import assets_bp
     from .routes.health import health_bp
+    from .routes.jobs import jobs_bp
+    from .routes.packages import packages_bp
     from .routes.render import render_bp
+    from .routes.sessions import sessions_bp
+    from .routes.templates import templates_bp
+    from .services.admission import admission_service
+    from .services.assets import asset_service
+    from .services.compiler import compiler_service
+    from .services.health import health_service
+    from .services.jobs import job_service
+    from .services.metrics import metrics
+    from .services.packages import package_service
+    from .services.sessions import session_service
+    from .services.templates import template_service
+    from .utils.streams import SpoolingRequest
 
-    app = Flask(__name__)
-    app.config.from_object(get_config(config_name))
+    app = _configured_app(config_name)
+    app.request_class = SpoolingRequest
+
+    # Before the compiler service, whose pools load packages from the cache
+    # and warm up registered templates
+    package_service.init_app(app)
+    template_service.init_app(app)
+    admission_service.init_app(app)
+    compiler_service.init_app(app)
+    asset_service.init_app(app)
+    job_service.init_app(app)
+    session_service.init_app(app)
+    health_service.init_app(app)
+    metrics.init_app(app)
 
     # Register blueprints
     app.register_blueprint(health_bp)
     app.register_blueprint(render_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(sessions_bp)
+    app.register_blueprint(assets_bp)
+    app.register_blueprint(packages_bp)
+    app.register_blueprint(templates_bp)
+
+    return app
+
+
+def create_async_app(config_name: str = "default"):
+    """Application factory for ASGI servers (uvicorn, hypercorn, ...).
+
+    Same routes and services as :func:`create_app`; uploads and downloads
+    are handled on the event loop and views run in a thread pool.
+    """
+    from .asgi import AsyncApp
+
+    return AsyncApp(create_app(config_name))
+
+
+def _configured_app(config_name: str) -> "Flask":
+    from flask import Flask
 
+    from .config import get_config
+
+    app = Flask(__name__)
+    app.config.from_object(get_config(config_name))
+    app.config.from_prefixed_env("TYPST_API")
     return app
 
 
-def main():
-    """CLI entry point."""
+def main(argv=None):
+    """CLI entry point.
+
+    ``typst-api`` runs the Flask development server; ``typst-api serve``
+    runs the production server (``--async`` for the ASGI variant);
+    ``typst-api packages`` lists or seeds the offline package cache.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="typst-api")
+    commands = parser.add_subparsers(dest="command")
+    serve_cmd = commands.add_parser("serve", help="run the production server")
+    serve_cmd.add_argument("--config", default="default", help="config name")
+    serve_cmd.add_argument(
+        "--async", dest="asynchronous", action="store_true", help="run the ASGI app"
+    )
+    packages_cmd = commands.add_parser("packages", help="manage the package cache")
+    packages_cmd.add_argument("--config", default="default", help="config name")
+    packages_cmd.add_argument(
+        "--namespace", default="preview", help="namespace for seeded packages"
+    )
+    packages_cmd.add_argument(
+        "--replace", action="store_true", help="overwrite installed versions"
+    )
+    packages_cmd.add_argument("action", choices=["list", "seed"])
+    packages_cmd.add_argument("tarballs", nargs="*", help="package tarballs to seed")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        from .server import serve
+
+        serve(args.config, args.asynchronous)
+        return
+    if args.command == "packages":
+        _packages_command(args)
+        return
+
+    from .services.health import health_service
+
     app = create_app()
+    health_service.start()  # warm up in the background
     app.run(host="0.0.0.0", port=8000)
+
+
+def _packages_command(args) -> None:
+    from .services.packages import PackageError, package_service
+
+    package_service.init_app(_configured_app(args.config))
+    cache = package_service.cache
+    if args.action == "list":
+        for entry in cache.packages():
+            print(f"{entry['package']}\t{entry['bytes']}")
+        return
+    failed = False
+    for path in args.tarballs:
+        try:
+            with open(path, "rb") as f:
+                spec, installed = cache.install(f, args.namespace, args.replace)
+        except (OSError, PackageError) as e:
+            print(f"{path}: {e}")
+            failed = True
+            continue
+        print(f"{spec} {'installed' if installed else 'already cached'}")
+    if failed:
+        raise SystemExit(1)
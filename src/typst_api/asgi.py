@@ -0,0 +1,235 @@
+"""ASGI front end: async I/O on the event loop, request handling in threads.
+
+The Flask views (and with them the compiler service, parsers and routes)
+are reused unchanged. What moves onto the event loop is everything that
+waits on the client: the request body is spooled asynchronously before a
+thread is involved, and response bodies are sent with backpressure from
+the loop. Threads from a bounded executor only run the view itself and
+produce response chunks, so slow uploads and downloads cost a coroutine
+rather than a thread.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+
+from .utils.streams import DEFAULT_SPOOL_MAX_MEMORY, DISCONNECTED_KEY
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class AsyncApp:
+    """ASGI 3 application wrapping the Flask app.
+
+    ``threads`` (default ``SERVER_ASYNC_THREADS``) bounds how many requests
+    run their view at once; requests still uploading or downloading do not
+    count against it.
+    """
+
+    def __init__(self, app: Flask, threads: Optional[int] = None):
+        self.app = app
+        self.threads = threads or app.config.get("SERVER_ASYNC_THREADS", 16)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def config(self):
+        return self.app.config
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="typst-api-asgi"
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """Shut the executor down after in-flight views finish."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                from .services.health import health_service
+
+                # Warm up in the background; /readyz fails until it is done
+                health_service.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, self.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        config = self.app.config
+        body = SpooledTemporaryFile(
+            max_size=config.get("UPLOAD_SPOOL_MAX_MEMORY", DEFAULT_SPOOL_MAX_MEMORY),
+            mode="w+b",
+            dir=config.get("UPLOAD_SPOOL_DIR"),
+        )
+        try:
+            complete = await _read_body(receive, body, config.get("MAX_CONTENT_LENGTH"))
+            if complete is None:
+                return  # client went away mid-upload
+            if not complete:
+                await _send_error(send, 413, "Request body too large")
+                return
+
+            hung_up = threading.Event()
+            watcher = asyncio.ensure_future(_watch_disconnect(receive, hung_up))
+            try:
+                environ = build_environ(scope, body)
+                environ[DISCONNECTED_KEY] = hung_up.is_set
+                await self._respond(environ, send, hung_up)
+            finally:
+                watcher.cancel()
+        finally:
+            body.close()
+
+    async def _respond(self, environ: Dict[str, Any], send: Send, hung_up) -> None:
+        loop = asyncio.get_running_loop()
+        started: List[Tuple[str, List[Tuple[str, str]]]] = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [(status, headers)]
+
+        def call() -> Tuple[Any, Any]:
+            result = self.app(environ, start_response)
+            return result, iter(result)
+
+        result, chunks = await loop.run_in_executor(self.executor, call)
+        try:
+            status, headers = started[0]
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers
+                    ],
+                }
+            )
+            # Chunks are produced in a thread (file reads, streamed batch
+            # compiles) and sent from the loop, which waits on slow clients
+            while not hung_up.is_set():
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+
+async def _read_body(
+    receive: Receive, body: SpooledTemporaryFile, max_length: Optional[int]
+) -> Optional[bool]:
+    """Spool the request body; False when it exceeds ``max_length``, None on disconnect."""
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if max_length is not None and size > max_length:
+            return False
+        body.write(chunk)
+        if not message.get("more_body", False):
+            body.seek(0)
+            return True
+
+
+async def _watch_disconnect(receive: Receive, hung_up: threading.Event) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            hung_up.set()
+            return
+
+
+async def _send_error(send: Send, status: int, message: str) -> None:
+    body = json.dumps({"error": message}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def build_environ(scope: Scope, body) -> Dict[str, Any]:
+    """WSGI environ for an ASGI HTTP scope whose body has been spooled."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    body.seek(0, 2)
+    length = body.tell()
+    body.seek(0)
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries paths as latin-1 decoded bytes
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        # The body is complete, so its length is known even if it was chunked
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+            continue
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
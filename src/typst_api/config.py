@@ -1,4 +1,8 @@
-"""Application configuration."""
+"""Application configuration.
+
+Any setting can be overridden with a ``TYPST_API_``-prefixed environment
+variable, e.g. ``TYPST_API_COMPILE_BACKEND=process``.
+"""
 
 
 class BaseConfig:
@@ -7,6 +11,139 @@ class BaseConfig:
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
     TESTING = False
 
+    # Uploads are spooled in memory up to this size, then to UPLOAD_SPOOL_DIR
+    UPLOAD_SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # 8MB
+    UPLOAD_SPOOL_DIR = None  # defaults to the system temp directory
+
+    # ZIP uploads are read into memory; these guard against zip bombs
+    ZIP_MAX_ENTRIES = 10000
+    ZIP_MAX_UNCOMPRESSED_BYTES = 200 * 1024 * 1024  # 200MB
+    ZIP_EXTRACT_DIR = None  # multi-file projects; defaults to /dev/shm if writable
+
+    # Render output cache; set RENDER_CACHE_MAX_BYTES to 0 to disable memory tier
+    RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+    RENDER_CACHE_DIR = None  # optional on-disk tier shared by workers
+    RENDER_CACHE_DIR_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+
+    # GET /render/<hash>: opt in to store POSTed sources/projects in the asset
+    # store and link them via Content-Location. Costs a disk write per render
+    # and makes every submitted source readable by hash through GET /assets.
+    # GET responses are immutable for a given hash
+    RENDER_STORE_SUBMISSIONS = False
+    RENDER_GET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+    RENDER_MAX_OUTPUTS = 8  # exports per request with ``outputs`` (formats x ppi)
+    # Single SVG responses are compressed for clients accepting one of these
+    # (first match wins; "br" needs the brotli module); [] disables
+    RENDER_CONTENT_ENCODINGS = ["br", "gzip"]
+
+    # Thumbnails (/render/thumbnail); resizing and JPEG/WebP need Pillow
+    THUMBNAIL_DEFAULT_SIZE = 256  # box in pixels when neither width nor height is given
+    THUMBNAIL_MAX_SIZE = 2048  # largest accepted width/height
+    THUMBNAIL_QUALITY = 80  # JPEG/WebP quality
+    THUMBNAIL_BASE_PPI = 72.0  # first render of an uncached document, then downscaled
+    THUMBNAIL_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32MB
+    THUMBNAIL_CACHE_DIR = None  # optional on-disk tier shared by workers
+    THUMBNAIL_CACHE_DIR_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+    # Warm compiler pool; fonts are scanned once and shared by all instances
+    COMPILER_POOL_SIZE = 4  # 0 compiles with a fresh world per request
+    COMPILER_POOL_MAX_USES = 1000  # recycle an instance after N compiles
+    COMPILER_IGNORE_SYSTEM_FONTS = False
+
+    # Fonts; the index behind GET /fonts is cached and rebuilt when a font dir changes
+    FONT_PATHS = []  # extra font directories (list, or os.pathsep-separated string)
+    FONT_INDEX_CACHE_FILE = None  # defaults to <tempdir>/typst-api-font-index.json
+
+    # Offline Typst package cache (@preview/... imports), shared by all workers
+    PACKAGE_DIR = None  # defaults to <tempdir>/typst-api-packages
+    PACKAGE_DIR_MAX_BYTES = 1024 * 1024 * 1024  # 1GB; least recently used evicted
+    PACKAGE_DOWNLOAD = False  # let Typst fetch packages missing from the cache
+    PACKAGE_WARM_COUNT = 8  # most recently used packages loaded at worker start
+
+    # Startup warm-up: compile these documents in each format before a worker
+    # reports ready, so the first request runs at steady-state latency
+    WARMUP_ENABLED = True
+    WARMUP_DOCUMENTS = []  # extra .typ files or dirs (list or os.pathsep string)
+    WARMUP_FORMATS = ["pdf", "png", "svg"]
+
+    # Compile backend: "inline" (request thread) or "process" (worker processes)
+    COMPILE_BACKEND = "inline"
+    COMPILE_WORKERS = None  # defaults to os.cpu_count()
+    COMPILE_MAX_PENDING = 64  # running + queued compiles before 503
+    COMPILE_WORKER_MAX_JOBS = 500  # recycle a worker after N compiles
+    COMPILE_WORKER_MAX_RSS_BYTES = 1024 * 1024 * 1024  # ...or above 1GB RSS
+
+    # Per-compile limits; a compile over a limit (or whose client hung up) is
+    # killed. Only the process backend enforces them (inline compiles run to
+    # completion, and setting a limit logs a warning); None means the process
+    # backend's default below and no limit inline
+    COMPILE_TIMEOUT = None  # seconds of wall-clock time; default 60 (0 = unlimited)
+    COMPILE_MAX_MEMORY_BYTES = None  # worker RSS; default 2GB (0 = unlimited)
+    # Overrides by route, e.g. {"/render/batch": {"timeout": 300}}; "job" for /jobs
+    COMPILE_ROUTE_LIMITS = {}
+
+    # Admission control; overflow gets 429 (client limits) or 503 (node saturated)
+    # Compiles at once per worker; defaults to os.cpu_count(), capped by
+    # COMPILER_POOL_SIZE (inline) or COMPILE_WORKERS (process)
+    ADMISSION_MAX_IN_FLIGHT = None
+    ADMISSION_QUEUE_MAX = 32  # compiles waiting for a slot before 503
+    ADMISSION_QUEUE_TIMEOUT = 10  # seconds a compile may wait for a slot
+    ADMISSION_CLIENT_RATE = 0  # render requests per second per client (0 = unlimited)
+    ADMISSION_CLIENT_BURST = 20  # token bucket size for ADMISSION_CLIENT_RATE
+    ADMISSION_CLIENT_MAX_IN_FLIGHT = 16  # concurrent render requests per client
+    ADMISSION_CLIENT_HEADER = "X-API-Key"  # clients are keyed by this header, else by IP
+
+    # Batch rendering (/render/batch)
+    BATCH_MAX_RECORDS = 10000
+    BATCH_CONCURRENCY = 4  # records compiled in parallel per batch request
+
+    # Asynchronous jobs (/jobs)
+    JOB_BACKEND = "memory"  # "memory" (per process) or "redis" (shared)
+    JOB_REDIS_URL = "redis://localhost:6379/0"
+    JOB_WORKERS = 2  # background job threads per process
+    JOB_QUEUE_MAX = 1000  # queued jobs before 503
+    JOB_RESULT_TTL = 3600  # seconds a finished job and its result are kept
+    JOB_MAX_RESULTS = 1000  # finished jobs kept in memory (memory backend)
+
+    # Live preview sessions (/sessions); each holds a compiler in its worker
+    SESSION_MAX = 32  # live sessions per worker process before 503
+    SESSION_TTL = 600  # seconds an idle session is kept
+    SESSION_DIR = None  # session project roots; defaults to ZIP_EXTRACT_DIR
+
+    # Content-addressed asset store (/assets, /projects), shared by all workers
+    ASSET_STORE_DIR = None  # defaults to <tempdir>/typst-api-assets
+    ASSET_STORE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB; least recently used evicted
+
+    # Template registry (/templates): versions are stored extracted, never
+    # evicted, and warmed with the other WARMUP_DOCUMENTS
+    TEMPLATE_DIR = None  # defaults to <tempdir>/typst-api-templates
+
+    # Health checks: /livez never compiles; /health and /readyz report a
+    # compile probe run in the background every HEALTH_PROBE_INTERVAL seconds
+    HEALTH_PROBE_INTERVAL = 10.0
+    HEALTH_PROBE_TIMEOUT = 10.0
+    # /readyz fails once compiles running or queued per compile slot reach this,
+    # i.e. by default once as many compiles wait as run, well before 503s
+    READY_MAX_SATURATION = 2.0
+
+    # Observability
+    METRICS_ENABLED = True  # expose GET /metrics
+    SERVER_TIMING_HEADER = True  # per-stage Server-Timing response header
+
+    # Production server (``typst-api serve``)
+    SERVER_BIND = "0.0.0.0:8000"
+    SERVER_WORKERS = None  # defaults to os.cpu_count()
+    SERVER_THREADS = 8  # threads per worker process
+    SERVER_KEEPALIVE = 5  # seconds
+    SERVER_BACKLOG = 2048
+    SERVER_TIMEOUT = 120  # seconds before a silent worker is restarted
+    SERVER_GRACEFUL_TIMEOUT = 30  # seconds to drain on reload/shutdown
+    SERVER_MAX_REQUESTS = 0  # restart a worker after N requests (0 = never)
+    SERVER_MAX_REQUESTS_JITTER = 0
+    SERVER_PRELOAD = True  # import typst and build the app before forking
+    SERVER_ASYNC = False  # serve the ASGI app (uvicorn workers) instead of gthread
+    SERVER_ASYNC_THREADS = 16  # per worker: requests running their view at once
+
 
 class DevelopmentConfig(BaseConfig):
     """Development configuration."""
@@ -18,6 +155,7 @@ class TestingConfig(BaseConfig):
     """Testing configuration."""
 
     TESTING = True
+    WARMUP_ENABLED = False  # every test builds its own app
 
 
 class ProductionConfig(BaseConfig):
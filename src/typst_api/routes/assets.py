@@ -0,0 +1,81 @@
+"""Content-addressed asset routes."""
+
+import hashlib
+import io
+
+from flask import Blueprint, jsonify, request, send_file, url_for
+
+from ..services.assets import asset_service, is_digest
+from ..services.compiler import compiler_service
+from ..services.metrics import metrics
+from .render import parse_zip_request
+
+assets_bp = Blueprint("assets", __name__)
+
+
+@assets_bp.route("/assets", methods=["PUT", "POST"])
+def put_asset():
+    """Store the raw request body; returns its SHA-256 hash.
+
+    201 if the asset is new, 200 if it was already stored.
+    """
+    with metrics.stage("upload"):
+        data = request.get_data(cache=False)
+    return _stored(data)
+
+
+@assets_bp.route("/assets/<digest>", methods=["PUT"])
+def put_asset_at(digest):
+    """Store the raw body under ``digest``; 400 if the body does not match it."""
+    if not is_digest(digest):
+        return jsonify({"error": "Asset hash must be a sha256 hex digest"}), 400
+    with metrics.stage("upload"):
+        data = request.get_data(cache=False)
+    actual = hashlib.sha256(data).hexdigest()
+    if actual != digest:
+        return jsonify({"error": "Body does not match hash", "hash": actual}), 400
+    return _stored(data)
+
+
+@assets_bp.route("/assets/<digest>", methods=["GET", "HEAD"])
+def get_asset(digest):
+    """Return a stored asset (``HEAD`` checks whether it is stored)."""
+    data = asset_service.store.get(digest)
+    if data is None:
+        return jsonify({"error": "Asset not found", "missing": [digest]}), 404
+    return send_file(
+        io.BytesIO(data),
+        mimetype="application/octet-stream",
+        etag=digest,
+        conditional=True,
+        max_age=31536000,
+    )
+
+
+@assets_bp.route("/projects", methods=["PUT", "POST"])
+def put_project():
+    """Store every file of a ZIP project plus a manifest.
+
+    The ZIP is sent as the raw body (``Content-Type: application/zip``) or
+    as the multipart field ``file``. The returned ``hash`` can be passed as
+    ``project`` to any render endpoint; ``files`` maps each path to its
+    asset hash.
+    """
+    with metrics.stage("upload"):
+        parsed, error = parse_zip_request()
+    if error:
+        return error
+    project, error = compiler_service.load_zip(parsed[0])
+    if error:
+        return error
+    if not project.files:
+        return jsonify({"error": "Project is empty"}), 400
+    digest, files = asset_service.store.put_project(project)
+    return jsonify({"hash": digest, "files": files}), 201
+
+
+def _stored(data):
+    digest, created = asset_service.store.put(data)
+    response = jsonify({"hash": digest, "size": len(data)})
+    response.headers["Location"] = url_for("assets.get_asset", digest=digest)
+    return response, 201 if created else 200
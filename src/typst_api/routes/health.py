@@ -1,8 +1,10 @@
 """Health and status routes."""
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, current_app, jsonify
 
 from ..services.compiler import compiler_service
+from ..services.health import health_service
+from ..services.metrics import metrics
 
 health_bp = Blueprint("health", __name__)
 
@@ -22,13 +24,36 @@ def index():
 
 @health_bp.route("/health", methods=["GET"])
 def health():
-    """Health check - verifies typst-py can compile."""
-    data, status_code = compiler_service.health_check()
+    """Health check - the last background compiler probe."""
+    data, status_code = health_service.health()
     return jsonify(data), status_code
 
 
+@health_bp.route("/livez", methods=["GET"])
+def livez():
+    """Liveness - the process is serving requests; never compiles."""
+    return jsonify({"status": "alive"})
+
+
+@health_bp.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness - compiler probe passing and compile slots not saturated."""
+    data, status_code = health_service.readiness()
+    response = jsonify(data)
+    response.headers["Cache-Control"] = "no-store"
+    return response, status_code
+
+
 @health_bp.route("/fonts", methods=["GET"])
 def list_fonts():
-    """List available fonts (requires Typst CLI binary)."""
+    """List available font families and variants."""
     data, status_code = compiler_service.list_fonts()
     return jsonify(data), status_code
+
+
+@health_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text-format metrics for this worker process."""
+    if not current_app.config.get("METRICS_ENABLED", True):
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,97 @@
+"""Asynchronous render job routes."""
+
+from flask import Blueprint, jsonify, request, url_for
+
+from ..services.admission import admission_limited
+from ..services.compiler import compiler_service
+from ..services.jobs import (
+    FAILED,
+    SUCCEEDED,
+    JobSpec,
+    QueueFullError,
+    job_service,
+    options_from_dict,
+)
+from .render import parse_project_request
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/jobs", methods=["POST"])
+@admission_limited
+def submit_job():
+    """Queue a render and return its id immediately.
+
+    Accepts the same parameters as ``POST /render`` (ZIP ``file``) or
+    ``POST /render/raw`` (``source``), including asset references, plus:
+        priority:  integer, higher runs first (default: 0)
+    """
+    parsed, error = parse_project_request()
+    if error:
+        return error
+    project, entrypoint, options = parsed
+    if options.outputs:
+        return jsonify({"error": "outputs is not supported for jobs"}), 400
+    if request.is_json:
+        priority_raw = (request.get_json(silent=True) or {}).get("priority")
+    else:
+        priority_raw = request.values.get("priority")
+
+    try:
+        priority = int(priority_raw or 0)
+    except (TypeError, ValueError):
+        return jsonify({"error": f"Invalid priority value: {priority_raw}"}), 400
+
+    try:
+        job = job_service.submit(JobSpec(project, entrypoint, options), priority)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
+    response = jsonify(_describe(job))
+    response.headers["Location"] = url_for("jobs.get_job", job_id=job["id"])
+    return response, 202
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Report a job's state."""
+    job = job_service.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_describe(job)), 200
+
+
+@jobs_bp.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """Return a finished job's output, as ``POST /render`` would."""
+    job = job_service.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == FAILED:
+        return jsonify({"error": job["error"], "details": job["details"]}), 500
+    if job["status"] != SUCCEEDED:
+        return jsonify({"error": "Job not finished", "status": job["status"]}), 409
+
+    pages = job_service.result(job_id)
+    if not pages:
+        return jsonify({"error": "Compilation produced no output"}), 500
+    return compiler_service.send_pages(pages, options_from_dict(job["options"]))
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued job, or discard a finished job and its result."""
+    job = job_service.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_describe(job)), 200
+
+
+def _describe(job):
+    info = {k: v for k, v in job.items() if k != "options"}
+    info["format"] = job["options"]["output_format"]
+    info["status_url"] = url_for("jobs.get_job", job_id=job["id"])
+    info["result_url"] = url_for("jobs.get_job_result", job_id=job["id"])
+    return info
@@ -0,0 +1,57 @@
+"""Offline Typst package cache routes."""
+
+from flask import Blueprint, jsonify, request
+
+from ..services.metrics import metrics
+from ..services.packages import PackageError, PackageSpec, package_service
+from ..utils.streams import spool_request_body
+
+packages_bp = Blueprint("packages", __name__)
+
+
+@packages_bp.route("/packages", methods=["GET"])
+def list_packages():
+    """Installed packages, most recently used first."""
+    cache = package_service.cache
+    stats = cache.stats()
+    stats["count"] = stats.pop("packages")
+    return jsonify({"packages": cache.packages(), **stats}), 200
+
+
+@packages_bp.route("/packages", methods=["PUT", "POST"])
+def seed_package():
+    """Install a package tarball into the cache.
+
+    The tarball is sent as the raw body or as the multipart field
+    ``file``. Query parameters: ``namespace`` (default ``preview``) and
+    ``replace`` to overwrite an installed version. 201 if the package was
+    installed, 200 if it was already cached.
+    """
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None:
+            return jsonify({"error": "No file uploaded", "field": "file"}), 400
+        stream = upload.stream
+    else:
+        stream = spool_request_body(request)
+
+    namespace = request.args.get("namespace", "preview")
+    replace = request.args.get("replace", "").lower() in ("1", "true", "yes")
+    try:
+        with metrics.stage("upload"):
+            spec, installed = package_service.cache.install(stream, namespace, replace)
+    except PackageError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    return jsonify({"package": str(spec), "installed": installed}), 201 if installed else 200
+
+
+@packages_bp.route("/packages/<namespace>/<name>/<version>", methods=["DELETE"])
+def delete_package(namespace, name, version):
+    """Remove one package version from the cache."""
+    try:
+        spec = PackageSpec.create(namespace.lstrip("@"), name, version)
+    except PackageError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    if not package_service.cache.remove(spec):
+        return jsonify({"error": "Package not found", "package": str(spec)}), 404
+    return jsonify({"package": str(spec), "status": "removed"}), 200
@@ -1,14 +1,40 @@
 """Render routes for Typst compilation."""
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.datastructures import FileStorage
 
+from ..services.admission import admission_limited
+from ..services.assets import is_digest, parse_asset_refs
 from ..services.compiler import CompileOptions, compiler_service
-from ..utils.parsers import VALID_FORMATS, parse_format, parse_ppi, parse_sys_inputs
+from ..services.metrics import metrics
+from ..services.postprocess import PostProcessError, resolve_stages
+from ..services.project import ProjectFiles, normalize_path
+from ..services.thumbnails import THUMBNAIL_FORMATS, ThumbnailOptions
+from ..utils.parsers import (
+    VALID_ARCHIVES,
+    VALID_BATCH_OUTPUTS,
+    VALID_FORMATS,
+    parse_archive,
+    parse_bounded_int,
+    parse_format,
+    parse_outputs,
+    parse_pages,
+    parse_ppi,
+    parse_records,
+    parse_sys_inputs,
+)
+from ..utils.streams import spool_request_body
 
 render_bp = Blueprint("render", __name__)
 
+# Raw request bodies accepted instead of multipart/JSON; parameters then
+# come from the query string
+ZIP_MIMETYPES = ("application/zip", "application/x-zip-compressed")
+SOURCE_MIMETYPES = ("text/plain", "text/x-typst", "application/x-typst")
+
 
 @render_bp.route("/render", methods=["POST"])
+@admission_limited
 def render_typst():
     """Render a Typst ZIP project to PDF/PNG/SVG.
 
@@ -18,21 +44,201 @@ def render_typst():
         format:      Output format - pdf, png, svg (default: pdf)
         ppi:         Pixels per inch for PNG output (default: 144.0)
         sys_inputs:  JSON object of key-value strings passed to Typst
+        pages:       PNG/SVG page selection, e.g. 1-3,7 or all (default: first page)
+        archive:     Multi-page container - zip, multipart (default: zip)
+        postprocess: Post-export stages, e.g. linearize or minify (default: none)
+
+    The ZIP may also be sent as the raw body (``Content-Type: application/zip``,
+    chunked transfer encoding allowed) with the parameters in the query string.
+
+    Stored assets (see ``PUT /assets``) can stand in for uploaded files:
+        project:     hash of a stored project to start from
+        assets:      JSON object of {path: asset hash}
+    The ZIP is then optional and only carries the files that changed.
     """
-    # --- file validation ---
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded", "field": "file"}), 400
+    with metrics.stage("upload"):
+        refs, ref_err = parse_asset_request()
+        if ref_err:
+            return ref_err
+        parsed, error = parse_zip_request(require_file=refs is None)
+    if error:
+        return error
+    zip_file, entrypoint, options = parsed
+    return compiler_service.compile_zip(zip_file, entrypoint, options, refs)
+
+
+@render_bp.route("/render/raw", methods=["POST"])
+@admission_limited
+def render_raw():
+    """Render raw Typst source code to PDF/PNG/SVG (no ZIP needed).
+
+    Accepts JSON body:
+        {
+            "source":     "Hello *World*",          // required
+            "format":     "pdf",                    // optional, default: pdf
+            "ppi":        144.0,                    // optional, for PNG
+            "sys_inputs": {"name": "value"},        // optional
+            "pages":      "1-3,7",                  // optional, PNG/SVG only
+            "archive":    "zip",                    // optional, zip | multipart
+            "postprocess": ["minify"]               // optional, post-export stages
+        }
+
+    Also accepts form data:
+        source:      Typst source code (required)
+        format:      pdf | png | svg (default: pdf)
+        ppi:         float (default: 144.0)
+        sys_inputs:  JSON string
+        pages:       PNG/SVG page selection
+        archive:     zip | multipart (default: zip)
+        postprocess: comma-separated stages
+
+    Or the source as the raw body (``Content-Type: text/plain``) with the
+    other parameters in the query string.
+
+    ``project``/``assets`` reference stored assets the source can import,
+    as for ``POST /render``; the source becomes ``main.typ``.
+    """
+    with metrics.stage("upload"):
+        refs, ref_err = parse_asset_request()
+        if ref_err:
+            return ref_err
+    if refs is not None:
+        parsed, error = parse_project_request()
+        if error:
+            return error
+        project, entrypoint, options = parsed
+        return compiler_service.compile_project(project, entrypoint, options)
+
+    with metrics.stage("upload"):
+        parsed, error = parse_raw_request()
+    if error:
+        return error
+    source, options = parsed
+    return compiler_service.compile_raw(source, options)
+
+
+@render_bp.route("/render/<digest>", methods=["GET"])
+def render_stored(digest):
+    """Render a stored source or project by hash; cacheable by CDNs and browsers.
+
+    ``digest`` is an asset hash (a single Typst source, rendered as
+    ``main.typ``) or a project hash from ``PUT /projects``; successful POST
+    renders link theirs in ``Content-Location``. Query parameters as for
+    ``POST /render``: entrypoint, format, ppi, sys_inputs, pages, archive,
+    outputs, postprocess.
+
+    Responses carry ``Cache-Control`` from ``RENDER_GET_CACHE_CONTROL`` and
+    the ETag of the bytes served; an ``If-None-Match`` matching the last one
+    served gets 304 without compiling.
+    """
+    if not is_digest(digest):
+        return jsonify({"error": "Render hash must be a sha256 hex digest"}), 400
+    parsed, error = parse_render_params(request.args)
+    if error:
+        return error
+    entrypoint, options = parsed
+    entrypoint = normalize_path(entrypoint) or entrypoint
+    return compiler_service.render_stored(digest, entrypoint, options)
+
+
+@render_bp.route("/render/thumbnail", methods=["POST"])
+@admission_limited
+def render_thumbnail():
+    """Render a first-page thumbnail that fits a pixel box.
+
+    Accepts the same sources as ``POST /render`` and ``POST /render/raw``
+    (ZIP, raw source, stored asset references) and ``sys_inputs``, plus:
+        width:    max width in pixels
+        height:   max height in pixels (both default to THUMBNAIL_DEFAULT_SIZE
+                  when neither is given)
+        format:   png | jpeg | webp (default: png; jpeg/webp need Pillow)
+        quality:  1-100, JPEG/WebP quality (default: THUMBNAIL_QUALITY)
+
+    Thumbnails are cached separately from renders and derived from a
+    cached render of the document when there is one.
+    """
+    parsed, error = parse_project_request("png", set(THUMBNAIL_FORMATS))
+    if error:
+        return error
+    project, entrypoint, options = parsed
+    params = (request.get_json(silent=True) or {}) if request.is_json else request.values
+    thumb, error = parse_thumbnail_params(params, options.output_format)
+    if error:
+        return error
+    return compiler_service.render_thumbnail(project, entrypoint, options.sys_inputs, thumb)
 
-    zip_file = request.files["file"]
-    if zip_file.filename == "":
-        return jsonify({"error": "Empty filename"}), 400
 
-    entrypoint = request.form.get("entrypoint", "main.typ")
+@render_bp.route("/render/<digest>/thumbnail", methods=["GET"])
+def render_stored_thumbnail(digest):
+    """Thumbnail of a stored source or project by hash; cacheable like ``GET /render/<hash>``.
+
+    Query parameters: entrypoint, sys_inputs, width, height, format, quality.
+    """
+    if not is_digest(digest):
+        return jsonify({"error": "Render hash must be a sha256 hex digest"}), 400
+    parsed, error = parse_render_params(request.args, "png", set(THUMBNAIL_FORMATS))
+    if error:
+        return error
+    entrypoint, options = parsed
+    thumb, error = parse_thumbnail_params(request.args, options.output_format)
+    if error:
+        return error
+    entrypoint = normalize_path(entrypoint) or entrypoint
+    return compiler_service.render_stored_thumbnail(
+        digest, entrypoint, options.sys_inputs, thumb
+    )
+
+
+@render_bp.route("/render/batch", methods=["POST"])
+@admission_limited
+def render_batch():
+    """Render one project once per sys_inputs record (mail merge).
+
+    Multipart form:
+        file:        ZIP project (or ``source`` for a single file)
+        source:      Raw Typst source
+        entrypoint:  Main .typ file in the ZIP (default: main.typ)
+        records:     JSON array or NDJSON of sys_inputs objects (field or file)
+        format:      pdf | png | svg (default: pdf)
+        ppi:         float (default: 144.0)
+        output:      zip | ndjson (default: zip)
+        postprocess: Post-export stages for every record
+
+    JSON body: {"source": ..., "records": [...], "format": ..., "ppi": ..., "output": ...,
+    "postprocess": ...}
+    """
+    with metrics.stage("upload"):
+        if request.is_json:
+            body = request.get_json(silent=True) or {}
+            source = body.get("source")
+            records_raw = body.get("records")
+            entrypoint = "main.typ"
+            fmt_raw = body.get("format", "pdf")
+            ppi_raw = body.get("ppi", 144.0)
+            output_raw = body.get("output")
+            postprocess_raw = body.get("postprocess")
+            zip_file = None
+        else:
+            source = request.form.get("source")
+            records_file = request.files.get("records")
+            records_raw = (
+                records_file.read() if records_file else request.form.get("records")
+            )
+            entrypoint = request.form.get("entrypoint", "main.typ")
+            fmt_raw = request.form.get("format")
+            ppi_raw = request.form.get("ppi")
+            output_raw = request.form.get("output")
+            postprocess_raw = request.form.get("postprocess")
+            zip_file = request.files.get("file")
+
+    if zip_file is None and not source:
+        return jsonify({"error": "No file or source provided", "field": "file"}), 400
+    if zip_file is None and not isinstance(source, str):
+        return jsonify({"error": "source must be a string", "field": "source"}), 400
     if ".." in entrypoint or entrypoint.startswith("/"):
         return jsonify({"error": "Invalid entrypoint path"}), 400
 
-    # --- parameter parsing ---
-    output_format, bad_fmt = parse_format(request.form.get("format"))
+    output_format, bad_fmt = parse_format(fmt_raw)
     if bad_fmt:
         return (
             jsonify(
@@ -41,85 +247,369 @@ def render_typst():
             400,
         )
 
-    ppi_value, bad_ppi = parse_ppi(request.form.get("ppi"))
+    ppi_value, bad_ppi = parse_ppi(ppi_raw)
     if bad_ppi is not None:
         return jsonify({"error": f"Invalid ppi value: {bad_ppi}"}), 400
 
-    sys_inputs, si_err = parse_sys_inputs(request.form.get("sys_inputs"))
+    output = output_raw or "zip"
+    # Anything but a string (e.g. a number in a JSON body) is unsupported
+    output = output.lower() if isinstance(output, str) else str(output)
+    if output not in VALID_BATCH_OUTPUTS:
+        return (
+            jsonify(
+                {
+                    "error": f"Unsupported output: {output}",
+                    "supported": list(VALID_BATCH_OUTPUTS),
+                }
+            ),
+            400,
+        )
+
+    postprocess, pp_err = _parse_postprocess(postprocess_raw, output_format)
+    if pp_err:
+        return pp_err
+
+    records, rec_err = parse_records(records_raw)
+    if rec_err:
+        return jsonify({"error": rec_err, "field": "records"}), 400
+    max_records = current_app.config.get("BATCH_MAX_RECORDS", 0)
+    if max_records and len(records) > max_records:
+        return jsonify({"error": f"Too many records (limit {max_records})"}), 413
+
+    if zip_file is not None:
+        project, zip_err = compiler_service.load_zip(zip_file)
+        if zip_err:
+            return zip_err
+    else:
+        entrypoint = "main.typ"
+        project = ProjectFiles({entrypoint: source.encode("utf-8")})
+
+    options = CompileOptions(output_format=output_format, ppi=ppi_value, postprocess=postprocess)
+    return compiler_service.compile_batch(project, entrypoint, records, options, output)
+
+
+def parse_project_request(default_format="pdf", formats=VALID_FORMATS):
+    """Parse any render request (ZIP, raw source, asset references) into a project.
+
+    Raw sources become ``main.typ``, laid over referenced assets if any.
+    ``formats`` are the accepted values of ``format``.
+
+    Returns:
+        ((project, entrypoint, options), None) on success
+        (None, error_response) on failure
+    """
+    with metrics.stage("upload"):
+        refs, error = parse_asset_request()
+        if error:
+            return None, error
+        if is_zip_request() or (refs is not None and not _has_source()):
+            parsed, error = parse_zip_request(
+                default_format, require_file=refs is None, formats=formats
+            )
+            if error:
+                return None, error
+            zip_file, entrypoint, options = parsed
+            project, error = compiler_service.load_zip(zip_file, refs)
+        else:
+            parsed, error = parse_raw_request(default_format, formats)
+            if error:
+                return None, error
+            source, options = parsed
+            entrypoint = "main.typ"
+            project = ProjectFiles()
+            if refs is not None:
+                project, error = compiler_service.load_refs(refs)
+            if project is not None:
+                project.files[entrypoint] = source
+    if error:
+        return None, error
+
+    entrypoint = normalize_path(entrypoint) or entrypoint
+    if entrypoint not in project:
+        return None, (jsonify({"error": f"Entrypoint not found: {entrypoint}"}), 400)
+    return (project, entrypoint, options), None
+
+
+def parse_asset_request():
+    """Parse ``project``/``assets`` references from any request body.
+
+    Returns:
+        (refs or None, None) on success
+        (None, error_response) on failure
+    """
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        refs, err = parse_asset_refs(body.get("project"), body.get("assets"))
+    else:
+        refs, err = parse_asset_refs(
+            request.values.get("project"), request.values.get("assets")
+        )
+    if err:
+        return None, (jsonify({"error": err}), 400)
+    return refs, None
+
+
+def parse_zip_request(default_format="pdf", require_file=True, formats=VALID_FORMATS):
+    """Parse a multipart (or raw body) ZIP render request.
+
+    Returns:
+        ((zip_file, entrypoint, options), None) on success; ``zip_file``
+        is None if no file was sent and ``require_file`` is false
+        (None, error_response) on failure
+    """
+    # --- file validation ---
+    if request.mimetype in ZIP_MIMETYPES:
+        params = request.args
+        zip_file = FileStorage(spool_request_body(request), filename="upload.zip")
+    else:
+        params = request.form if request.form else request.args
+        zip_file = request.files.get("file")
+        if zip_file is None and require_file:
+            return None, (jsonify({"error": "No file uploaded", "field": "file"}), 400)
+        if zip_file is not None and zip_file.filename == "":
+            return None, (jsonify({"error": "Empty filename"}), 400)
+
+    parsed, error = parse_render_params(params, default_format, formats)
+    if error:
+        return None, error
+    entrypoint, options = parsed
+    return (zip_file, entrypoint, options), None
+
+
+def parse_render_params(params, default_format="pdf", formats=VALID_FORMATS):
+    """Parse entrypoint and compile options from form or query parameters.
+
+    Returns:
+        ((entrypoint, options), None) on success
+        (None, error_response) on failure
+    """
+    entrypoint = params.get("entrypoint", "main.typ")
+    if ".." in entrypoint or entrypoint.startswith("/"):
+        return None, (jsonify({"error": "Invalid entrypoint path"}), 400)
+
+    output_format, bad_fmt = parse_format(params.get("format") or default_format, formats)
+    if bad_fmt:
+        return None, (
+            jsonify({"error": f"Unsupported format: {bad_fmt}", "supported": list(formats)}),
+            400,
+        )
+
+    ppi_value, bad_ppi = parse_ppi(params.get("ppi"))
+    if bad_ppi is not None:
+        return None, (jsonify({"error": f"Invalid ppi value: {bad_ppi}"}), 400)
+
+    sys_inputs, si_err = parse_sys_inputs(params.get("sys_inputs"))
     if si_err:
-        return jsonify({"error": si_err}), 400
+        return None, (jsonify({"error": si_err}), 400)
+
+    outputs, out_err = _parse_outputs(params.get("outputs"), ppi_value)
+    if out_err:
+        return None, out_err
+
+    pages, archive, page_err = _parse_page_selection(
+        params.get("pages"), params.get("archive"), output_format, outputs
+    )
+    if page_err:
+        return None, page_err
+
+    postprocess, pp_err = _parse_postprocess(params.get("postprocess"), output_format, outputs)
+    if pp_err:
+        return None, pp_err
 
     options = CompileOptions(
         output_format=output_format,
         ppi=ppi_value,
         sys_inputs=sys_inputs,
+        pages=pages,
+        archive=archive,
+        outputs=outputs,
+        postprocess=postprocess,
     )
+    return (entrypoint, options), None
 
-    return compiler_service.compile_zip(zip_file, entrypoint, options)
 
+def parse_thumbnail_params(params, output_format):
+    """Parse the thumbnail box and quality; ``output_format`` is already validated.
 
-@render_bp.route("/render/raw", methods=["POST"])
-def render_raw():
-    """Render raw Typst source code to PDF/PNG/SVG (no ZIP needed).
+    Returns:
+        (thumbnail_options, None) on success
+        (None, error_response) on failure
+    """
+    max_size = current_app.config.get("THUMBNAIL_MAX_SIZE", 2048)
+    size = {}
+    for name in ("width", "height"):
+        size[name], bad = parse_bounded_int(params.get(name), 1, max_size)
+        if bad is not None:
+            return None, (
+                jsonify({"error": f"Invalid {name}: {bad} (1-{max_size} pixels)"}),
+                400,
+            )
+    if size["width"] is None and size["height"] is None:
+        size["width"] = size["height"] = current_app.config.get("THUMBNAIL_DEFAULT_SIZE", 256)
 
-    Accepts JSON body:
-        {
-            "source":     "Hello *World*",          // required
-            "format":     "pdf",                    // optional, default: pdf
-            "ppi":        144.0,                    // optional, for PNG
-            "sys_inputs": {"name": "value"}         // optional
-        }
+    quality, bad = parse_bounded_int(params.get("quality"), 1, 100)
+    if bad is not None:
+        return None, (jsonify({"error": f"Invalid quality: {bad} (1-100)"}), 400)
+    if quality is None:
+        quality = current_app.config.get("THUMBNAIL_QUALITY", 80)
+    return ThumbnailOptions(format=output_format, quality=quality, **size), None
 
-    Also accepts form data:
-        source:      Typst source code (required)
-        format:      pdf | png | svg (default: pdf)
-        ppi:         float (default: 144.0)
-        sys_inputs:  JSON string
-    """
-    # --- parse input from JSON or form data ---
+
+def is_zip_request():
+    """Whether the request carries a ZIP project rather than a raw source."""
+    return request.mimetype in ZIP_MIMETYPES or "file" in request.files
+
+
+def _has_source():
+    if request.mimetype in SOURCE_MIMETYPES:
+        return True
     if request.is_json:
+        return "source" in (request.get_json(silent=True) or {})
+    return "source" in request.form
+
+
+def parse_raw_request(default_format="pdf", formats=VALID_FORMATS):
+    """Parse a raw-source render request (raw body, JSON or form data).
+
+    The source is returned as UTF-8 bytes.
+
+    Returns:
+        ((source, options), None) on success
+        (None, error_response) on failure
+    """
+    # --- parse input from a raw body, JSON or form data ---
+    if request.mimetype in SOURCE_MIMETYPES:
+        # Read straight into bytes: no JSON/str round trip
+        source = request.get_data(cache=False)
+        fmt_raw = request.args.get("format", default_format)
+        ppi_raw = request.args.get("ppi", "144.0")
+        sys_inputs, si_err = parse_sys_inputs(request.args.get("sys_inputs"))
+        pages_raw = request.args.get("pages")
+        archive_raw = request.args.get("archive")
+        outputs_raw = request.args.get("outputs")
+        postprocess_raw = request.args.get("postprocess")
+    elif request.is_json:
         body = request.get_json(silent=True) or {}
         source = body.get("source")
-        fmt_raw = body.get("format", "pdf")
+        fmt_raw = body.get("format", default_format)
         ppi_raw = body.get("ppi", 144.0)
         si_raw = body.get("sys_inputs")
+        pages_raw = body.get("pages")
+        archive_raw = body.get("archive")
+        outputs_raw = body.get("outputs")
+        postprocess_raw = body.get("postprocess")
         # sys_inputs already a dict from JSON
         if si_raw is not None:
             if not isinstance(si_raw, dict):
-                return jsonify({"error": "sys_inputs must be a JSON object"}), 400
+                return None, (jsonify({"error": "sys_inputs must be a JSON object"}), 400)
             sys_inputs = {str(k): str(v) for k, v in si_raw.items()}
         else:
             sys_inputs = None
         si_err = None
     else:
         source = request.form.get("source")
-        fmt_raw = request.form.get("format", "pdf")
+        fmt_raw = request.form.get("format", default_format)
         ppi_raw = request.form.get("ppi", "144.0")
         sys_inputs, si_err = parse_sys_inputs(request.form.get("sys_inputs"))
+        pages_raw = request.form.get("pages")
+        archive_raw = request.form.get("archive")
+        outputs_raw = request.form.get("outputs")
+        postprocess_raw = request.form.get("postprocess")
 
     if not source:
-        return jsonify({"error": "No source provided", "field": "source"}), 400
+        return None, (jsonify({"error": "No source provided", "field": "source"}), 400)
+    if not isinstance(source, (str, bytes)):
+        return None, (jsonify({"error": "source must be a string", "field": "source"}), 400)
+    if isinstance(source, str):
+        source = source.encode("utf-8")
 
-    output_format, bad_fmt = parse_format(fmt_raw)
+    output_format, bad_fmt = parse_format(fmt_raw, formats)
     if bad_fmt:
-        return (
-            jsonify(
-                {"error": f"Unsupported format: {bad_fmt}", "supported": list(VALID_FORMATS)}
-            ),
+        return None, (
+            jsonify({"error": f"Unsupported format: {bad_fmt}", "supported": list(formats)}),
             400,
         )
 
     ppi_value, bad_ppi = parse_ppi(ppi_raw)
     if bad_ppi is not None:
-        return jsonify({"error": f"Invalid ppi value: {bad_ppi}"}), 400
+        return None, (jsonify({"error": f"Invalid ppi value: {bad_ppi}"}), 400)
 
     if si_err:
-        return jsonify({"error": si_err}), 400
+        return None, (jsonify({"error": si_err}), 400)
+
+    outputs, out_err = _parse_outputs(outputs_raw, ppi_value)
+    if out_err:
+        return None, out_err
+
+    pages, archive, page_err = _parse_page_selection(
+        pages_raw, archive_raw, output_format, outputs
+    )
+    if page_err:
+        return None, page_err
+
+    postprocess, pp_err = _parse_postprocess(postprocess_raw, output_format, outputs)
+    if pp_err:
+        return None, pp_err
 
     options = CompileOptions(
         output_format=output_format,
         ppi=ppi_value,
         sys_inputs=sys_inputs,
+        pages=pages,
+        archive=archive,
+        outputs=outputs,
+        postprocess=postprocess,
     )
 
-    return compiler_service.compile_raw(source, options)
+    return (source, options), None
+
+
+def _parse_outputs(outputs_raw, ppi):
+    """Parse ``outputs``; returns (outputs, error_response)."""
+    outputs, err = parse_outputs(outputs_raw, ppi)
+    if err:
+        return None, (jsonify({"error": err}), 400)
+    max_outputs = current_app.config.get("RENDER_MAX_OUTPUTS", 0)
+    if outputs and max_outputs and len(outputs) > max_outputs:
+        return None, (jsonify({"error": f"Too many outputs (limit {max_outputs})"}), 400)
+    return outputs, None
+
+
+def _parse_postprocess(postprocess_raw, output_format, outputs=None):
+    """Parse ``postprocess`` against the requested formats; returns (stages, error_response)."""
+    formats = [fmt for fmt, _ in outputs] if outputs else [output_format]
+    try:
+        return resolve_stages(postprocess_raw, formats), None
+    except PostProcessError as e:
+        return None, (jsonify({"error": str(e)}), e.status_code)
+
+
+def _parse_page_selection(pages_raw, archive_raw, output_format, outputs=None):
+    """Parse ``pages``/``archive``; returns (pages, archive, error_response)."""
+    pages, pages_err = parse_pages(pages_raw)
+    if pages_err:
+        return None, None, (jsonify({"error": pages_err}), 400)
+    formats = [fmt for fmt, _ in outputs] if outputs else [output_format]
+    if pages is not None and all(fmt == "pdf" for fmt in formats):
+        return (
+            None,
+            None,
+            (jsonify({"error": "pages is only supported for png and svg output"}), 400),
+        )
+
+    archive, bad_archive = parse_archive(archive_raw)
+    if bad_archive:
+        return (
+            None,
+            None,
+            (
+                jsonify(
+                    {
+                        "error": f"Unsupported archive: {bad_archive}",
+                        "supported": list(VALID_ARCHIVES),
+                    }
+                ),
+                400,
+            ),
+        )
+    return pages, archive, None
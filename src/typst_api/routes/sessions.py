@@ -0,0 +1,168 @@
+"""Live preview session routes."""
+
+import base64
+import io
+
+from flask import Blueprint, jsonify, request, send_file, url_for
+
+from ..services.admission import admission_limited, busy_response
+from ..services.compiler import (
+    compile_error_response,
+    compiler_service,
+    missing_packages_response,
+)
+from ..services.executor import BackendBusyError, CompileError
+from ..services.packages import MissingPackagesError
+from ..services.sessions import SessionError, session_service
+from .render import parse_project_request
+
+sessions_bp = Blueprint("sessions", __name__)
+
+
+@sessions_bp.route("/sessions", methods=["POST"])
+@admission_limited
+def create_session():
+    """Open a preview session and return every page.
+
+    Accepts the same parameters as ``POST /render`` (ZIP ``file``) or
+    ``POST /render/raw`` (``source``), including asset references. The format
+    must be svg (the default) or png; ``pages``/``archive`` are ignored.
+    """
+    parsed, error = parse_project_request(default_format="svg")
+    if error:
+        return error
+    project, entrypoint, options = parsed
+
+    if options.output_format == "pdf":
+        return jsonify({"error": "Sessions support png and svg output"}), 400
+
+    try:
+        session, changed = session_service.create(project, entrypoint, options)
+    except SessionError as e:
+        return _session_error(e)
+    except MissingPackagesError as e:
+        return missing_packages_response(e)
+    except BackendBusyError as e:
+        return busy_response(e)
+    except CompileError as e:
+        return compile_error_response(e)
+
+    response = jsonify(_describe(session, changed))
+    response.headers["Location"] = url_for("sessions.get_session", session_id=session.id)
+    return response, 201
+
+
+@sessions_bp.route("/sessions/<session_id>", methods=["PATCH"])
+@admission_limited
+def update_session(session_id):
+    """Apply an edit, recompile and return only the pages that changed.
+
+    JSON body (all optional, but send at least one change):
+        path:        file to change (default: the entrypoint)
+        source:      full new text of ``path``
+        edits:       [{"start": 0, "end": 5, "text": "Hi"}, ...] applied in order,
+                     offsets in characters
+        sys_inputs:  replaces the session's sys_inputs
+        version:     expected current version; 409 if the session moved on
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object body"}), 400
+
+    source = body.get("source")
+    edits = body.get("edits")
+    sys_inputs = body.get("sys_inputs")
+    version = body.get("version")
+    if source is not None and not isinstance(source, str):
+        return jsonify({"error": "source must be a string"}), 400
+    if edits is not None and not isinstance(edits, list):
+        return jsonify({"error": "edits must be a list"}), 400
+    if sys_inputs is not None:
+        if not isinstance(sys_inputs, dict):
+            return jsonify({"error": "sys_inputs must be a JSON object"}), 400
+        sys_inputs = {str(k): str(v) for k, v in sys_inputs.items()}
+    if version is not None and not isinstance(version, int):
+        return jsonify({"error": "version must be an integer"}), 400
+
+    try:
+        session, changed = session_service.update(
+            session_id,
+            path=body.get("path"),
+            source=source,
+            edits=edits,
+            sys_inputs=sys_inputs,
+            version=version,
+        )
+    except SessionError as e:
+        return _session_error(e)
+    except MissingPackagesError as e:
+        return missing_packages_response(e)
+    except BackendBusyError as e:
+        return busy_response(e)
+    except CompileError as e:
+        session = session_service.get(session_id)
+        response, status = compile_error_response(e)
+        body = response.get_json()
+        body["version"] = session.version if session else None
+        return jsonify(body), status
+    return jsonify(_describe(session, changed)), 200
+
+
+@sessions_bp.route("/sessions/<session_id>", methods=["GET"])
+def get_session(session_id):
+    """Report a session's state and page hashes."""
+    session = session_service.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify(_describe(session)), 200
+
+
+@sessions_bp.route("/sessions/<session_id>/pages/<int:page>", methods=["GET"])
+def get_session_page(session_id, page):
+    """Return one page of the last successful compile."""
+    session = session_service.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found"}), 404
+    with session.lock:
+        pages, hashes = session.pages, session.page_hashes
+    if not 1 <= page <= len(pages):
+        return jsonify({"error": "Page out of range", "page_count": len(pages)}), 404
+    fmt = session.options.output_format
+    return send_file(
+        io.BytesIO(pages[page - 1]),
+        mimetype=compiler_service.FORMAT_MIMETYPES[fmt],
+        download_name=f"page-{page}.{fmt}",
+        etag=hashes[page - 1],
+        conditional=True,
+    )
+
+
+@sessions_bp.route("/sessions/<session_id>", methods=["DELETE"])
+def close_session(session_id):
+    """Close a session and free its compiler."""
+    if not session_service.close(session_id):
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"id": session_id, "status": "closed"}), 200
+
+
+def _describe(session, changed=None):
+    info = session.describe()
+    info["session_url"] = url_for("sessions.get_session", session_id=session.id)
+    if changed is not None:
+        info["changed"] = changed
+        info["pages"] = [
+            {
+                "page": n,
+                "hash": session.page_hashes[n - 1],
+                "data": base64.b64encode(session.pages[n - 1]).decode("ascii"),
+            }
+            for n in changed
+        ]
+    return info
+
+
+def _session_error(e):
+    response = jsonify({"error": str(e)})
+    if e.status_code == 503:
+        response.headers["Retry-After"] = "1"
+    return response, e.status_code
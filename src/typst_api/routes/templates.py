@@ -0,0 +1,155 @@
+"""Template registry routes."""
+
+import json
+
+from flask import Blueprint, jsonify, request, url_for
+
+from ..services.admission import admission_limited, busy_response
+from ..services.compiler import missing_packages_response
+from ..services.executor import BackendBusyError
+from ..services.packages import MissingPackagesError
+from ..services.templates import TemplateError, template_service
+from .render import parse_project_request, parse_render_params
+
+templates_bp = Blueprint("templates", __name__)
+
+# Render body fields that are not compile options
+_RENDER_FIELDS = ("data", "version", "entrypoint", "sys_inputs")
+
+
+@templates_bp.route("/templates", methods=["GET"])
+def list_templates():
+    """The latest version of every registered template."""
+    registry = template_service.registry
+    templates = [registry.get(name).describe() for name in registry.names()]
+    return jsonify({"templates": templates, "count": len(templates)}), 200
+
+
+@templates_bp.route("/templates/<name>", methods=["PUT", "POST"])
+@admission_limited
+def register_template(name):
+    """Register a new version of a template.
+
+    The project is sent as for ``POST /render`` (ZIP upload or raw body,
+    ``source``, or ``project``/``assets`` references), plus:
+        data:        inputs | file - how render data reaches the template
+                     (default: inputs)
+        data_path:   file mode: top-level JSON file for the data (default: data.json)
+        sample:      JSON data the template is validated and warmed with
+
+    The template is compiled before it becomes visible; 422 if it fails.
+    201 with the new version, or 200 if the latest version is identical.
+    """
+    parsed, error = parse_project_request()
+    if error:
+        return error
+    project, entrypoint, _ = parsed
+
+    if request.is_json:
+        params = request.get_json(silent=True) or {}
+        sample = params.get("sample")
+    else:
+        params = request.values
+        sample = params.get("sample")
+        if sample is not None:
+            try:
+                sample = json.loads(sample)
+            except json.JSONDecodeError:
+                return jsonify({"error": "Invalid JSON in sample"}), 400
+
+    try:
+        template, created = template_service.register(
+            name,
+            project,
+            entrypoint,
+            data=params.get("data") or "inputs",
+            data_path=params.get("data_path") or "data.json",
+            sample=sample,
+        )
+    except TemplateError as e:
+        return _template_error(e)
+    except MissingPackagesError as e:
+        return missing_packages_response(e)
+    except BackendBusyError as e:
+        return busy_response(e)
+
+    response = jsonify(template.describe())
+    response.headers["Location"] = url_for(
+        "templates.get_template_version", name=name, version=template.version
+    )
+    return response, 201 if created else 200
+
+
+@templates_bp.route("/templates/<name>", methods=["GET"])
+def get_template(name):
+    """Every version of a template, oldest first."""
+    registry = template_service.registry
+    versions = registry.versions(name)
+    if not versions:
+        return jsonify({"error": f"Template not found: {name}"}), 404
+    return jsonify(
+        {
+            "name": name,
+            "latest": versions[-1],
+            "versions": [registry.get(name, v).describe() for v in versions],
+        }
+    ), 200
+
+
+@templates_bp.route("/templates/<name>/<int:version>", methods=["GET"])
+def get_template_version(name, version):
+    """One version of a template."""
+    try:
+        return jsonify(template_service.registry.get(name, version).describe()), 200
+    except TemplateError as e:
+        return _template_error(e)
+
+
+@templates_bp.route("/templates/<name>/render", methods=["POST"])
+@admission_limited
+def render_template(name):
+    """Render a registered template with a JSON data payload.
+
+    JSON body:
+        {
+            "data":    {"customer": "ACME", "items": [...]},  // default: the sample
+            "version": 3,                                     // default: latest
+            "format":  "pdf"                                  // and ppi, pages, archive,
+        }                                                     // outputs, postprocess
+
+    Options may also be given in the query string. Inputs-mode templates
+    get each top-level key of ``data`` as a ``sys_inputs`` string (non-strings
+    JSON-encoded); file-mode templates read ``data`` from their data file.
+    """
+    body = request.get_json(silent=True) if request.is_json else None
+    if request.is_json and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    body = body or {}
+
+    version = body.get("version", request.args.get("version"))
+    if version is not None:
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            version = 0
+        if version < 1:
+            return jsonify({"error": "version must be a positive integer"}), 400
+
+    params = {k: v for k, v in request.args.items() if k not in _RENDER_FIELDS}
+    params.update((k, v) for k, v in body.items() if k not in _RENDER_FIELDS)
+    parsed, error = parse_render_params(params)
+    if error:
+        return error
+    _, options = parsed
+
+    try:
+        return template_service.render(name, version, body.get("data"), options)
+    except TemplateError as e:
+        return _template_error(e)
+
+
+def _template_error(e: TemplateError):
+    body = {"error": str(e)}
+    if e.details:
+        body["details"] = e.details
+    return jsonify(body), e.status_code
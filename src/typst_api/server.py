@@ -0,0 +1,97 @@
+"""Production server entry point (gunicorn, threaded or ASGI workers)."""
+
+import os
+from typing import Any, Dict
+
+from flask import Flask
+
+
+ASYNC_WORKER_CLASS = "uvicorn_worker.UvicornWorker"
+
+
+def gunicorn_options(app: Flask, asynchronous: bool = False) -> Dict[str, Any]:
+    """Translate ``SERVER_*`` settings into gunicorn options.
+
+    ``asynchronous`` selects uvicorn workers for the ASGI app; ``threads``
+    only applies to the threaded workers.
+    """
+    config = app.config
+    return {
+        "bind": config["SERVER_BIND"],
+        "workers": config["SERVER_WORKERS"] or (os.cpu_count() or 1),
+        "worker_class": ASYNC_WORKER_CLASS if asynchronous else "gthread",
+        "threads": config["SERVER_THREADS"],
+        "keepalive": config["SERVER_KEEPALIVE"],
+        "backlog": config["SERVER_BACKLOG"],
+        "timeout": config["SERVER_TIMEOUT"],
+        "graceful_timeout": config["SERVER_GRACEFUL_TIMEOUT"],
+        "max_requests": config["SERVER_MAX_REQUESTS"],
+        "max_requests_jitter": config["SERVER_MAX_REQUESTS_JITTER"],
+        # Import typst and build the app once in the master, then fork
+        "preload_app": config["SERVER_PRELOAD"],
+        # Warm up each worker right after the fork instead of on its first request
+        "post_worker_init": _start_worker,
+        "accesslog": "-",
+    }
+
+
+def _start_worker(worker) -> None:
+    from .services.health import health_service
+
+    health_service.start()
+
+
+def serve(config_name: str = "default", asynchronous: bool = False) -> None:
+    """Run the app under gunicorn.
+
+    With ``asynchronous`` (or ``SERVER_ASYNC``) each worker runs the ASGI
+    app on uvicorn. Send SIGHUP to the master process for a graceful
+    reload: new workers are started before the old ones are drained. With
+    ``SERVER_PRELOAD`` they are forked from the master's app, so they keep
+    its code and config; set ``SERVER_PRELOAD=False`` for reloads that pick
+    up changes (each worker then builds its own app).
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit(
+            "The production server requires gunicorn: pip install 'typst-api[server]'"
+        )
+
+    from . import _configured_app, create_app
+
+    # The master only builds the app (and imports typst) when preloading
+    settings = _configured_app(config_name)
+    preload = settings.config["SERVER_PRELOAD"]
+    asynchronous = asynchronous or settings.config["SERVER_ASYNC"]
+    if asynchronous:
+        try:
+            import uvicorn_worker  # noqa: F401
+        except ImportError:
+            raise SystemExit(
+                "The async server requires uvicorn-worker: pip install 'typst-api[async]'"
+            )
+
+    def build(app: Flask):
+        if not asynchronous:
+            return app
+        from .asgi import AsyncApp
+
+        return AsyncApp(app)
+
+    class _Application(BaseApplication):
+        def __init__(self):
+            self.application = build(create_app(config_name)) if preload else None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in gunicorn_options(settings, asynchronous).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if self.application is None:
+                # Workers without preload build their own app after fork
+                return build(create_app(config_name))
+            return self.application
+
+    _Application().run()
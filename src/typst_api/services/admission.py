@@ -0,0 +1,306 @@
+"""Admission control in front of the compiler.
+
+Two layers keep a burst of renders from running the node out of memory:
+
+* a global limit on compiles in flight per worker process, with a bounded
+  wait queue whose entries give up after a deadline, and
+* per-client (API key, else IP) token buckets and in-flight request limits
+  on the render routes.
+
+Overflow is refused immediately: ``429`` for a client over its own limits,
+``503`` when the node as a whole is saturated, both with ``Retry-After``.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from flask import jsonify, make_response, request
+
+from .executor import BackendBusyError
+from .metrics import metrics
+
+# Weight of the newest sample in the average compile-slot hold time
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionError(BackendBusyError):
+    """A request was refused by admission control."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0, or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _ClientState:
+    def __init__(self, bucket: Optional[TokenBucket]):
+        self.bucket = bucket
+        self.in_flight = 0
+
+
+class AdmissionController:
+    """Global compile slots plus per-client limits for one worker process.
+
+    ``max_in_flight`` compiles run at once (0: unlimited); up to
+    ``queue_max`` more wait at most ``queue_timeout`` seconds (0: no
+    deadline) for a slot. Background work (jobs) waits without a deadline
+    and outside the queue bound, since the job queue already bounds it.
+    Client rate and concurrency limits of 0 are disabled.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 0,
+        queue_max: int = 0,
+        queue_timeout: float = 0,
+        client_rate: float = 0,
+        client_burst: int = 1,
+        client_max_in_flight: int = 0,
+        client_header: Optional[str] = None,
+        max_clients: int = 10000,
+    ):
+        self.max_in_flight = max_in_flight
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.client_max_in_flight = client_max_in_flight
+        self.client_header = client_header
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected: Dict[str, int] = {}
+        self._avg_seconds = 1.0
+        self._cond = threading.Condition()
+        self._clients: "OrderedDict[str, _ClientState]" = OrderedDict()
+        self._clients_lock = threading.Lock()
+
+    # -- global compile slots -------------------------------------------------
+
+    @contextmanager
+    def slot(self, background: bool = False) -> Iterator[None]:
+        """Hold a compile slot; raises :class:`AdmissionError` on overflow."""
+        if not self.max_in_flight:
+            yield
+            return
+        self._acquire(background)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self.in_flight -= 1
+                self._avg_seconds += _EWMA_ALPHA * (elapsed - self._avg_seconds)
+                self._cond.notify()
+
+    def _acquire(self, background: bool) -> None:
+        with self._cond:
+            if self.in_flight < self.max_in_flight and not self.waiting:
+                self.in_flight += 1
+                return
+            if not background and self.waiting >= self.queue_max:
+                self._reject("queue_full")
+                raise AdmissionError(
+                    "Too many compiles queued", 503, self._estimated_wait()
+                )
+            deadline = None
+            if not background and self.queue_timeout:
+                deadline = time.monotonic() + self.queue_timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._reject("queue_timeout")
+                        raise AdmissionError(
+                            "Timed out waiting for a compile slot",
+                            503,
+                            self._estimated_wait(),
+                        )
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def _estimated_wait(self) -> int:
+        """Seconds until the queue ahead has likely drained (caller holds the lock)."""
+        rounds = (self.waiting + 1) / max(1, self.max_in_flight)
+        return max(1, math.ceil(rounds * self._avg_seconds))
+
+    # -- per-client limits ----------------------------------------------------
+
+    def client_id(self) -> str:
+        """API key from ``client_header`` if sent, else the remote address."""
+        if self.client_header:
+            key = request.headers.get(self.client_header)
+            if key:
+                return f"key:{key}"
+        return f"ip:{request.remote_addr}"
+
+    def enter_client(self, client: str) -> Optional[Tuple[str, int]]:
+        """Count a request against ``client``.
+
+        Returns ``(message, retry_after)`` if the client is over its rate or
+        concurrency limit; otherwise the caller must :meth:`leave_client`.
+        """
+        with self._clients_lock:
+            state = self._clients.get(client)
+            if state is None:
+                self._forget_idle_clients()
+                bucket = None
+                if self.client_rate:
+                    bucket = TokenBucket(self.client_rate, self.client_burst)
+                state = self._clients[client] = _ClientState(bucket)
+            self._clients.move_to_end(client)
+            if self.client_max_in_flight and state.in_flight >= self.client_max_in_flight:
+                self._reject("client_concurrency")
+                return "Too many concurrent requests for this client", 1
+            if state.bucket is not None:
+                wait = state.bucket.take()
+                if wait:
+                    self._reject("client_rate")
+                    return "Rate limit exceeded for this client", max(1, math.ceil(wait))
+            state.in_flight += 1
+        return None
+
+    def leave_client(self, client: str) -> None:
+        with self._clients_lock:
+            state = self._clients.get(client)
+            if state is not None:
+                state.in_flight -= 1
+
+    def _forget_idle_clients(self) -> None:
+        """Drop the least recently seen idle clients to make room for one more."""
+        excess = len(self._clients) + 1 - self.max_clients
+        for client in list(self._clients):
+            if excess <= 0:
+                break
+            if self._clients[client].in_flight == 0:
+                del self._clients[client]
+                excess -= 1
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight,
+                "rejected": dict(self.rejected),
+            }
+
+
+def default_max_in_flight(config) -> int:
+    """Compile slots per worker: CPUs, capped by the backend's compilers.
+
+    A slot beyond what the backend can run would only move the wait into
+    the compiler pool, where it has no deadline and no metrics.
+    """
+    slots = os.cpu_count() or 1
+    if config.get("COMPILE_BACKEND", "inline") == "process":
+        workers = config.get("COMPILE_WORKERS")
+        return min(slots, workers) if workers else slots
+    pool_size = config.get("COMPILER_POOL_SIZE", 0)
+    return min(slots, pool_size) if pool_size > 0 else slots
+
+
+class AdmissionService:
+    """Holds the configured :class:`AdmissionController` for the app."""
+
+    def __init__(self):
+        self.controller = AdmissionController()
+
+    def init_app(self, app) -> None:
+        """Configure admission limits from a Flask app's config."""
+        self.controller = AdmissionController(
+            max_in_flight=app.config.get("ADMISSION_MAX_IN_FLIGHT")
+            or default_max_in_flight(app.config),
+            queue_max=app.config.get("ADMISSION_QUEUE_MAX", 0),
+            queue_timeout=app.config.get("ADMISSION_QUEUE_TIMEOUT", 0),
+            client_rate=app.config.get("ADMISSION_CLIENT_RATE", 0),
+            client_burst=app.config.get("ADMISSION_CLIENT_BURST", 1),
+            client_max_in_flight=app.config.get("ADMISSION_CLIENT_MAX_IN_FLIGHT", 0),
+            client_header=app.config.get("ADMISSION_CLIENT_HEADER"),
+        )
+
+    def collect_metrics(self):
+        """Report compile slots and rejections for ``/metrics``."""
+        stats = self.controller.stats()
+        yield "admission_in_flight", "gauge", "Compiles holding an admission slot", [
+            ({}, stats["in_flight"])
+        ]
+        yield "admission_waiting", "gauge", "Compiles waiting for an admission slot", [
+            ({}, stats["waiting"])
+        ]
+        yield "admission_rejected_total", "counter", "Requests refused by admission control", [
+            ({"reason": reason}, count) for reason, count in sorted(stats["rejected"].items())
+        ]
+
+
+def admission_limited(view: Callable) -> Callable:
+    """Apply per-client limits to a route; ``429`` with ``Retry-After`` on overflow.
+
+    The client's in-flight count is released once the response is closed,
+    so streamed bodies count until they are fully sent.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        controller = admission_service.controller
+        client = controller.client_id()
+        refused = controller.enter_client(client)
+        if refused is not None:
+            message, retry_after = refused
+            response = jsonify({"error": message})
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 429
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            controller.leave_client(client)
+            raise
+        response.call_on_close(lambda: controller.leave_client(client))
+        return response
+
+    return wrapper
+
+
+def busy_response(e: BackendBusyError):
+    """``503`` (or the error's own status) with ``Retry-After`` for a busy compiler."""
+    response = jsonify({"error": "Compiler busy", "details": str(e)})
+    response.headers["Retry-After"] = str(getattr(e, "retry_after", 1))
+    return response, getattr(e, "status_code", 503)
+
+
+# Singleton instance for use across services and routes
+admission_service = AdmissionService()
+metrics.collector(admission_service.collect_metrics)
@@ -0,0 +1,294 @@
+"""Content-addressed asset store: upload files once, reference them by hash."""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .metrics import metrics
+from .project import ProjectFiles, normalize_path
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Project manifests are stored as assets too; this prefix tells them apart
+_MANIFEST_MAGIC = b"typst-api-project\n"
+
+# Eviction frees space down to this fraction of ``max_bytes``, so the puts
+# that follow do not each rescan the directory
+_LOW_WATER = 0.9
+
+
+class AssetError(Exception):
+    """An asset reference is invalid or points at a missing asset."""
+
+    def __init__(self, message: str, status_code: int = 400, missing=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.missing: List[str] = list(missing or [])
+
+
+@dataclass
+class AssetRefs:
+    """Stored content a request builds its project from."""
+
+    project: Optional[str] = None
+    # {project path: asset digest}
+    assets: Dict[str, str] = field(default_factory=dict)
+
+
+def is_digest(value) -> bool:
+    return isinstance(value, str) and bool(_DIGEST_RE.match(value))
+
+
+def parse_asset_refs(project_raw, assets_raw) -> Tuple[Optional[AssetRefs], Optional[str]]:
+    """Validate ``project``/``assets`` request parameters.
+
+    ``assets_raw`` is a JSON object (or its string form) mapping project
+    paths to asset hashes.
+
+    Returns:
+        (refs, None) on success, (None, None) if nothing was referenced
+        (None, error_message) on failure
+    """
+    if not project_raw and not assets_raw:
+        return None, None
+    if project_raw and not is_digest(project_raw):
+        return None, "project must be a sha256 hex digest"
+
+    assets = assets_raw or {}
+    if isinstance(assets, str):
+        try:
+            assets = json.loads(assets)
+        except json.JSONDecodeError:
+            return None, "Invalid JSON in assets"
+    if not isinstance(assets, dict):
+        return None, "assets must be a JSON object of path to hash"
+
+    mapping = {}
+    for path, digest in assets.items():
+        normalized = normalize_path(str(path))
+        if normalized is None:
+            return None, f"Invalid asset path: {path}"
+        if not is_digest(digest):
+            return None, f"Invalid asset hash for {path}"
+        mapping[normalized] = digest
+    return AssetRefs(project=project_raw or None, assets=mapping), None
+
+
+class AssetStore:
+    """Local-disk blob store keyed by SHA-256, with size-bounded LRU eviction.
+
+    Every worker pointing at the same directory shares the store. Reads
+    refresh a blob's mtime, and once the directory grows past ``max_bytes``
+    the least recently used blobs are removed.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # estimate; recounted on eviction
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def estimated_bytes(self) -> Optional[int]:
+        """Running size estimate (None until the first write or stats call)."""
+        with self._lock:
+            return self._bytes
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """Store ``data``; returns ``(digest, created)``."""
+        digest, created = self._write(data)
+        if created:
+            self._maybe_evict(keep={digest})
+        return digest, created
+
+    def _write(self, data: bytes) -> Tuple[str, bool]:
+        """Store ``data`` without evicting; returns ``(digest, created)``."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(data)
+        return digest, True
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Return the blob for ``digest``, or None if it is not stored."""
+        if not is_digest(digest):
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def has(self, digest: str) -> bool:
+        return is_digest(digest) and os.path.exists(self._path(digest))
+
+    def put_project(self, project: ProjectFiles) -> Tuple[str, Dict[str, str]]:
+        """Store every file of ``project`` plus a manifest naming them.
+
+        Returns ``(project_digest, {path: asset_digest})``. Eviction runs
+        once the whole project is written and never removes any part of it.
+        """
+        files = {path: self._write(data)[0] for path, data in sorted(project.files.items())}
+        manifest = _MANIFEST_MAGIC + json.dumps(files, sort_keys=True).encode("utf-8")
+        digest, _ = self._write(manifest)
+        self._maybe_evict(keep={digest, *files.values()})
+        return digest, files
+
+    def resolve(self, refs: AssetRefs) -> ProjectFiles:
+        """Build a project from a stored project and/or individual assets.
+
+        Individual assets are laid over the stored project's files. Raises
+        :class:`AssetError` (404) listing every hash that is not stored.
+        """
+        mapping: Dict[str, str] = {}
+        missing: List[str] = []
+        if refs.project:
+            manifest = self.get(refs.project)
+            if manifest is None:
+                missing.append(refs.project)
+            elif not manifest.startswith(_MANIFEST_MAGIC):
+                raise AssetError(f"Not a stored project: {refs.project}")
+            else:
+                mapping.update(json.loads(manifest[len(_MANIFEST_MAGIC):]))
+        mapping.update(refs.assets)
+
+        files = {}
+        for path, digest in mapping.items():
+            data = self.get(digest)
+            if data is None:
+                missing.append(digest)
+            else:
+                files[path] = data
+        if missing:
+            raise AssetError("Referenced assets are not stored", 404, missing)
+        return ProjectFiles(files)
+
+    def load(self, digest: str, entrypoint: str = "main.typ") -> ProjectFiles:
+        """A stored project, or a single stored source as ``entrypoint``.
+
+        Raises :class:`AssetError` (404) if ``digest`` is not stored.
+        """
+        data = self.get(digest)
+        if data is None:
+            raise AssetError("Referenced assets are not stored", 404, [digest])
+        if data.startswith(_MANIFEST_MAGIC):
+            return self.resolve(AssetRefs(project=digest))
+        return ProjectFiles({entrypoint: data})
+
+    def stats(self) -> Dict[str, int]:
+        count, total = 0, 0
+        for _, size, _ in self._scan():
+            count += 1
+            total += size
+        with self._lock:
+            self._bytes = total
+            return {
+                "assets": count,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _scan(self) -> Iterator[Tuple[float, int, str]]:
+        if not self.directory:
+            return
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if not is_digest(name):
+                    continue  # in-flight temp files
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _maybe_evict(self, keep: Set[str]) -> None:
+        """Evict least recently used blobs (never those in ``keep``) once over budget."""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._bytes is not None and self._bytes <= self.max_bytes:
+                return
+        # Recount: other workers may have added or evicted blobs meanwhile
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            with self._lock:
+                self._bytes = total
+            return
+        target = int(self.max_bytes * _LOW_WATER)
+        for _, size, path in files:
+            if total <= target:
+                break
+            if os.path.basename(path) in keep:
+                continue
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._bytes = total
+
+
+class AssetService:
+    """Holds the configured :class:`AssetStore` for the app."""
+
+    def __init__(self):
+        self.store = AssetStore()
+
+    def init_app(self, app) -> None:
+        """Configure the asset store from a Flask app's config."""
+        directory = app.config.get("ASSET_STORE_DIR") or os.path.join(
+            tempfile.gettempdir(), "typst-api-assets"
+        )
+        self.store = AssetStore(directory, app.config.get("ASSET_STORE_MAX_BYTES", 0))
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report the asset store's size for ``/metrics``."""
+        estimate = self.store.estimated_bytes
+        if estimate is not None:
+            yield "asset_store_bytes", "gauge", "Bytes held by the asset store", [
+                ({}, estimate)
+            ]
+        yield "asset_store_evictions_total", "counter", "Assets evicted", [
+            ({}, self.store.evictions)
+        ]
+
+
+# Singleton instance for use across routes
+asset_service = AssetService()
+metrics.collector(asset_service.collect_metrics)
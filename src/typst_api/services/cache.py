@@ -0,0 +1,249 @@
+"""Content-addressed render output cache."""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+_FRAME = struct.Struct(">Q")
+
+# Disk eviction frees space down to this fraction of the budget, so the
+# writes that follow do not each rescan the directory
+_DISK_LOW_WATER = 0.9
+
+
+def render_cache_key(source_digest: str, entrypoint: Optional[str], options) -> str:
+    """Build a cache key from a source digest and compile options.
+
+    ``ppi`` only affects PNG output, so it is left out of the key for
+    other formats to let PDF/SVG renders share entries.
+    """
+    parts = {
+        "source": source_digest,
+        "entrypoint": entrypoint,
+        "format": options.output_format,
+        "ppi": options.ppi if options.output_format == "png" else None,
+        "sys_inputs": sorted((options.sys_inputs or {}).items()),
+    }
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def document_key(
+    source_digest: str, entrypoint: Optional[str], sys_inputs: Optional[Dict[str, str]]
+) -> str:
+    """Identity of a laid-out document, independent of the export format."""
+    parts = {
+        "source": source_digest,
+        "entrypoint": entrypoint,
+        "sys_inputs": sorted((sys_inputs or {}).items()),
+    }
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def render_variant_key(source_digest: str, entrypoint: Optional[str], options) -> str:
+    """Identity of a response: its cache key plus page selection, container and stages.
+
+    Derived from the input hash and options alone. ``GET /render/<hash>``
+    remembers the ETag it last served under this key, so a conditional
+    request can be answered without loading the source or compiling.
+    """
+    parts = {
+        "key": render_cache_key(source_digest, entrypoint, options),
+        "pages": options.pages,
+        "archive": options.archive if options.pages is not None else None,
+    }
+    if options.outputs:
+        parts["outputs"] = options.outputs
+        parts["archive"] = options.archive
+    if options.postprocess:
+        parts["postprocess"] = options.postprocess
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """Byte-budgeted LRU cache of compiled pages with an optional disk tier.
+
+    Entries are lists of page bytes. The memory tier evicts least recently
+    used entries once ``max_bytes`` is exceeded; the disk tier (if
+    ``disk_dir`` is set) is shared by all workers pointing at the same
+    directory and evicts by access time once ``disk_max_bytes`` is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes: Optional[int] = None  # estimate; recounted on eviction
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    def get(self, key: str, count: bool = True) -> Optional[List[bytes]]:
+        """Return cached pages for ``key`` or None on a miss.
+
+        ``count=False`` probes the cache without touching the hit/miss
+        counters, for lookups that are not the request's own render.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            pages = self._entries.get(key)
+            if pages is not None:
+                self._entries.move_to_end(key)
+                self.hits += count
+                return pages
+
+        pages = self._disk_get(key)
+        with self._lock:
+            if pages is None:
+                self.misses += count
+                return None
+            self.hits += count
+            self.disk_hits += count
+            self._memory_put(key, pages)
+        return pages
+
+    def put(self, key: str, pages: List[bytes]) -> None:
+        """Store pages under ``key`` in every enabled tier."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._memory_put(key, pages)
+        self._disk_put(key, pages)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # -- memory tier (caller holds the lock) --------------------------------
+
+    def _memory_put(self, key: str, pages: List[bytes]) -> None:
+        size = sum(len(p) for p in pages)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= sum(len(p) for p in old)
+        self._entries[key] = pages
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= sum(len(p) for p in evicted)
+            self.evictions += 1
+
+    # -- disk tier ----------------------------------------------------------
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key: str) -> Optional[List[bytes]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        pages = []
+        offset = 0
+        while offset < len(data):
+            (length,) = _FRAME.unpack_from(data, offset)
+            offset += _FRAME.size
+            end = offset + length
+            pages.append(data[offset:end])
+            offset = end
+        return pages
+
+    def _disk_put(self, key: str, pages: List[bytes]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for page in pages:
+                    f.write(_FRAME.pack(len(page)))
+                    f.write(page)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += sum(_FRAME.size + len(page) for page in pages)
+        self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        if not self.disk_max_bytes:
+            return
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.disk_max_bytes:
+                return
+        # Recount: other workers may have added or evicted entries meanwhile
+        files = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.disk_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total > self.disk_max_bytes:
+            target = int(self.disk_max_bytes * _DISK_LOW_WATER)
+            for _, size, path in sorted(files):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= target:
+                    break
+        with self._lock:
+            self._disk_bytes = total
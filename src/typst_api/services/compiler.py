@@ -1,16 +1,78 @@
 """Typst compilation service."""
 
+import base64
+import hashlib
 import io
+import json
 import os
-import shutil
-import subprocess
+import tempfile
+import threading
 import uuid
 import zipfile
-from dataclasses import dataclass, field
-from typing import Any, Dict, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import typst
-from flask import Response, jsonify, send_file
+from flask import Response, has_request_context, jsonify, request, send_file, url_for
+from werkzeug.http import unquote_etag
+
+from ..utils.archive import stream_multipart, stream_zip
+from ..utils.parsers import PageRanges, format_outputs, format_pages, resolve_pages
+from ..utils.streams import disconnect_checker
+
+from .admission import admission_service, busy_response
+from .assets import AssetError, AssetRefs, asset_service
+from .cache import RenderCache, document_key, render_cache_key, render_variant_key
+from .executor import (
+    DEFAULT_PROCESS_LIMITS,
+    BackendBusyError,
+    CompileError,
+    CompileLimitError,
+    CompileLimits,
+    InlineBackend,
+    ProcessBackend,
+    current_rss,
+)
+from .fonts import FontIndex, parse_font_paths
+from .metrics import metrics
+from .packages import MissingPackagesError, package_service
+from .pool import CompilerPool, load_warmup_documents
+from .postprocess import (
+    applicable_stages,
+    apply_stages,
+    available_encodings,
+    content_encode,
+    postprocessed_key,
+)
+from .project import ProjectError, ProjectFiles, default_extract_dir, normalize_path
+from .templates import template_service
+from .thumbnails import (
+    ThumbnailError,
+    ThumbnailOptions,
+    covers,
+    encode,
+    fit_ppi,
+    page_size,
+    pillow,
+    thumbnail_cache_key,
+)
+
+# Opens a document for compiling: a context manager yielding ``(input, root)``
+CompileInput = Callable[[], ContextManager[Tuple[Union[str, bytes], Optional[str]]]]
 
 
 @dataclass
@@ -20,6 +82,20 @@ class CompileOptions:
     output_format: str = "pdf"
     ppi: float = 144.0
     sys_inputs: Optional[Dict[str, str]] = field(default=None)
+    # Page selection for PNG/SVG; None returns the first page only
+    pages: Optional[PageRanges] = field(default=None)
+    archive: str = "zip"
+    # Several (format, ppi) exports of one layout, returned as an archive
+    outputs: Optional[List[Tuple[str, float]]] = field(default=None)
+    # Post-export stages (see services/postprocess.py), run in order
+    postprocess: Optional[List[str]] = field(default=None)
+
+    def exports(self) -> List["CompileOptions"]:
+        """One single-format option set per entry of ``outputs``."""
+        return [
+            replace(self, output_format=output_format, ppi=ppi, outputs=None)
+            for output_format, ppi in self.outputs or ()
+        ]
 
 
 class CompilerService:
@@ -31,124 +107,1190 @@ class CompilerService:
         "svg": "image/svg+xml",
     }
 
+    def __init__(self):
+        self.render_cache = RenderCache()
+        self.thumbnail_cache = RenderCache()
+        self.thumbnail_base_ppi = 72.0
+        self.font_index = FontIndex()
+        self.compiler_pool = CompilerPool()
+        self.backend = InlineBackend(self.compiler_pool)
+        self.zip_max_entries = 0
+        self.zip_max_bytes = 0
+        self.extract_dir: Optional[str] = None
+        self.batch_concurrency = 1
+        self.compile_limits = CompileLimits()
+        self.route_limits: Dict[str, CompileLimits] = {}
+        self.store_submissions = False
+        self.stored_cache_control = "no-cache"
+        self.warmup = False
+        self.content_encodings: List[str] = []
+        self._probe_compiler: Optional[Any] = None
+        self._probe_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Configure the service from a Flask app's config."""
+        self.render_cache = RenderCache(
+            max_bytes=app.config.get("RENDER_CACHE_MAX_BYTES", 0),
+            disk_dir=app.config.get("RENDER_CACHE_DIR"),
+            disk_max_bytes=app.config.get("RENDER_CACHE_DIR_MAX_BYTES", 0),
+        )
+        self.thumbnail_cache = RenderCache(
+            max_bytes=app.config.get("THUMBNAIL_CACHE_MAX_BYTES", 0),
+            disk_dir=app.config.get("THUMBNAIL_CACHE_DIR"),
+            disk_max_bytes=app.config.get("THUMBNAIL_CACHE_DIR_MAX_BYTES", 0),
+        )
+        self.thumbnail_base_ppi = app.config.get("THUMBNAIL_BASE_PPI", 72.0)
+        self.zip_max_entries = app.config.get("ZIP_MAX_ENTRIES", 0)
+        self.zip_max_bytes = app.config.get("ZIP_MAX_UNCOMPRESSED_BYTES", 0)
+        self.extract_dir = app.config.get("ZIP_EXTRACT_DIR") or default_extract_dir()
+        self.batch_concurrency = max(1, app.config.get("BATCH_CONCURRENCY", 1))
+        self.store_submissions = app.config.get("RENDER_STORE_SUBMISSIONS", False)
+        self.stored_cache_control = app.config.get("RENDER_GET_CACHE_CONTROL", "no-cache")
+        self.content_encodings = available_encodings(
+            app.config.get("RENDER_CONTENT_ENCODINGS") or []
+        )
+        backend = app.config.get("COMPILE_BACKEND", "inline")
+        # Unset limits default to those of the process backend, the only one
+        # that can enforce them
+        defaults = DEFAULT_PROCESS_LIMITS if backend == "process" else CompileLimits()
+        timeout = app.config.get("COMPILE_TIMEOUT")
+        max_memory_bytes = app.config.get("COMPILE_MAX_MEMORY_BYTES")
+        self.compile_limits = CompileLimits(
+            timeout=defaults.timeout if timeout is None else timeout,
+            max_memory_bytes=(
+                defaults.max_memory_bytes if max_memory_bytes is None else max_memory_bytes
+            ),
+        )
+        self.route_limits = {
+            route: replace(self.compile_limits, **overrides)
+            for route, overrides in (app.config.get("COMPILE_ROUTE_LIMITS") or {}).items()
+        }
+        limited = any(
+            limits.timeout or limits.max_memory_bytes
+            for limits in [self.compile_limits, *self.route_limits.values()]
+        )
+        if backend == "inline" and limited:
+            app.logger.warning(
+                "COMPILE_TIMEOUT, COMPILE_MAX_MEMORY_BYTES and COMPILE_ROUTE_LIMITS are "
+                'only enforced with COMPILE_BACKEND = "process"; inline compiles run '
+                "to completion"
+            )
+        pool_kwargs = {
+            "size": app.config.get("COMPILER_POOL_SIZE", 0),
+            "max_uses": app.config.get("COMPILER_POOL_MAX_USES", 0),
+            "ignore_system_fonts": app.config.get("COMPILER_IGNORE_SYSTEM_FONTS", False),
+            "font_paths": parse_font_paths(app.config.get("FONT_PATHS")),
+            "package_dir": package_service.cache.directory,
+            "package_download": package_service.allow_download,
+            "warm_packages": package_service.warm_packages(),
+        }
+        self.warmup = app.config.get("WARMUP_ENABLED", False)
+        if self.warmup:
+            pool_kwargs["warm_documents"] = (
+                load_warmup_documents(app.config.get("WARMUP_DOCUMENTS"))
+                + template_service.warm_documents()
+            )
+            pool_kwargs["warm_formats"] = list(app.config.get("WARMUP_FORMATS") or ["pdf"])
+        self.font_index = FontIndex(
+            pool_kwargs["font_paths"],
+            include_system_fonts=not pool_kwargs["ignore_system_fonts"],
+            cache_file=app.config.get("FONT_INDEX_CACHE_FILE")
+            or os.path.join(tempfile.gettempdir(), "typst-api-font-index.json"),
+        )
+        self.font_index.load()
+        self.compiler_pool = CompilerPool(**pool_kwargs, font_index=self.font_index)
+        self._probe_compiler = None
+
+        self.backend.shutdown()
+        if backend == "inline":
+            # Not warmed here: a compile in a server master before it forks
+            # makes every later compile in the forked workers hang (see warm)
+            self.backend = InlineBackend(self.compiler_pool)
+        elif backend == "process":
+            self.backend = ProcessBackend(
+                workers=app.config.get("COMPILE_WORKERS") or os.cpu_count() or 1,
+                pool_kwargs=pool_kwargs,
+                max_jobs=app.config.get("COMPILE_WORKER_MAX_JOBS", 0),
+                max_rss_bytes=app.config.get("COMPILE_WORKER_MAX_RSS_BYTES", 0),
+                max_pending=app.config.get("COMPILE_MAX_PENDING", 0),
+            )
+        else:
+            raise ValueError(f"Unknown COMPILE_BACKEND: {backend}")
+
     def compile_and_respond(
-        self, compile_kwargs: Dict[str, Any], output_format: str
+        self,
+        compile_kwargs: Dict[str, Any],
+        options: CompileOptions,
+        cache_key: Optional[str] = None,
+        affinity: Optional[str] = None,
+    ) -> Tuple[Response, int]:
+        """Run typst.compile (or serve a cached result) and return a Flask response."""
+        if cache_key:
+            with metrics.stage("cache", options.output_format):
+                pages, cache_status = self.cached_pages(cache_key, options)
+            if pages is not None:
+                return self.send_pages(pages, options, cache_status)
+        return self._compile_and_send(compile_kwargs, options, cache_key, affinity)
+
+    def _compile_and_send(
+        self,
+        compile_kwargs: Dict[str, Any],
+        options: CompileOptions,
+        cache_key: Optional[str],
+        affinity: Optional[str] = None,
     ) -> Tuple[Response, int]:
-        """Run typst.compile and return a Flask response."""
         try:
-            result = typst.compile(**compile_kwargs)
-        except Exception as e:
-            return (
-                jsonify({"error": "Typst compilation failed", "details": str(e)}),
-                500,
+            pages = self.compile_pages(compile_kwargs, cache_key, affinity=affinity)
+        except BackendBusyError as e:
+            return busy_response(e)
+        except CompileError as e:
+            return compile_error_response(e)
+
+        if len(pages) == 0:
+            return jsonify({"error": "Compilation produced no output"}), 500
+        pages = self.postprocess(pages, options, cache_key)
+        return self.send_pages(pages, options, cache_status="miss")
+
+    def limits_for(self, route: str) -> CompileLimits:
+        """Compile limits for ``route`` (a URL rule, or ``job`` for background jobs)."""
+        return self.route_limits.get(route, self.compile_limits)
+
+    def request_limits(self) -> Tuple[CompileLimits, Optional[Callable[[], bool]]]:
+        """Limits and client-disconnect check for the current request."""
+        if not has_request_context():
+            return self.limits_for("job"), None
+        rule = request.url_rule.rule if request.url_rule is not None else ""
+        return self.limits_for(rule), disconnect_checker(request.environ)
+
+    def compile_pages(
+        self,
+        compile_kwargs: Dict[str, Any],
+        cache_key: Optional[str] = None,
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+        background: Optional[bool] = None,
+    ) -> List[bytes]:
+        """Compile on the configured backend and store the result in the cache.
+
+        Each compile holds an admission slot; foreground compiles give up with
+        :class:`~.admission.AdmissionError` once the wait queue is full or
+        its deadline passes. ``background`` defaults to whether there is no
+        current request, so helper threads working for a request must pass
+        ``False``. ``limits`` and ``cancelled`` default to those
+        of the current request; ``affinity`` (see :func:`.cache.document_key`)
+        lets the process backend reuse a worker's memoized layout. Raises
+        :class:`CompileError` (:class:`CompileLimitError` if the compile was
+        killed) or :class:`BackendBusyError`.
+        """
+        if limits is None:
+            limits, cancelled = self.request_limits()
+        output_format = compile_kwargs.get("format", "pdf")
+        with self._compiling(output_format, background):
+            pages = self.backend.compile(compile_kwargs, limits, cancelled, affinity)
+        self._compiled(output_format, pages, cache_key)
+        return pages
+
+    def compile_exports(
+        self,
+        compile_kwargs: Dict[str, Any],
+        exports: List[CompileOptions],
+        cache_keys: Optional[List[Optional[str]]] = None,
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+    ) -> List[List[bytes]]:
+        """Lay a document out once and export it once per entry of ``exports``.
+
+        ``compile_kwargs`` name the document (input, root, sys_inputs); each
+        export's pages are stored under its entry of ``cache_keys``. Holds a
+        single admission slot and raises as :meth:`compile_pages`.
+        """
+        if limits is None:
+            limits, cancelled = self.request_limits()
+        document = {k: v for k, v in compile_kwargs.items() if k not in ("format", "ppi")}
+        with self._compiling("multi"):
+            results = self.backend.compile_exports(
+                document, [export_kwargs(e) for e in exports], limits, cancelled, affinity
             )
+        for options, pages, cache_key in zip(exports, results, cache_keys or [None] * len(exports)):
+            self._compiled(options.output_format, pages, cache_key)
+        return results
 
-        # Multi-page PNG/SVG returns list[bytes]; take first page
-        if isinstance(result, list):
-            if len(result) == 0:
-                return jsonify({"error": "Compilation produced no output"}), 500
-            result = result[0]
+    @contextmanager
+    def _compiling(
+        self, output_format: str, background: Optional[bool] = None
+    ) -> Iterator[None]:
+        """Hold an admission slot around a backend call, counting failures."""
+        if background is None:
+            background = not has_request_context()
+        metrics.compiles_in_flight.inc()
+        try:
+            with ExitStack() as stack:
+                with metrics.stage("queue", output_format):
+                    stack.enter_context(
+                        admission_service.controller.slot(background=background)
+                    )
+                with metrics.stage("compile", output_format):
+                    yield
+        except BackendBusyError:
+            metrics.compile_errors.inc(format=output_format, reason="busy")
+            raise
+        except CompileLimitError as e:
+            metrics.compile_errors.inc(format=output_format, reason=e.code)
+            raise
+        except CompileError:
+            metrics.compile_errors.inc(format=output_format, reason="compile")
+            raise
+        finally:
+            metrics.compiles_in_flight.dec()
+
+    def _compiled(
+        self, output_format: str, pages: List[bytes], cache_key: Optional[str]
+    ) -> None:
+        metrics.compiles.inc(format=output_format)
+        if not pages:
+            metrics.compile_errors.inc(format=output_format, reason="empty")
+        if cache_key and pages:
+            self.render_cache.put(cache_key, pages)
+
+    def postprocess(
+        self, pages: List[bytes], options: CompileOptions, cache_key: Optional[str] = None
+    ) -> List[bytes]:
+        """Run the post-export stages of ``options`` over freshly compiled pages.
 
+        ``cache_key`` is the key the unprocessed pages were cached under;
+        the result is cached next to them (see :meth:`cached_pages`).
+        """
+        stages = applicable_stages(options.postprocess, options.output_format)
+        if not stages or not pages:
+            return pages
+        pages = apply_stages(pages, options.output_format, stages)
+        if cache_key:
+            self.render_cache.put(postprocessed_key(cache_key, stages), pages)
+        return pages
+
+    def cached_pages(
+        self, cache_key: str, options: CompileOptions
+    ) -> Tuple[Optional[List[bytes]], str]:
+        """Look up a render's post-processed pages; returns ``(pages, cache_status)``.
+
+        Without a cached result, a cached unprocessed render is put through
+        the stages instead of compiling (``derived``). ``pages`` is None on
+        a ``miss``.
+        """
+        stages = applicable_stages(options.postprocess, options.output_format)
+        pages = self.render_cache.get(postprocessed_key(cache_key, stages))
+        if pages is not None:
+            return pages, "hit"
+        if stages:
+            pages = self.render_cache.get(cache_key, count=False)
+            if pages is not None:
+                return self.postprocess(pages, options, cache_key), "derived"
+        return None, "miss"
+
+    def send_pages(
+        self,
+        pages: List[bytes],
+        options: CompileOptions,
+        cache_status: str = "miss",
+    ) -> Tuple[Response, int]:
+        """Build the download response for compiled pages.
+
+        Without a page selection only the first page is returned. A
+        selection of several pages is streamed back as a ZIP archive or a
+        multipart/mixed body, one entry per page. The ETag is a hash of the
+        returned bytes (weak for archives, whose container may differ).
+        """
+        with metrics.stage("encode", options.output_format):
+            return self._build_response(pages, options, cache_status)
+
+    def _build_response(
+        self, pages: List[bytes], options: CompileOptions, cache_status: str
+    ) -> Tuple[Response, int]:
+        output_format = options.output_format
         mimetype = self.FORMAT_MIMETYPES[output_format]
-        return (
-            send_file(
-                io.BytesIO(result),
+        selected = [1]
+        if options.pages is not None:
+            selected = resolve_pages(options.pages, len(pages))
+            if not selected:
+                return (
+                    jsonify(
+                        {
+                            "error": "No pages in requested range",
+                            "page_count": len(pages),
+                        }
+                    ),
+                    400,
+                )
+
+        if len(selected) == 1:
+            page = pages[selected[0] - 1]
+            etag = hashlib.blake2b(page, digest_size=16).hexdigest()
+            encoding = None
+            if output_format == "svg" and self.content_encodings and has_request_context():
+                encoding = request.accept_encodings.best_match(self.content_encodings)
+            if encoding:
+                page = self._content_encoded(page, encoding)
+                etag = f"{etag}-{encoding}"
+            # Sent in blocks with Content-Length; the ETag enables
+            # If-None-Match and Range/If-Range requests on large PDFs
+            response = send_file(
+                io.BytesIO(page),
                 mimetype=mimetype,
                 as_attachment=True,
                 download_name=f"output.{output_format}",
-            ),
-            200,
-        )
+                etag=etag,
+                conditional=True,
+            )
+            if output_format == "svg" and self.content_encodings:
+                response.vary.add("Accept-Encoding")
+                if encoding:
+                    response.headers["Content-Encoding"] = encoding
+        else:
+            entries = [(f"page-{n}.{output_format}", mimetype, pages[n - 1]) for n in selected]
+            response = _archive_response(entries, options.archive)
+
+        response.headers["X-Page-Count"] = str(len(pages))
+        if self.render_cache.enabled:
+            response.headers["X-Render-Cache"] = cache_status
+        return response, response.status_code
+
+    def _content_encoded(self, page: bytes, encoding: str) -> bytes:
+        """``page`` compressed for ``Content-Encoding``, cached by content."""
+        key = hashlib.sha256(encoding.encode("ascii") + b":" + page).hexdigest()
+        cached = self.render_cache.get(key, count=False)
+        if cached is not None:
+            return cached[0]
+        with metrics.stage(f"content_encoding_{encoding}", "svg"):
+            data = content_encode(page, encoding)
+        self.render_cache.put(key, [data])
+        return data
+
+    def send_outputs(
+        self,
+        results: List[List[bytes]],
+        options: CompileOptions,
+        cache_status: str = "miss",
+    ) -> Tuple[Response, int]:
+        """Stream several exports of one document as a ZIP or multipart body.
+
+        Entries are named ``output.pdf``, ``output.svg``, ``output-72ppi.png``
+        and so on; a page selection applies to PNG/SVG exports, whose
+        entries then get a ``-page-N`` suffix.
+        """
+        entries = []
+        page_count = None
+        for export, pages in zip(options.exports(), results):
+            output_format = export.output_format
+            if not pages:
+                return jsonify({"error": "Compilation produced no output"}), 500
+            stem = f"output-{export.ppi:g}ppi" if output_format == "png" else "output"
+            if output_format == "pdf" or options.pages is None:
+                selected = [(1, f"{stem}.{output_format}")]
+            else:
+                page_count = len(pages)
+                selected = [
+                    (n, f"{stem}-page-{n}.{output_format}")
+                    for n in resolve_pages(options.pages, len(pages))
+                ]
+                if not selected:
+                    return (
+                        jsonify({"error": "No pages in requested range", "page_count": len(pages)}),
+                        400,
+                    )
+            mimetype = self.FORMAT_MIMETYPES[output_format]
+            entries.extend((name, mimetype, pages[n - 1]) for n, name in selected)
+
+        with metrics.stage("encode", "multi"):
+            response = _archive_response(entries, options.archive)
+        if page_count is not None:
+            response.headers["X-Page-Count"] = str(page_count)
+        if self.render_cache.enabled:
+            response.headers["X-Render-Cache"] = cache_status
+        return response, response.status_code
 
     def compile_raw(
         self, source: Union[str, bytes], options: CompileOptions
     ) -> Tuple[Response, int]:
-        """Compile raw Typst source in memory."""
-        compile_kwargs: Dict[str, Any] = {
-            "input": source.encode("utf-8") if isinstance(source, str) else source,
-            "format": options.output_format,
-        }
-        if options.output_format == "png":
-            compile_kwargs["ppi"] = options.ppi
-        if options.sys_inputs:
-            compile_kwargs["sys_inputs"] = options.sys_inputs
+        """Compile raw Typst source in memory.
 
-        return self.compile_and_respond(compile_kwargs, options.output_format)
+        Cached as the one-file project ``GET /render/<hash>`` loads for it,
+        so either route's render is a hit for the other.
+        """
+        source_bytes = source.encode("utf-8") if isinstance(source, str) else source
+        try:
+            package_service.check([source_bytes])
+        except MissingPackagesError as e:
+            return missing_packages_response(e)
+        project = ProjectFiles({"main.typ": source_bytes})
+
+        if options.outputs:
+            response, status = self.respond(
+                partial(self.render_exports, project, "main.typ", options), options
+            )
+        else:
+            digest = project.digest()
+            compile_kwargs = build_compile_kwargs(source_bytes, None, options)
+            cache_key = None
+            if self.render_cache.enabled:
+                cache_key = render_cache_key(digest, "main.typ", options)
+            response, status = self.compile_and_respond(
+                compile_kwargs,
+                options,
+                cache_key,
+                document_key(digest, "main.typ", options.sys_inputs),
+            )
+        if status == 200 and self.store_submissions:
+            self._link_stored(
+                response,
+                lambda: asset_service.store.put(source_bytes)[0],
+                "main.typ",
+                options,
+            )
+        return response, status
 
     def compile_zip(
-        self, zip_file, entrypoint: str, options: CompileOptions
+        self,
+        zip_file,
+        entrypoint: str,
+        options: CompileOptions,
+        refs: Optional[AssetRefs] = None,
     ) -> Tuple[Response, int]:
-        """Extract ZIP and compile Typst project."""
-        file_id = str(uuid.uuid4())
-        extract_dir = f"/tmp/{file_id}"
-        os.makedirs(extract_dir, exist_ok=True)
+        """Load a ZIP upload into memory and compile the Typst project."""
+        project, zip_err = self.load_zip(zip_file, refs)
+        if zip_err:
+            return zip_err
+        return self.compile_project(project, entrypoint, options)
 
-        try:
-            zip_path = f"{extract_dir}/upload.zip"
-            zip_file.save(zip_path)
+    def load_zip(
+        self, zip_file, refs: Optional[AssetRefs] = None
+    ) -> Tuple[Optional[ProjectFiles], Optional[Tuple[Response, int]]]:
+        """Read a ZIP upload into an in-memory project.
 
-            try:
-                with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                    zip_ref.extractall(extract_dir)
-            except zipfile.BadZipFile:
-                return jsonify({"error": "Invalid zip file"}), 400
+        With ``refs``, the project starts from stored assets and the
+        uploaded ZIP (if any) is a delta laid over them.
 
-            input_typ = os.path.join(extract_dir, entrypoint)
-            if not os.path.exists(input_typ):
-                return (
-                    jsonify(
-                        {
-                            "error": f"Entrypoint not found: {entrypoint}",
-                            "hint": "Ensure the .typ file exists at the root of the ZIP archive",
-                        }
-                    ),
-                    400,
+        Returns:
+            (project, None) on success
+            (None, error_response) on failure
+        """
+        project = ProjectFiles()
+        if refs is not None:
+            project, ref_err = self.load_refs(refs)
+            if ref_err:
+                return None, ref_err
+        if zip_file is None:
+            return project, None
+
+        try:
+            with metrics.stage("extract"):
+                upload = ProjectFiles.from_zip(
+                    zip_file.stream,
+                    max_entries=self.zip_max_entries,
+                    max_bytes=self.zip_max_bytes,
                 )
+        except zipfile.BadZipFile:
+            return None, (jsonify({"error": "Invalid zip file"}), 400)
+        except ProjectError as e:
+            return None, (jsonify({"error": str(e)}), e.status_code)
+        project.files.update(upload.files)
+        return project, None
 
-            compile_kwargs: Dict[str, Any] = {
-                "input": input_typ,
-                "root": extract_dir,
-                "format": options.output_format,
-            }
-            if options.output_format == "png":
-                compile_kwargs["ppi"] = options.ppi
-            if options.sys_inputs:
-                compile_kwargs["sys_inputs"] = options.sys_inputs
+    @staticmethod
+    def load_refs(
+        refs: AssetRefs,
+    ) -> Tuple[Optional[ProjectFiles], Optional[Tuple[Response, int]]]:
+        """Build a project from stored assets.
 
-            return self.compile_and_respond(compile_kwargs, options.output_format)
-        finally:
-            shutil.rmtree(extract_dir, ignore_errors=True)
+        Returns:
+            (project, None) on success
+            (None, error_response) on failure
+        """
+        try:
+            with metrics.stage("assets"):
+                return asset_service.store.resolve(refs), None
+        except AssetError as e:
+            body = {"error": str(e)}
+            if e.missing:
+                body["missing"] = e.missing
+            return None, (jsonify(body), e.status_code)
+
+    def compile_project(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        options: CompileOptions,
+        stored: bool = False,
+    ) -> Tuple[Response, int]:
+        """Compile an in-memory project tree.
+
+        Unless the project already came from the store (``stored``),
+        a successful render is stored per ``RENDER_STORE_SUBMISSIONS`` and
+        linked to its ``GET /render/<hash>`` URL.
+        """
+        entrypoint = normalize_path(entrypoint) or entrypoint
+        if entrypoint not in project:
+            return (
+                jsonify(
+                    {
+                        "error": f"Entrypoint not found: {entrypoint}",
+                        "hint": "Ensure the .typ file exists at the root of the ZIP archive",
+                    }
+                ),
+                400,
+            )
+
+        render = self.render_exports if options.outputs else self.render_project
+        response, status = self.respond(
+            partial(render, project, entrypoint, options), options
+        )
+        if status == 200 and not stored and self.store_submissions:
+            self._link_stored(
+                response,
+                lambda: asset_service.store.put_project(project)[0],
+                entrypoint,
+                options,
+            )
+        return response, status
+
+    def respond(
+        self,
+        render: Callable[[], Tuple[Any, str]],
+        options: CompileOptions,
+    ) -> Tuple[Response, int]:
+        """Build the response for ``render()``, turning its errors into error responses.
+
+        ``render`` returns ``(pages, cache_status)`` as :meth:`render_project`
+        does, or per-export results as :meth:`render_exports` when
+        ``options.outputs`` is set.
+        """
+        try:
+            result, cache_status = render()
+        except MissingPackagesError as e:
+            return missing_packages_response(e)
+        except BackendBusyError as e:
+            return busy_response(e)
+        except CompileError as e:
+            return compile_error_response(e)
+
+        if options.outputs:
+            return self.send_outputs(result, options, cache_status)
+        if len(result) == 0:
+            return jsonify({"error": "Compilation produced no output"}), 500
+        return self.send_pages(result, options, cache_status)
+
+    def render_stored(
+        self, digest: str, entrypoint: str, options: CompileOptions
+    ) -> Tuple[Response, int]:
+        """Render a stored source or project (``GET /render/<hash>``).
+
+        Compiles are not byte-reproducible (PDFs embed the compile time), so
+        the ETag is that of the bytes served, as for any render. The last
+        one served is remembered per hash and options: a matching
+        ``If-None-Match`` is answered with 304 before the source is loaded
+        or compiled, and any other goes through the usual conditional
+        handling against the bytes actually served.
+        """
+        variant = render_variant_key(digest, entrypoint, options)
+        served = self.render_cache.get(variant, count=False)
+        if served is not None:
+            etag, weak = unquote_etag(served[0].decode("ascii"))
+            if weak:
+                matches = request.if_none_match.contains_weak(etag)
+            else:
+                matches = request.if_none_match.contains(etag)
+            if matches:
+                return self._not_modified(etag, weak)
+
+        project, load_err = self._load_stored(digest, entrypoint)
+        if load_err:
+            return load_err
+        response, status = self.compile_project(project, entrypoint, options, stored=True)
+        if status in (200, 206, 304):
+            response.headers["Cache-Control"] = self.stored_cache_control
+            if "ETag" in response.headers:
+                self.render_cache.put(variant, [response.headers["ETag"].encode("ascii")])
+        return response, status
+
+    def render_stored_thumbnail(
+        self,
+        digest: str,
+        entrypoint: str,
+        sys_inputs: Optional[Dict[str, str]],
+        thumb: ThumbnailOptions,
+    ) -> Tuple[Response, int]:
+        """Thumbnail of a stored source or project (``GET /render/<hash>/thumbnail``)."""
+        etag = thumbnail_cache_key(digest, entrypoint, sys_inputs, thumb)
+        if request.if_none_match.contains(etag):
+            return self._not_modified(etag)
+
+        project, load_err = self._load_stored(digest, entrypoint)
+        if load_err:
+            return load_err
+        response, status = self.render_thumbnail(project, entrypoint, sys_inputs, thumb, etag)
+        if status in (200, 304):
+            response.headers["Cache-Control"] = self.stored_cache_control
+        return response, status
+
+    def _not_modified(self, etag: str, weak: bool = False) -> Tuple[Response, int]:
+        response = Response(status=304)
+        response.set_etag(etag, weak)
+        response.headers["Cache-Control"] = self.stored_cache_control
+        return response, 304
 
     @staticmethod
-    def health_check() -> Tuple[Dict[str, str], int]:
-        """Verify typst-py can compile."""
+    def _load_stored(
+        digest: str, entrypoint: str
+    ) -> Tuple[Optional[ProjectFiles], Optional[Tuple[Response, int]]]:
         try:
-            typst.compile(b"ok")
-            return {"status": "healthy", "compiler": "typst-py"}, 200
-        except Exception as e:
-            return {"status": "unhealthy", "error": str(e)}, 503
+            with metrics.stage("assets"):
+                return asset_service.store.load(digest, entrypoint), None
+        except AssetError as e:
+            body = {"error": str(e)}
+            if e.missing:
+                body["missing"] = e.missing
+            return None, (jsonify(body), e.status_code)
+
+    def render_thumbnail(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        sys_inputs: Optional[Dict[str, str]],
+        thumb: ThumbnailOptions,
+        etag: Optional[str] = None,
+    ) -> Tuple[Response, int]:
+        """Build the response for a first-page thumbnail of ``entrypoint``.
+
+        ``X-Render-Cache`` tells whether it came from the thumbnail cache
+        (``hit``), was derived from a cached render without compiling
+        (``derived``) or needed a compile (``miss``).
+        """
+        entrypoint = normalize_path(entrypoint) or entrypoint
+        if entrypoint not in project:
+            return jsonify({"error": f"Entrypoint not found: {entrypoint}"}), 400
+        try:
+            data, cache_status = self.thumbnail(project, entrypoint, sys_inputs, thumb)
+        except MissingPackagesError as e:
+            return missing_packages_response(e)
+        except ThumbnailError as e:
+            return jsonify({"error": str(e)}), e.status_code
+        except BackendBusyError as e:
+            return busy_response(e)
+        except CompileError as e:
+            return compile_error_response(e)
+
+        response = send_file(
+            io.BytesIO(data),
+            mimetype=thumb.mimetype,
+            download_name=f"thumbnail.{thumb.format}",
+            etag=etag or hashlib.blake2b(data, digest_size=16).hexdigest(),
+            conditional=True,
+        )
+        response.headers["X-Render-Cache"] = cache_status
+        return response, response.status_code
+
+    def thumbnail(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        sys_inputs: Optional[Dict[str, str]],
+        thumb: ThumbnailOptions,
+    ) -> Tuple[bytes, str]:
+        """Render (or look up) a thumbnail; returns ``(data, cache_status)``.
+
+        The first page is taken from a cached PNG render at
+        ``THUMBNAIL_BASE_PPI`` or the default PPI and downscaled when that
+        covers the box. Otherwise the page size is read from whichever
+        render is at hand (cached PDF/SVG/PNG, else a fresh base PNG that
+        stays in the render cache) and the page is rasterised at the PPI
+        that fits the box. Raises :class:`CompileError`,
+        :class:`BackendBusyError` or :class:`ThumbnailError`.
+        """
+        package_service.check(project.sources())
+        digest = project.digest()
+        key = thumbnail_cache_key(digest, entrypoint, sys_inputs, thumb)
+        with metrics.stage("cache", "thumbnail"):
+            cached = self.thumbnail_cache.get(key)
+        if cached is not None:
+            return cached[0], "hit"
+
+        cache_status = "derived"
+        with metrics.stage("cache", "png"):
+            base = self._cached_first_page(digest, entrypoint, sys_inputs)
+        if base is None:
+            options = CompileOptions("png", self.thumbnail_base_ppi, sys_inputs)
+            base = self._first_page(project, entrypoint, options), options
+            cache_status = "miss"
+        page, options = base
+        if options.output_format != "png" or pillow() is None or not covers(page, thumb):
+            size = page_size(page, options.output_format, options.ppi)
+            if size is None:
+                raise ThumbnailError("Could not determine the page size", 500)
+            fitted = CompileOptions("png", round(fit_ppi(size, thumb), 3), sys_inputs)
+            page = self._first_page(project, entrypoint, fitted)
+            cache_status = "miss"
+
+        with metrics.stage("encode", "thumbnail"):
+            data = encode(page, thumb)
+        self.thumbnail_cache.put(key, [data])
+        return data, cache_status
+
+    def _cached_first_page(
+        self, digest: str, entrypoint: str, sys_inputs: Optional[Dict[str, str]]
+    ) -> Optional[Tuple[bytes, CompileOptions]]:
+        """First page of a cached render of the document, PNG renders first."""
+        candidates = [
+            CompileOptions("png", self.thumbnail_base_ppi, sys_inputs),
+            CompileOptions("png", CompileOptions.ppi, sys_inputs),
+            CompileOptions("pdf", sys_inputs=sys_inputs),
+            CompileOptions("svg", sys_inputs=sys_inputs),
+        ]
+        for options in candidates:
+            pages = self.render_cache.get(
+                render_cache_key(digest, entrypoint, options), count=False
+            )
+            if pages:
+                return pages[0], options
+        return None
+
+    def _first_page(
+        self, project: ProjectFiles, entrypoint: str, options: CompileOptions
+    ) -> bytes:
+        pages, _ = self.render_project(project, entrypoint, options)
+        if not pages:
+            raise CompileError("Compilation produced no output")
+        return pages[0]
 
     @staticmethod
-    def list_fonts() -> Tuple[Dict[str, Any], int]:
-        """List available fonts (requires Typst CLI)."""
+    def _link_stored(
+        response: Response, store: Callable[[], str], entrypoint: str, options: CompileOptions
+    ) -> None:
+        """Store a submission and point ``Content-Location`` at its GET URL."""
         try:
-            result = subprocess.run(
-                ["typst", "fonts"], capture_output=True, text=True, timeout=30
+            with metrics.stage("store"):
+                digest = store()
+        except OSError:
+            return  # the render itself succeeded; only the link is lost
+        response.headers["Content-Location"] = url_for(
+            "render.render_stored", digest=digest, **stored_render_params(entrypoint, options)
+        )
+
+    def render_project(
+        self, project: ProjectFiles, entrypoint: str, options: CompileOptions
+    ) -> Tuple[List[bytes], str]:
+        """Compile ``entrypoint`` of ``project``, going through the render cache.
+
+        Returns ``(pages, cache_status)``. Raises :class:`CompileError`
+        (:class:`MissingPackagesError` for packages missing from the offline
+        cache) or :class:`BackendBusyError`.
+        """
+        package_service.check(project.sources())
+        return self.render_input(
+            project.digest(), entrypoint, options, lambda: self.project_input(project, entrypoint)
+        )
+
+    def render_input(
+        self,
+        digest: str,
+        entrypoint: Optional[str],
+        options: CompileOptions,
+        compile_input: CompileInput,
+    ) -> Tuple[List[bytes], str]:
+        """Render a document cached under ``digest``/``entrypoint``.
+
+        ``compile_input`` is only opened on a cache miss. Returns
+        ``(pages, cache_status)`` and raises as :meth:`render_project`.
+        """
+        cache_key = None
+        if self.render_cache.enabled:
+            with metrics.stage("cache", options.output_format):
+                cache_key = render_cache_key(digest, entrypoint, options)
+                pages, cache_status = self.cached_pages(cache_key, options)
+            if pages is not None:
+                return pages, cache_status
+
+        affinity = document_key(digest, entrypoint, options.sys_inputs)
+        with compile_input() as (input, root):
+            compile_kwargs = build_compile_kwargs(input, root, options)
+            pages = self.compile_pages(compile_kwargs, cache_key, affinity=affinity)
+        return self.postprocess(pages, options, cache_key), "miss"
+
+    def render_exports(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        options: CompileOptions,
+    ) -> Tuple[List[List[bytes]], str]:
+        """Render every export in ``options.outputs``, laying the document out once.
+
+        Exports found in the render cache are reused; the rest are exported
+        from a single layout and cached one by one, so later single-format
+        requests hit them too. Returns ``(results, cache_status)`` and
+        raises as :meth:`render_project`.
+        """
+        package_service.check(project.sources())
+        return self.render_input_exports(
+            project.digest(),
+            entrypoint,
+            options,
+            lambda: self.project_input(project, entrypoint),
+        )
+
+    def render_input_exports(
+        self,
+        digest: str,
+        entrypoint: Optional[str],
+        options: CompileOptions,
+        compile_input: CompileInput,
+    ) -> Tuple[List[List[bytes]], str]:
+        """:meth:`render_exports` for a document opened by ``compile_input``.
+
+        Exports are cached under ``digest``/``entrypoint``, as for
+        :meth:`render_input`.
+        """
+        exports = options.exports()
+        results: List[Optional[List[bytes]]] = [None] * len(exports)
+        cache_keys: List[Optional[str]] = [None] * len(exports)
+        cache_status = "hit"
+        if self.render_cache.enabled:
+            with metrics.stage("cache", "multi"):
+                for i, export in enumerate(exports):
+                    cache_keys[i] = render_cache_key(digest, entrypoint, export)
+                    results[i], status = self.cached_pages(cache_keys[i], export)
+                    if status == "derived":
+                        cache_status = status
+
+        missing = [i for i, pages in enumerate(results) if pages is None]
+        if missing:
+            affinity = document_key(digest, entrypoint, options.sys_inputs)
+            with compile_input() as (input, root):
+                compiled = self.compile_exports(
+                    build_compile_kwargs(input, root, options),
+                    [exports[i] for i in missing],
+                    [cache_keys[i] for i in missing],
+                    affinity=affinity,
+                )
+            for i, pages in zip(missing, compiled):
+                results[i] = self.postprocess(pages, exports[i], cache_keys[i])
+        return results, "miss" if missing else cache_status
+
+    @contextmanager
+    def project_input(
+        self, project: ProjectFiles, entrypoint: str
+    ) -> Iterator[Tuple[Union[str, bytes], Optional[str]]]:
+        """Yield ``(input, root)`` for compiling ``entrypoint`` of ``project``."""
+        if len(project) == 1:
+            # Nothing to import: compile the entrypoint straight from memory
+            yield project.files[entrypoint], None
+            return
+        with ExitStack() as stack:
+            with metrics.stage("materialize"):
+                root = stack.enter_context(project.materialize(self.extract_dir))
+            yield os.path.join(root, entrypoint), root
+
+    def compile_batch(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        records: List[Dict[str, str]],
+        options: CompileOptions,
+        output: str = "zip",
+    ) -> Tuple[Response, int]:
+        """Render one project once per ``sys_inputs`` record.
+
+        The project is loaded once and every record is compiled against the
+        same tree, fanned out over ``BATCH_CONCURRENCY`` threads feeding the
+        compile backend. Results are streamed back in record order as a ZIP
+        (with a ``manifest.json`` of per-item status) or as NDJSON lines.
+        """
+        entrypoint = normalize_path(entrypoint) or entrypoint
+        if entrypoint not in project:
+            return jsonify({"error": f"Entrypoint not found: {entrypoint}"}), 400
+        try:
+            package_service.check(project.sources())
+        except MissingPackagesError as e:
+            return missing_packages_response(e)
+
+        digest = project.digest() if self.render_cache.enabled else None
+        width = len(str(len(records)))
+        mimetype = self.FORMAT_MIMETYPES[options.output_format]
+
+        # Record threads run outside the request; capture its limits and
+        # admission class now so records queue like the request itself
+        limits, cancelled = self.request_limits()
+        background = not has_request_context()
+
+        def render(project_input, index, record):
+            item_options = replace(options, sys_inputs=record or None)
+            name = f"{index + 1:0{width}d}.{options.output_format}"
+            cache_key = None
+            if digest:
+                cache_key = render_cache_key(digest, entrypoint, item_options)
+                pages, _ = self.cached_pages(cache_key, item_options)
+                if pages:
+                    return index, name, pages[0], None
+            compile_kwargs = build_compile_kwargs(*project_input, item_options)
+            try:
+                pages = self.compile_pages(
+                    compile_kwargs, cache_key, limits, cancelled, background=background
+                )
+            except BackendBusyError as e:
+                return index, name, None, {"error": "Compiler busy", "details": str(e)}
+            except CompileLimitError as e:
+                return index, name, None, {
+                    "error": "Compile stopped",
+                    "code": e.code,
+                    "details": str(e),
+                }
+            except CompileError as e:
+                return index, name, None, {
+                    "error": "Typst compilation failed",
+                    "details": str(e),
+                }
+            if not pages:
+                return index, name, None, {"error": "Compilation produced no output"}
+            pages = self.postprocess(pages, item_options, cache_key)
+            return index, name, pages[0], None
+
+        def results():
+            with self.project_input(project, entrypoint) as project_input:
+                with ThreadPoolExecutor(self.batch_concurrency) as executor:
+                    # Keep a bounded window in flight so finished outputs do
+                    # not pile up in memory ahead of a slow client
+                    window: Deque[Future] = deque()
+                    for index, record in enumerate(records):
+                        window.append(
+                            executor.submit(render, project_input, index, record)
+                        )
+                        if len(window) >= 2 * self.batch_concurrency:
+                            yield window.popleft().result()
+                    while window:
+                        yield window.popleft().result()
+
+        if output == "ndjson":
+            return (
+                Response(
+                    _batch_ndjson(results(), mimetype), mimetype="application/x-ndjson"
+                ),
+                200,
             )
-            if result.returncode != 0:
-                return {"error": "Failed to list fonts"}, 500
-            fonts = [
-                line.strip()
-                for line in result.stdout.strip().split("\n")
-                if line.strip()
+
+        response = Response(
+            stream_zip(_batch_zip_entries(results(), mimetype)), mimetype="application/zip"
+        )
+        response.headers["Content-Disposition"] = 'attachment; filename="batch.zip"'
+        return response, 200
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report cache, backend and memory figures for ``/metrics``."""
+        cache = self.render_cache.stats()
+        yield "render_cache_lookups_total", "counter", "Render cache lookups", [
+            ({"result": "hit"}, cache["hits"]),
+            ({"result": "miss"}, cache["misses"]),
+            ({"result": "disk_hit"}, cache["disk_hits"]),
+        ]
+        yield "render_cache_evictions_total", "counter", "Render cache evictions", [
+            ({}, cache["evictions"])
+        ]
+        yield "render_cache_bytes", "gauge", "Bytes held by the memory cache", [
+            ({}, cache["bytes"])
+        ]
+        thumbnails = self.thumbnail_cache.stats()
+        yield "thumbnail_cache_lookups_total", "counter", "Thumbnail cache lookups", [
+            ({"result": "hit"}, thumbnails["hits"]),
+            ({"result": "miss"}, thumbnails["misses"]),
+        ]
+        yield "thumbnail_cache_bytes", "gauge", "Bytes held by the thumbnail cache", [
+            ({}, thumbnails["bytes"])
+        ]
+        backend = self.backend.stats()
+        yield "process_rss_bytes", "gauge", "Resident memory of this process", [
+            ({}, current_rss())
+        ]
+        if "rss" in backend:
+            yield "compile_worker_rss_bytes", "gauge", "Resident memory per compile worker", [
+                ({"worker": str(i)}, rss) for i, rss in enumerate(backend["rss"])
+            ]
+            yield "compile_pending", "gauge", "Compiles running or queued for a worker", [
+                ({}, backend["pending"])
+            ]
+            yield "compile_workers_recycled_total", "counter", "Compile workers recycled", [
+                ({}, backend["recycled"])
+            ]
+            yield "compile_workers_killed_total", "counter", "Compiles killed over a limit", [
+                ({}, backend["killed"])
             ]
-            return {"fonts": fonts, "count": len(fonts)}, 200
-        except (subprocess.SubprocessError, FileNotFoundError):
-            return {
-                "error": "Font listing requires the Typst CLI binary",
-                "hint": "Install the typst CLI or use the Docker image",
-            }, 503
+            yield "compile_affinity_hits_total", "counter", "Compiles reusing a worker's layout", [
+                ({}, backend["affinity_hits"])
+            ]
+
+    def warm(self) -> None:
+        """Bring the backend to steady state in this process (``WARMUP_ENABLED``).
+
+        Runs in each server worker after it forks (``health_service.start``),
+        never in :meth:`init_app`: a Typst compile before ``fork()`` makes
+        every later compile in the child hang, and process-backend workers
+        must not be spawned by a master either.
+        Without ``WARMUP_ENABLED``, the inline backend still loads the warm
+        packages (process workers load them as they start).
+        """
+        if self.warmup or (
+            isinstance(self.backend, InlineBackend) and self.compiler_pool.warm_packages
+        ):
+            self.backend.warm()
+
+    def probe(self, timeout: float = 0) -> None:
+        """Compile a one-word document on the configured backend.
+
+        Goes through the same worker processes as renders, but not through
+        admission control. The inline backend probes on a compiler of its
+        own rather than a pooled one, so a busy pool cannot hold the probe
+        up and make the node look broken. Raises on failure, including
+        :class:`BackendBusyError` when no process-backend worker frees up
+        within ``timeout`` (which also bounds the compile; 0 waits forever).
+        """
+        if isinstance(self.backend, InlineBackend):
+            with self._probe_lock:
+                if self._probe_compiler is None:
+                    self._probe_compiler = self.compiler_pool.new_compiler()
+                self._probe_compiler.compile(
+                    input=b"ok", root=self.compiler_pool.empty_root, format="pdf"
+                )
+            return
+        self.backend.compile(
+            {"input": b"ok", "format": "pdf"},
+            CompileLimits(timeout=timeout),
+            wait=timeout or None,
+        )
+
+    def list_fonts(self) -> Tuple[Dict[str, Any], int]:
+        """List available font families and their variants from the font index."""
+        try:
+            families = self.font_index.families()
+        except Exception as e:
+            return {"error": "Failed to list fonts", "details": str(e)}, 500
+        return {
+            "fonts": [f["family"] for f in families],
+            "count": len(families),
+            "variants": sum(len(f["variants"]) for f in families),
+            "families": families,
+        }, 200
+
+
+def stored_render_params(entrypoint: str, options: CompileOptions) -> Dict[str, str]:
+    """Query parameters of the ``GET /render/<hash>`` URL for a render."""
+    if options.outputs:
+        params = {"outputs": format_outputs(options.outputs)}
+    else:
+        params = {"format": options.output_format}
+        if options.output_format == "png":
+            params["ppi"] = f"{options.ppi:g}"
+    if entrypoint != "main.typ":
+        params["entrypoint"] = entrypoint
+    if options.sys_inputs:
+        params["sys_inputs"] = json.dumps(options.sys_inputs, sort_keys=True)
+    if options.pages is not None:
+        params["pages"] = format_pages(options.pages)
+    if (options.pages is not None or options.outputs) and options.archive != "zip":
+        params["archive"] = options.archive
+    if options.postprocess:
+        params["postprocess"] = ",".join(options.postprocess)
+    return params
+
+
+def compile_error_response(e: CompileError) -> Tuple[Response, int]:
+    """Error response for a failed compile; killed compiles carry a ``code``."""
+    if isinstance(e, CompileLimitError):
+        return (
+            jsonify({"error": "Compile stopped", "code": e.code, "details": str(e)}),
+            e.status_code,
+        )
+    return jsonify({"error": "Typst compilation failed", "details": str(e)}), 500
+
+
+def _archive_response(entries, archive: str) -> Response:
+    """Stream ``(name, mimetype, data)`` entries as a ZIP or multipart/mixed body.
+
+    The weak ETag covers the entries, not the container bytes around them.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, _, data in entries:
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(hashlib.blake2b(data, digest_size=16).digest())
+    if archive == "multipart":
+        boundary = uuid.uuid4().hex
+        response = Response(
+            stream_multipart(iter(entries), boundary),
+            mimetype=f"multipart/mixed; boundary={boundary}",
+        )
+    else:
+        response = Response(stream_zip(iter(entries)), mimetype="application/zip")
+        response.headers["Content-Disposition"] = 'attachment; filename="output.zip"'
+    response.set_etag(digest.hexdigest(), weak=True)
+    return response
+
+
+def missing_packages_response(e: MissingPackagesError) -> Tuple[Response, int]:
+    """Error response listing packages missing from the offline cache."""
+    return (
+        jsonify(
+            {
+                "error": "Packages not in the offline cache",
+                "missing": e.missing,
+                "hint": "Seed them with PUT /packages or 'typst-api packages seed'",
+            }
+        ),
+        422,
+    )
+
+
+def _batch_ndjson(results, mimetype: str) -> Iterator[bytes]:
+    for index, name, data, error in results:
+        if error is None:
+            line = {
+                "index": index,
+                "status": "ok",
+                "filename": name,
+                "content_type": mimetype,
+                "data": base64.b64encode(data).decode("ascii"),
+            }
+        else:
+            line = {"index": index, "status": "error", **error}
+        yield json.dumps(line).encode("utf-8") + b"\n"
+
+
+def _batch_zip_entries(results, mimetype: str) -> Iterator[Tuple[str, str, bytes]]:
+    manifest = []
+    for index, name, data, error in results:
+        if error is None:
+            manifest.append({"index": index, "status": "ok", "filename": name})
+            yield name, mimetype, data
+        else:
+            manifest.append({"index": index, "status": "error", **error})
+    yield "manifest.json", "application/json", json.dumps(manifest, indent=2).encode()
+
+
+def build_compile_kwargs(
+    input: Union[str, bytes], root: Optional[str], options: CompileOptions
+) -> Dict[str, Any]:
+    """Build keyword arguments for a compile backend."""
+    compile_kwargs: Dict[str, Any] = {"input": input, **export_kwargs(options)}
+    if root is not None:
+        compile_kwargs["root"] = root
+    if options.sys_inputs:
+        compile_kwargs["sys_inputs"] = options.sys_inputs
+    return compile_kwargs
+
+
+def export_kwargs(options: CompileOptions) -> Dict[str, Any]:
+    """The export part of the compile keyword arguments (format and PNG ppi)."""
+    kwargs: Dict[str, Any] = {"format": options.output_format}
+    if options.output_format == "png":
+        kwargs["ppi"] = options.ppi
+    return kwargs
 
 
 # Singleton instance for use across routes
 compiler_service = CompilerService()
+metrics.collector(compiler_service.collect_metrics)
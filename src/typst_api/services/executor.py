@@ -0,0 +1,486 @@
+"""Compile execution backends.
+
+The inline backend compiles on the calling (request) thread using a warm
+:class:`CompilerPool`. The process backend hands compiles to a set of
+long-lived worker processes, each with its own warm pool, so concurrent
+renders use every core instead of contending for one interpreter.
+
+A compile job either exports one format (``compile``) or exports the same
+document in several formats and resolutions (``compile_exports``); Typst
+memoizes layout per process, so the extra exports skip layout.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .pool import CompilerPool
+
+# How often a waiting request checks its compile's limits (seconds)
+_LIMIT_POLL_INTERVAL = 0.05
+
+# Documents remembered for routing repeat exports to the same worker
+_MAX_AFFINITIES = 4096
+
+
+class CompileError(Exception):
+    """Typst reported an error while compiling the document."""
+
+
+class CompileLimitError(CompileError):
+    """A compile was killed before it finished."""
+
+    code = "compile_killed"
+    status_code = 500
+
+
+class CompileTimeoutError(CompileLimitError):
+    """The compile ran longer than its wall-clock limit."""
+
+    code = "compile_timeout"
+    status_code = 504
+
+
+class CompileMemoryError(CompileLimitError):
+    """The compile worker grew past its memory limit."""
+
+    code = "compile_memory_limit"
+    status_code = 507
+
+
+class CompileCancelledError(CompileLimitError):
+    """The client disconnected before the compile finished."""
+
+    code = "client_disconnected"
+    status_code = 499  # never seen by the client; shows up in logs and metrics
+
+
+class BackendBusyError(Exception):
+    """Too many compiles are already outstanding."""
+
+
+@dataclass(frozen=True)
+class CompileLimits:
+    """Per-compile limits; 0 disables a limit."""
+
+    timeout: float = 0  # seconds of wall-clock time
+    max_memory_bytes: int = 0  # resident memory of the compiling worker
+
+
+# Limits the process backend applies when COMPILE_TIMEOUT and
+# COMPILE_MAX_MEMORY_BYTES are left unset
+DEFAULT_PROCESS_LIMITS = CompileLimits(timeout=60, max_memory_bytes=2 * 1024 * 1024 * 1024)
+
+
+def current_rss() -> int:
+    """Resident set size of the current process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def process_rss(pid: int) -> int:
+    """Resident set size of process ``pid`` in bytes (0 if unknown)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _normalize(result) -> List[bytes]:
+    """Multi-page PNG/SVG returns list[bytes]; PDF returns bytes."""
+    return list(result) if isinstance(result, list) else [result]
+
+
+def _run(pool: CompilerPool, job: Dict[str, Any]):
+    """Run a compile job: its pages, or one list of pages per export."""
+    if "exports" in job:
+        return [_normalize(result) for result in pool.compile_exports(**job)]
+    return _normalize(pool.compile(**job))
+
+
+class InlineBackend:
+    """Compile on the calling thread."""
+
+    name = "inline"
+
+    def __init__(self, pool: CompilerPool):
+        self.pool = pool
+
+    def compile(
+        self,
+        compile_kwargs: Dict[str, Any],
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+    ) -> List[bytes]:
+        """Compile on this thread.
+
+        A running compile cannot be interrupted here, so ``limits`` are not
+        enforced; a compile for a client that is already gone is skipped.
+        ``affinity`` is unused: every compile shares this process's layout
+        memo.
+        """
+        return self._run(compile_kwargs, cancelled)
+
+    def compile_exports(
+        self,
+        compile_kwargs: Dict[str, Any],
+        exports: List[Dict[str, Any]],
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+    ) -> List[List[bytes]]:
+        """Lay out once and export per entry of ``exports`` (``format``/``ppi``)."""
+        return self._run(dict(compile_kwargs, exports=exports), cancelled)
+
+    def _run(self, job: Dict[str, Any], cancelled: Optional[Callable[[], bool]]):
+        if cancelled is not None and cancelled():
+            raise CompileCancelledError("Client disconnected before the compile started")
+        try:
+            return _run(self.pool, job)
+        except Exception as e:
+            raise CompileError(str(e)) from e
+
+    def warm(self) -> None:
+        """Warm the pool unless it already is."""
+        if not self.pool.warmed:
+            self.pool.warm()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "pool": self.pool.stats()}
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _worker_main(conn, pool_kwargs: Dict[str, Any]) -> None:
+    """Worker process loop: receive compile kwargs, send back pages."""
+    pool = CompilerPool(**pool_kwargs)
+    pool.warm()  # fonts, the stdlib and frequently used packages
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        try:
+            conn.send(("ok", _run(pool, job), current_rss()))
+        except Exception as e:
+            conn.send(("error", str(e), current_rss()))
+
+
+class _Worker:
+    def __init__(self, ctx, pool_kwargs: Dict[str, Any]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, pool_kwargs), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ProcessBackend:
+    """Compile in a pool of long-lived worker processes.
+
+    Workers are spawned lazily (or all at once by :meth:`warm`) and recycled
+    after ``max_jobs`` compiles or once their RSS crosses ``max_rss_bytes``.
+    At most ``max_pending`` compiles may be running or waiting for a worker;
+    beyond that :class:`BackendBusyError` is raised immediately.
+
+    While a compile runs, its :class:`CompileLimits` and ``cancelled``
+    callback are checked every few milliseconds; a compile over a limit, or
+    whose client went away, is stopped by killing its worker, which is
+    replaced.
+
+    Compiles with the same ``affinity`` key (a document) go to the worker
+    that last compiled it when that worker is idle, so later exports reuse
+    its memoized layout.
+    """
+
+    name = "process"
+
+    def __init__(
+        self,
+        workers: int,
+        pool_kwargs: Optional[Dict[str, Any]] = None,
+        max_jobs: int = 0,
+        max_rss_bytes: int = 0,
+        max_pending: int = 0,
+        start_method: str = "spawn",
+    ):
+        self.workers = max(1, workers)
+        self.pool_kwargs = dict(pool_kwargs or {}, size=1)
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self.max_pending = max_pending
+        self._ctx = multiprocessing.get_context(start_method)
+        self._idle: List[_Worker] = []
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._worker_freed = threading.Condition(self._lock)
+        self._affinity: "OrderedDict[str, _Worker]" = OrderedDict()
+        self._pending = 0
+        # Worker slots reserved while their process starts outside the lock
+        self._starting = 0
+        self._closed = False
+        self.recycled = 0
+        self.killed = 0
+        self.affinity_hits = 0
+
+    def compile(
+        self,
+        compile_kwargs: Dict[str, Any],
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+        wait: Optional[float] = None,
+    ) -> List[bytes]:
+        """Compile in a worker; ``wait`` bounds the seconds spent waiting for one.
+
+        Raises :class:`BackendBusyError` if no worker is free in time.
+        """
+        return self._submit(compile_kwargs, limits, cancelled, affinity, wait)
+
+    def compile_exports(
+        self,
+        compile_kwargs: Dict[str, Any],
+        exports: List[Dict[str, Any]],
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        affinity: Optional[str] = None,
+    ) -> List[List[bytes]]:
+        """Lay out once in one worker and export per entry of ``exports``.
+
+        ``limits`` apply to the job as a whole.
+        """
+        return self._submit(dict(compile_kwargs, exports=exports), limits, cancelled, affinity)
+
+    def _submit(
+        self,
+        job: Dict[str, Any],
+        limits: Optional[CompileLimits],
+        cancelled: Optional[Callable[[], bool]],
+        affinity: Optional[str],
+        wait: Optional[float] = None,
+    ):
+        with self._lock:
+            if self.max_pending and self._pending >= self.max_pending:
+                raise BackendBusyError("Too many compiles in progress")
+            self._pending += 1
+        try:
+            worker = self._acquire(affinity, wait)
+            try:
+                worker.conn.send(job)
+                failure = self._wait(worker, limits or CompileLimits(), cancelled)
+                if failure is not None:
+                    self._retire(worker, kill=True)
+                    with self._lock:
+                        self.killed += 1
+                    raise failure
+                status, payload, worker.rss = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                self._retire(worker)
+                raise CompileError("Compile worker exited unexpectedly") from e
+            worker.jobs += 1
+            if affinity is not None and status == "ok":
+                self._remember(affinity, worker)
+            self._release(worker)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        if status != "ok":
+            raise CompileError(payload)
+        return payload
+
+    @staticmethod
+    def _wait(
+        worker: _Worker,
+        limits: CompileLimits,
+        cancelled: Optional[Callable[[], bool]],
+    ) -> Optional[CompileLimitError]:
+        """Wait for ``worker``'s result; returns the error if it must be killed."""
+        deadline = time.monotonic() + limits.timeout if limits.timeout else None
+        while not worker.conn.poll(_LIMIT_POLL_INTERVAL):
+            if deadline is not None and time.monotonic() >= deadline:
+                return CompileTimeoutError(
+                    f"Compile exceeded the {limits.timeout:g}s time limit"
+                )
+            if limits.max_memory_bytes:
+                rss = process_rss(worker.process.pid)
+                if rss > limits.max_memory_bytes:
+                    return CompileMemoryError(
+                        f"Compile exceeded the {limits.max_memory_bytes} byte memory limit"
+                    )
+            if cancelled is not None and cancelled():
+                return CompileCancelledError("Client disconnected during the compile")
+            if not worker.process.is_alive():
+                break  # recv() reports the crash
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "workers": len(self._all),
+                "max_workers": self.workers,
+                "pending": self._pending,
+                "recycled": self.recycled,
+                "killed": self.killed,
+                "affinity_hits": self.affinity_hits,
+                "rss": [w.rss for w in self._all],
+            }
+
+    def warm(self) -> None:
+        """Spawn every worker now and wait until each has warmed up.
+
+        Workers warm their pool before taking their first job, so a trivial
+        compile answers once a worker is ready.
+        """
+        with self._lock:
+            count = max(0, self.workers - len(self._all) - self._starting)
+            self._starting += count
+        started = []
+        try:
+            for _ in range(count):
+                started.append(_Worker(self._ctx, self.pool_kwargs))
+        finally:
+            with self._lock:
+                self._starting -= count
+                self._all.extend(started)
+        for worker in started:
+            try:
+                worker.conn.send({"input": b"", "format": "pdf"})
+                worker.conn.recv()
+            except (EOFError, OSError):
+                self._retire(worker)
+                continue
+            self._put_idle(worker)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.stop()
+
+    def _acquire(self, affinity: Optional[str] = None, wait: Optional[float] = None) -> _Worker:
+        """An idle worker, preferring the one that last compiled ``affinity``.
+
+        Waits at most ``wait`` seconds (forever if None) for one to free up.
+        """
+        deadline = None if wait is None else time.monotonic() + wait
+        with self._worker_freed:
+            while True:
+                preferred = self._affinity.get(affinity) if affinity is not None else None
+                if preferred is not None and preferred in self._idle:
+                    self._idle.remove(preferred)
+                    self.affinity_hits += 1
+                    return preferred
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._all) + self._starting < self.workers:
+                    self._starting += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise BackendBusyError("No compile worker became free in time")
+                self._worker_freed.wait(remaining)
+        # Start the process outside the lock so other acquires and releases go on
+        try:
+            worker = _Worker(self._ctx, self.pool_kwargs)
+        except BaseException:
+            with self._worker_freed:
+                self._starting -= 1
+                self._worker_freed.notify()
+            raise
+        with self._lock:
+            self._starting -= 1
+            self._all.append(worker)
+        return worker
+
+    def _remember(self, affinity: str, worker: _Worker) -> None:
+        with self._lock:
+            self._affinity[affinity] = worker
+            self._affinity.move_to_end(affinity)
+            while len(self._affinity) > _MAX_AFFINITIES:
+                self._affinity.popitem(last=False)
+
+    def _release(self, worker: _Worker) -> None:
+        if (self.max_jobs and worker.jobs >= self.max_jobs) or (
+            self.max_rss_bytes and worker.rss >= self.max_rss_bytes
+        ):
+            self._retire(worker)
+            with self._lock:
+                self.recycled += 1
+            return
+        self._put_idle(worker)
+
+    def _put_idle(self, worker: _Worker) -> None:
+        with self._worker_freed:
+            self._idle.append(worker)
+            self._worker_freed.notify()
+
+    def _retire(self, worker: _Worker, kill: bool = False) -> None:
+        """Stop (or ``kill``) ``worker`` and start a replacement in its slot.
+
+        Both happen on a background thread, so the request that retired the
+        worker is answered without waiting for a process to start.
+        """
+        with self._lock:
+            try:
+                self._all.remove(worker)
+            except ValueError:
+                pass
+            self._starting += 1
+        threading.Thread(target=self._replace, args=(worker, kill), daemon=True).start()
+
+    def _replace(self, worker: _Worker, kill: bool) -> None:
+        worker.stop(kill=kill)
+        try:
+            replacement = _Worker(self._ctx, self.pool_kwargs)
+        except Exception:
+            # Free the slot; the next acquire that needs a worker spawns one
+            with self._worker_freed:
+                self._starting -= 1
+                self._worker_freed.notify()
+            return
+        with self._lock:
+            self._starting -= 1
+            closed = self._closed
+            if not closed:
+                self._all.append(replacement)
+        if closed:
+            replacement.stop()
+            return
+        self._put_idle(replacement)
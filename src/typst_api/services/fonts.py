@@ -0,0 +1,172 @@
+"""Font index: discover fonts once and serve their metadata without a subprocess."""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import typst
+
+# Bump when the cached entry layout changes
+_CACHE_VERSION = 1
+
+
+def system_font_dirs() -> List[str]:
+    """Directories the platform's system fonts are discovered from."""
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        dirs = ["/Library/Fonts", "/System/Library/Fonts", os.path.join(home, "Library/Fonts")]
+    elif sys.platform == "win32":
+        dirs = [os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts")]
+    else:
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local/share")
+        dirs = [
+            "/usr/share/fonts",
+            "/usr/local/share/fonts",
+            os.path.join(home, ".fonts"),
+            os.path.join(data_home, "fonts"),
+        ]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def parse_font_paths(value) -> List[str]:
+    """Accept a list of directories or an ``os.pathsep``-separated string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(os.pathsep)
+    return [os.path.abspath(os.path.expanduser(p)) for p in value if p]
+
+
+def _tree_mtime(directory: str) -> float:
+    """Latest mtime of ``directory`` and every directory below it.
+
+    Adding or removing a font changes its parent directory's mtime, so
+    this moves whenever the set of font files does.
+    """
+    latest = 0.0
+    for dirpath, _, _ in os.walk(directory):
+        try:
+            latest = max(latest, os.stat(dirpath).st_mtime)
+        except OSError:
+            continue
+    return latest
+
+
+class FontIndex:
+    """Font metadata for one font configuration, cached on disk.
+
+    The index is keyed by the font directories and their mtimes; when the
+    cache file matches, no font file is parsed at all. Otherwise the fonts
+    are scanned once with ``typst.Fonts`` and that font book is kept for
+    the compiler pool, so the scan is not repeated for the first compile.
+    """
+
+    def __init__(
+        self,
+        font_paths: Sequence[str] = (),
+        include_system_fonts: bool = True,
+        cache_file: Optional[str] = None,
+    ):
+        self.font_paths = list(font_paths)
+        self.include_system_fonts = include_system_fonts
+        self.cache_file = cache_file
+        self.source: Optional[str] = None  # "cache" or "scan" once loaded
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._fonts: Optional[typst.Fonts] = None
+        self._lock = threading.Lock()
+
+    def signature(self) -> Dict[str, Any]:
+        dirs = list(self.font_paths)
+        if self.include_system_fonts:
+            dirs += system_font_dirs()
+        return {
+            "version": _CACHE_VERSION,
+            "typst": getattr(typst, "__version__", None),
+            "include_system_fonts": self.include_system_fonts,
+            "dirs": {d: _tree_mtime(d) for d in dirs},
+        }
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Return the index, from the cache file if it is still valid."""
+        with self._lock:
+            if self._entries is None:
+                signature = self.signature()
+                entries = self._read_cache(signature)
+                if entries is None:
+                    entries = [_describe(info) for info in self._scan().fonts()]
+                    self._write_cache(signature, entries)
+                    self.source = "scan"
+                else:
+                    self.source = "cache"
+                self._entries = entries
+            return self._entries
+
+    def fonts(self) -> typst.Fonts:
+        """Font book for compilers (scanned at most once per process)."""
+        with self._lock:
+            return self._scan()
+
+    def families(self) -> List[Dict[str, Any]]:
+        """Entries grouped by family, each with its variants."""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in self.load():
+            variant = {k: v for k, v in entry.items() if k != "family"}
+            grouped.setdefault(entry["family"], []).append(variant)
+        return [
+            {
+                "family": family,
+                "variants": sorted(
+                    variants, key=lambda v: (v["style"], v["weight"], v["stretch"])
+                ),
+            }
+            for family, variants in sorted(grouped.items())
+        ]
+
+    def _scan(self) -> typst.Fonts:
+        """Build the shared ``typst.Fonts`` (caller holds the lock)."""
+        if self._fonts is None:
+            self._fonts = typst.Fonts(
+                include_system_fonts=self.include_system_fonts,
+                font_paths=self.font_paths,
+            )
+        return self._fonts
+
+    def _read_cache(self, signature: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        if not self.cache_file:
+            return None
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get("signature") != signature:
+            return None
+        return cached.get("fonts")
+
+    def _write_cache(self, signature: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+        if not self.cache_file:
+            return
+        directory = os.path.dirname(self.cache_file) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"signature": signature, "fonts": entries}, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass  # the cache is an optimisation; a read-only disk is fine
+
+
+def _describe(info) -> Dict[str, Any]:
+    return {
+        "family": info.family,
+        "style": info.style,
+        "weight": info.weight,
+        "stretch": round(info.stretch, 3),
+        # Fonts bundled with typst have no path
+        "embedded": info.path is None,
+        "index": info.index,
+    }
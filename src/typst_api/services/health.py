@@ -0,0 +1,217 @@
+"""Liveness and readiness, backed by a cached background compile probe.
+
+Health endpoints are hit by load balancers every few seconds. Compiling on
+each hit would compete with renders, so a background thread compiles a
+one-word document every ``HEALTH_PROBE_INTERVAL`` seconds and the endpoints
+report its last result. Readiness also reflects how saturated the node's
+compile slots are, so a balancer stops routing to a node before admission
+control has to refuse requests.
+
+Before its first probe, the thread warms the compile backend
+(``WARMUP_*``); the node is not ready until that has finished.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .admission import admission_service
+from .executor import BackendBusyError
+from .metrics import metrics
+
+
+class ProbeResult:
+    __slots__ = ("ok", "busy", "error", "checked_at", "seconds")
+
+    def __init__(self, ok: bool, busy: bool, error: Optional[str], seconds: float):
+        self.ok = ok
+        self.busy = busy
+        self.error = error
+        self.checked_at = time.monotonic()
+        self.seconds = seconds
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.checked_at
+
+
+class HealthService:
+    """Runs the compiler probe and answers ``/health``, ``/livez`` and ``/readyz``.
+
+    The probe thread is started by the server once a worker has forked
+    (see :meth:`start`), else lazily on the first health request, and
+    restarted after a fork, so a preloading server master never owns it.
+    """
+
+    def __init__(self):
+        self.interval = 10.0
+        self.timeout = 10.0
+        self.max_saturation = 2.0
+        self.probes = 0
+        self.warming = False
+        self.warmup_seconds: Optional[float] = None
+        self._result: Optional[ProbeResult] = None
+        self._first_result = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Configure probe timing and the readiness threshold from a Flask app's config."""
+        self.shutdown()
+        self.interval = max(0.1, app.config.get("HEALTH_PROBE_INTERVAL", 10.0))
+        self.timeout = app.config.get("HEALTH_PROBE_TIMEOUT", 10.0)
+        self.max_saturation = app.config.get("READY_MAX_SATURATION", 2.0)
+        self.probes = 0
+        self.warming = False
+        self.warmup_seconds = None
+        self._result = None
+        self._first_result = threading.Event()
+
+    def result(self) -> Optional[ProbeResult]:
+        """The latest probe result, waiting for the first one unless warming up."""
+        self.start()
+        if not self.warming:
+            self._first_result.wait(self.timeout or None)
+        return self._result
+
+    def health(self) -> Tuple[Dict[str, Any], int]:
+        """Whether the compiler works; a saturated backend still counts as healthy."""
+        result = self.result()
+        if result is None:
+            error = "Warming up" if self.warming else "Compiler probe timed out"
+        elif self._stale(result):
+            error = "Compiler probe is stale"
+        elif not (result.ok or result.busy):
+            error = result.error
+        else:
+            return {"status": "healthy", "compiler": "typst-py"}, 200
+        return {"status": "unhealthy", "compiler": "typst-py", "error": error}, 503
+
+    def readiness(self) -> Tuple[Dict[str, Any], int]:
+        """Whether this node should receive traffic: probe passing and capacity left."""
+        result = self.result()
+        saturation = self.saturation()
+        reasons = []
+        if result is None:
+            reasons.append("warming up" if self.warming else "compiler probe timed out")
+        elif self._stale(result):
+            reasons.append("compiler probe is stale")
+        elif result.busy:
+            reasons.append("compile backend is busy")
+        elif not result.ok:
+            reasons.append(f"compiler probe failed: {result.error}")
+        if saturation >= self.max_saturation:
+            reasons.append("compile slots are saturated")
+
+        data: Dict[str, Any] = {
+            "status": "not_ready" if reasons else "ready",
+            "saturation": round(saturation, 3),
+        }
+        if result is not None:
+            data["probe"] = {
+                "ok": result.ok,
+                "age_seconds": round(result.age, 3),
+                "duration_seconds": round(result.seconds, 4),
+            }
+        if reasons:
+            data["reasons"] = reasons
+        return data, 503 if reasons else 200
+
+    @staticmethod
+    def saturation() -> float:
+        """Compiles running or queued per compile slot (1.0: every slot busy)."""
+        stats = admission_service.controller.stats()
+        if not stats["max_in_flight"]:
+            return 0.0
+        return (stats["in_flight"] + stats["waiting"]) / stats["max_in_flight"]
+
+    def probe(self) -> ProbeResult:
+        """Run the compiler probe once and record its result."""
+        result = self._check()
+        self._record(result)
+        return result
+
+    def _check(self) -> ProbeResult:
+        from .compiler import compiler_service
+
+        start = time.perf_counter()
+        try:
+            compiler_service.probe(self.timeout)
+            return ProbeResult(True, False, None, time.perf_counter() - start)
+        except BackendBusyError as e:
+            return ProbeResult(False, True, str(e), time.perf_counter() - start)
+        except Exception as e:
+            return ProbeResult(False, False, str(e), time.perf_counter() - start)
+
+    def _record(self, result: ProbeResult) -> None:
+        self._result = result
+        self.probes += 1
+        self._first_result.set()
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report readiness inputs for ``/metrics``."""
+        result = self._result
+        yield "health_probe_ok", "gauge", "1 if the last compiler probe passed", [
+            ({}, int(result is not None and result.ok))
+        ]
+        if result is not None:
+            yield "health_probe_seconds", "gauge", "Duration of the last compiler probe", [
+                ({}, result.seconds)
+            ]
+        if self.warmup_seconds is not None:
+            yield "warmup_seconds", "gauge", "Duration of this worker's startup warm-up", [
+                ({}, self.warmup_seconds)
+            ]
+        yield "compile_saturation", "gauge", "Compiles running or queued per slot", [
+            ({}, self.saturation())
+        ]
+
+    def shutdown(self) -> None:
+        """Stop the probe thread after its current probe."""
+        self._stop.set()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _stale(self, result: ProbeResult) -> bool:
+        # A probe stuck past its timeout leaves the result ageing
+        return result.age > 2 * self.interval + self.timeout
+
+    def start(self) -> None:
+        """Start warm-up and the probe thread in this process if not running."""
+        with self._lock:
+            thread = self._thread
+            if self._pid == os.getpid() and thread is not None and thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self.warming = True
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop,), daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, stop: threading.Event) -> None:
+        from .compiler import compiler_service
+
+        self.warming = True
+        start = time.perf_counter()
+        try:
+            compiler_service.warm()
+        except Exception:
+            pass  # the probe reports a backend that cannot compile
+        finally:
+            self.warmup_seconds = time.perf_counter() - start
+            self.warming = False
+        while not stop.is_set():
+            result = self._check()
+            if stop.is_set():
+                break  # the app was reconfigured during the probe
+            self._record(result)
+            stop.wait(self.interval)
+
+
+# Singleton instance for use across routes
+health_service = HealthService()
+metrics.collector(health_service.collect_metrics)
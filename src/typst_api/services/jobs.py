@@ -0,0 +1,455 @@
+"""Asynchronous render jobs: bounded priority queue, status and results."""
+
+import base64
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..utils.parsers import PageRanges
+from .compiler import CompileOptions
+from .executor import BackendBusyError, CompileError, CompileLimitError
+from .metrics import metrics
+from .project import ProjectFiles
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """The job queue has reached its configured bound."""
+
+
+@dataclass
+class JobSpec:
+    """Everything a worker needs to run a render job."""
+
+    project: ProjectFiles
+    entrypoint: str
+    options: CompileOptions
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "files": {
+                    path: base64.b64encode(data).decode("ascii")
+                    for path, data in self.project.files.items()
+                },
+                "entrypoint": self.entrypoint,
+                "options": asdict(self.options),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw) -> "JobSpec":
+        data = json.loads(raw)
+        return cls(
+            project=ProjectFiles(
+                {path: base64.b64decode(b64) for path, b64 in data["files"].items()}
+            ),
+            entrypoint=data["entrypoint"],
+            options=options_from_dict(data["options"]),
+        )
+
+
+def options_from_dict(data: Dict[str, Any]) -> CompileOptions:
+    """Rebuild :class:`CompileOptions` from its JSON-decoded ``asdict`` form."""
+    data = dict(data)
+    pages: Optional[PageRanges] = None
+    if data.get("pages") is not None:
+        pages = [(start, end) for start, end in data["pages"]]
+    data["pages"] = pages
+    if data.get("outputs") is not None:
+        data["outputs"] = [(fmt, ppi) for fmt, ppi in data["outputs"]]
+    return CompileOptions(**data)
+
+
+def _new_job(spec: JobSpec, priority: int) -> Dict[str, Any]:
+    return {
+        "id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "priority": priority,
+        "options": asdict(spec.options),
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "expires_at": None,
+        "error": None,
+        "details": None,
+        "page_count": None,
+    }
+
+
+class InMemoryJobBackend:
+    """Process-local job store; jobs are only visible to this worker process."""
+
+    name = "memory"
+
+    def __init__(self, max_queued: int = 0, result_ttl: float = 0, max_results: int = 0):
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._specs: Dict[str, JobSpec] = {}
+        self._results: Dict[str, List[bytes]] = {}
+        self._queue: List[Tuple[int, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def submit(self, spec: JobSpec, priority: int = 0) -> Dict[str, Any]:
+        with self._cond:
+            self._evict()
+            if self.max_queued and len(self._queue) >= self.max_queued:
+                raise QueueFullError("Job queue is full")
+            job = _new_job(spec, priority)
+            self._jobs[job["id"]] = job
+            self._specs[job["id"]] = spec
+            heapq.heappush(self._queue, (-priority, next(self._seq), job["id"]))
+            self._cond.notify()
+            return dict(job)
+
+    def next_job(self, timeout: float) -> Optional[Tuple[str, JobSpec]]:
+        """Block up to ``timeout`` seconds for the highest-priority job."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._queue:
+                    _, _, job_id = heapq.heappop(self._queue)
+                    spec = self._specs.pop(job_id, None)
+                    job = self._jobs.get(job_id)
+                    if spec is None or job is None or job["status"] != QUEUED:
+                        continue  # cancelled or evicted while queued
+                    job["status"] = RUNNING
+                    job["started_at"] = time.time()
+                    return job_id, spec
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def finish(
+        self,
+        job_id: str,
+        pages: Optional[List[bytes]] = None,
+        error: Optional[str] = None,
+        details: Optional[str] = None,
+    ) -> None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != RUNNING:
+                return
+            now = time.time()
+            job["finished_at"] = now
+            job["expires_at"] = now + self.result_ttl if self.result_ttl else None
+            if error is None:
+                job["status"] = SUCCEEDED
+                job["page_count"] = len(pages or [])
+                self._results[job_id] = pages or []
+            else:
+                job["status"] = FAILED
+                job["error"] = error
+                job["details"] = details
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            self._evict()
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def result(self, job_id: str) -> Optional[List[bytes]]:
+        with self._cond:
+            return self._results.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job or discard a finished one's result."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == QUEUED:
+                now = time.time()
+                job["status"] = CANCELLED
+                job["finished_at"] = now
+                job["expires_at"] = now + self.result_ttl if self.result_ttl else None
+                self._specs.pop(job_id, None)
+            elif job["status"] in FINISHED:
+                self._drop(job_id)
+            return dict(job)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _drop(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._specs.pop(job_id, None)
+        self._results.pop(job_id, None)
+
+    def _evict(self) -> None:
+        """Drop expired jobs, then the oldest finished ones over the bound."""
+        now = time.time()
+        finished = []
+        for job_id, job in list(self._jobs.items()):
+            if job["status"] not in FINISHED:
+                continue
+            if job["expires_at"] is not None and job["expires_at"] <= now:
+                self._drop(job_id)
+            else:
+                finished.append((job["finished_at"], job_id))
+        if self.max_results and len(finished) > self.max_results:
+            finished.sort()
+            for _, job_id in finished[: len(finished) - self.max_results]:
+                self._drop(job_id)
+
+
+class RedisJobBackend:
+    """Job store on a Redis-compatible server (Redis, Valkey, KeyDB, ...).
+
+    Shared by every worker process pointing at the same server, so a job
+    submitted to one worker can be polled and fetched from any other.
+    Requires the ``redis`` package.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        client,
+        max_queued: int = 0,
+        result_ttl: float = 0,
+        prefix: str = "typst-api:jobs",
+    ):
+        self.client = client
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.prefix = prefix
+        self._queue_key = f"{prefix}:queue"
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisJobBackend":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "JOB_BACKEND = 'redis' requires the redis package: "
+                "pip install 'typst-api[redis]'"
+            )
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, job_id: str, suffix: str = "") -> str:
+        return f"{self.prefix}:{job_id}{suffix}"
+
+    def submit(self, spec: JobSpec, priority: int = 0) -> Dict[str, Any]:
+        if self.max_queued and self.client.zcard(self._queue_key) >= self.max_queued:
+            raise QueueFullError("Job queue is full")
+        job = _new_job(spec, priority)
+        pipe = self.client.pipeline()
+        pipe.set(self._key(job["id"]), json.dumps(job))
+        pipe.set(self._key(job["id"], ":spec"), spec.to_json())
+        # Lower score pops first: priority dominates, then submission time
+        pipe.zadd(self._queue_key, {job["id"]: -priority * 1e10 + job["created_at"]})
+        pipe.execute()
+        return job
+
+    def next_job(self, timeout: float) -> Optional[Tuple[str, JobSpec]]:
+        popped = self.client.bzpopmin(self._queue_key, timeout=max(1, int(timeout)))
+        if not popped:
+            return None
+        job_id = popped[1].decode() if isinstance(popped[1], bytes) else popped[1]
+        job = self.get(job_id)
+        raw_spec = self.client.get(self._key(job_id, ":spec"))
+        if job is None or raw_spec is None or job["status"] != QUEUED:
+            return None
+        job["status"] = RUNNING
+        job["started_at"] = time.time()
+        self.client.set(self._key(job_id), json.dumps(job))
+        self.client.delete(self._key(job_id, ":spec"))
+        return job_id, JobSpec.from_json(raw_spec)
+
+    def finish(
+        self,
+        job_id: str,
+        pages: Optional[List[bytes]] = None,
+        error: Optional[str] = None,
+        details: Optional[str] = None,
+    ) -> None:
+        job = self.get(job_id)
+        if job is None or job["status"] != RUNNING:
+            return
+        now = time.time()
+        job["finished_at"] = now
+        job["expires_at"] = now + self.result_ttl if self.result_ttl else None
+        pipe = self.client.pipeline()
+        if error is None:
+            job["status"] = SUCCEEDED
+            job["page_count"] = len(pages or [])
+            if pages:
+                pipe.rpush(self._key(job_id, ":pages"), *pages)
+        else:
+            job["status"] = FAILED
+            job["error"] = error
+            job["details"] = details
+        pipe.set(self._key(job_id), json.dumps(job))
+        if self.result_ttl:
+            ttl = max(1, int(self.result_ttl))
+            pipe.expire(self._key(job_id), ttl)
+            pipe.expire(self._key(job_id, ":pages"), ttl)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def result(self, job_id: str) -> Optional[List[bytes]]:
+        job = self.get(job_id)
+        if job is None or job["status"] != SUCCEEDED:
+            return None
+        return self.client.lrange(self._key(job_id, ":pages"), 0, -1)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == QUEUED and self.client.zrem(self._queue_key, job_id):
+            now = time.time()
+            job["status"] = CANCELLED
+            job["finished_at"] = now
+            job["expires_at"] = now + self.result_ttl if self.result_ttl else None
+            # Expire like any other finished job
+            ttl = max(1, int(self.result_ttl)) if self.result_ttl else None
+            self.client.set(self._key(job_id), json.dumps(job), ex=ttl)
+            self.client.delete(self._key(job_id, ":spec"))
+        elif job["status"] in FINISHED:
+            self.client.delete(
+                self._key(job_id), self._key(job_id, ":spec"), self._key(job_id, ":pages")
+            )
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        return {QUEUED: self.client.zcard(self._queue_key)}
+
+
+class JobService:
+    """Runs queued render jobs on background threads.
+
+    Threads are started lazily on first use (and restarted after a fork),
+    so a preloading server master never owns them.
+    """
+
+    def __init__(self):
+        self.backend = InMemoryJobBackend()
+        self.workers = 1
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Configure the job backend from a Flask app's config."""
+        self.shutdown()
+        backend = app.config.get("JOB_BACKEND", "memory")
+        max_queued = app.config.get("JOB_QUEUE_MAX", 0)
+        result_ttl = app.config.get("JOB_RESULT_TTL", 0)
+        if backend == "memory":
+            self.backend = InMemoryJobBackend(
+                max_queued=max_queued,
+                result_ttl=result_ttl,
+                max_results=app.config.get("JOB_MAX_RESULTS", 0),
+            )
+        elif backend == "redis":
+            self.backend = RedisJobBackend.from_url(
+                app.config["JOB_REDIS_URL"],
+                max_queued=max_queued,
+                result_ttl=result_ttl,
+            )
+        else:
+            raise ValueError(f"Unknown JOB_BACKEND: {backend}")
+        self.workers = max(1, app.config.get("JOB_WORKERS", 1))
+
+    def submit(self, spec: JobSpec, priority: int = 0) -> Dict[str, Any]:
+        """Queue a job; raises :class:`QueueFullError` when the queue is full."""
+        self._ensure_started()
+        return self.backend.submit(spec, priority)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(job_id)
+
+    def result(self, job_id: str) -> Optional[List[bytes]]:
+        return self.backend.result(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.cancel(job_id)
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report job counts by status for ``/metrics``."""
+        yield "jobs", "gauge", "Jobs by status (queued is the queue depth)", [
+            ({"status": status}, count) for status, count in self.backend.stats().items()
+        ]
+
+    def shutdown(self) -> None:
+        """Signal worker threads to exit once their current job is done."""
+        self._stop.set()
+        self._threads = []
+        self._stop = threading.Event()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            alive = [t for t in self._threads if t.is_alive()]
+            if self._pid == os.getpid() and len(alive) >= self.workers:
+                return
+            if self._pid != os.getpid():
+                alive = []  # threads do not survive a fork
+            self._pid = os.getpid()
+            self._threads = alive
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, args=(self.backend, self._stop), daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self, backend, stop: threading.Event) -> None:
+        from .compiler import compiler_service
+
+        while not stop.is_set():
+            try:
+                item = backend.next_job(timeout=1.0)
+            except Exception:
+                # e.g. the Redis server is briefly unreachable
+                stop.wait(1.0)
+                continue
+            if item is None:
+                continue
+            job_id, spec = item
+            try:
+                pages, _ = compiler_service.render_project(
+                    spec.project, spec.entrypoint, spec.options
+                )
+            except BackendBusyError as e:
+                backend.finish(job_id, error="Compiler busy", details=str(e))
+            except CompileLimitError as e:
+                backend.finish(job_id, error="Compile stopped", details=f"{e.code}: {e}")
+            except CompileError as e:
+                backend.finish(job_id, error="Typst compilation failed", details=str(e))
+            except Exception as e:  # keep the worker thread alive
+                backend.finish(job_id, error="Job failed", details=str(e))
+            else:
+                backend.finish(job_id, pages=pages)
+
+
+# Singleton instance for use across routes
+job_service = JobService()
+metrics.collector(job_service.collect_metrics)
@@ -0,0 +1,299 @@
+"""Prometheus-style metrics and per-request stage timing.
+
+Metrics are kept per process; with several server workers each worker
+reports its own series, so scrape them individually or aggregate with the
+``instance``/``pid`` label your collector attaches.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from flask import g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (labels, value) pairs produced by a collector at scrape time
+Sample = Tuple[Dict[str, str], float]
+Collected = Tuple[str, str, str, Iterable[Sample]]  # name, type, help, samples
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with sum and count per label set."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(sum(series[:-1])) if series else 0
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels)} "
+                    f"{_format_value(cumulative)}"
+                )
+            lines.append(
+                f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-1])}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(labels)} {_format_value(cumulative)}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the service metrics and renders the Prometheus text format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, namespace: str = "typst_api"):
+        self.namespace = namespace
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+        self.server_timing = False
+
+        self.request_seconds = self.histogram(
+            "request_seconds", "HTTP request latency", ("route", "method", "status")
+        )
+        self.stage_seconds = self.histogram(
+            "stage_seconds",
+            "Time spent in each render stage",
+            ("route", "stage", "format"),
+        )
+        self.compiles = self.counter(
+            "compiles_total", "Compiles run on the backend", ("format",)
+        )
+        self.compile_errors = self.counter(
+            "compile_errors_total", "Failed compiles by reason", ("format", "reason")
+        )
+        self.compiles_in_flight = self.gauge(
+            "compiles_in_flight", "Compiles currently running or waiting for a worker"
+        )
+
+    def init_app(self, app) -> None:
+        """Record request latency and emit ``Server-Timing`` headers for ``app``."""
+        self.server_timing = app.config.get("SERVER_TIMING_HEADER", False)
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+
+    # -- registration ---------------------------------------------------------
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def collector(self, func: Callable[[], Iterable[Collected]]) -> Callable:
+        """Register ``func`` to report values owned by other services at scrape time."""
+        self._collectors.append(func)
+        return func
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # -- exposition -----------------------------------------------------------
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for func in self._collectors:
+            for name, type_, help, samples in func():
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {full_name} {help}")
+                lines.append(f"# TYPE {full_name} {type_}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{full_name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    # -- stage timing ---------------------------------------------------------
+
+    @contextmanager
+    def stage(self, name: str, output_format: str = "") -> Iterator[None]:
+        """Time a render stage.
+
+        The duration goes into ``stage_seconds`` and, inside a request, into
+        that request's ``Server-Timing`` header. Stages that repeat within a
+        request (e.g. per-record compiles in a batch) are summed.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds.observe(
+                elapsed, route=_route(), stage=name, format=output_format
+            )
+            if has_request_context():
+                timings = g.setdefault("stage_timings", {})
+                timings[name] = timings.get(name, 0.0) + elapsed
+
+    def _finish_request(self, response):
+        start: Optional[float] = g.get("request_start")
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = _route()
+        if route != "/metrics":
+            self.request_seconds.observe(
+                elapsed,
+                route=route,
+                method=request.method,
+                status=str(response.status_code),
+            )
+        if self.server_timing:
+            parts = [
+                f"{name};dur={seconds * 1000:.1f}"
+                for name, seconds in g.get("stage_timings", {}).items()
+            ]
+            # Streamed bodies are produced after this point and not included
+            parts.append(f"total;dur={elapsed * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+
+def _start_request() -> None:
+    g.request_start = time.perf_counter()
+
+
+def _route() -> str:
+    """Route template of the current request, or ``job`` outside one."""
+    if not has_request_context():
+        return "job"
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+# Singleton instance for use across services and routes
+metrics = MetricsRegistry()
@@ -0,0 +1,400 @@
+"""Offline cache of Typst packages (``#import "@preview/name:version"``).
+
+Packages are stored unpacked as ``<dir>/<namespace>/<name>/<version>/``,
+the layout Typst reads directly, so resolving an import on the request path
+never unpacks anything. Unless ``PACKAGE_DOWNLOAD`` is set, compilers get no
+writable package cache, so nothing Typst fetches is ever stored or used.
+The cache is seeded from package tarballs (``PUT /packages`` or
+``typst-api packages seed``), evicts the least recently used packages past
+a size limit, and names the most recently used ones so workers can
+warm-load them at start.
+"""
+
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .executor import CompileError
+from .metrics import metrics
+from .project import normalize_path
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    tomllib = None
+
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+_VERSION_RE = re.compile(r"^\d+\.\d+\.\d+$")
+# A package spec inside a string literal, e.g. "@preview/cetz:0.3.2"
+_IMPORT_RE = re.compile(rb'"@([a-z0-9][a-z0-9_-]*)/([a-z0-9][a-z0-9_-]*):(\d+\.\d+\.\d+)"')
+
+# Refresh a package's last-used mtime at most this often (seconds)
+_TOUCH_INTERVAL = 60
+
+
+class PackageError(Exception):
+    """A package upload is invalid or names an unknown package."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MissingPackagesError(CompileError):
+    """The document imports packages that are not in the offline cache."""
+
+    def __init__(self, missing: List["PackageSpec"]):
+        self.missing = [str(spec) for spec in missing]
+        super().__init__("Packages not in the offline cache: " + ", ".join(self.missing))
+
+
+@dataclass(frozen=True, order=True)
+class PackageSpec:
+    """``@namespace/name:version``."""
+
+    namespace: str
+    name: str
+    version: str
+
+    @classmethod
+    def parse(cls, value: str) -> "PackageSpec":
+        match = re.match(r"^@?([^/]+)/([^:]+):(.+)$", value.strip())
+        if not match:
+            raise PackageError(f"Invalid package spec: {value}")
+        return cls.create(*match.groups())
+
+    @classmethod
+    def create(cls, namespace: str, name: str, version: str) -> "PackageSpec":
+        if not _NAME_RE.match(namespace) or not _NAME_RE.match(name):
+            raise PackageError(f"Invalid package name: @{namespace}/{name}")
+        if not _VERSION_RE.match(version):
+            raise PackageError(f"Invalid package version: {version}")
+        return cls(namespace, name, version)
+
+    def __str__(self) -> str:
+        return f"@{self.namespace}/{self.name}:{self.version}"
+
+
+def find_imports(sources: Iterable[bytes]) -> Set[PackageSpec]:
+    """Package specs written as string literals in Typst ``sources``.
+
+    Imports whose spec is computed at compile time are not found.
+    """
+    found = set()
+    for source in sources:
+        for namespace, name, version in _IMPORT_RE.findall(source):
+            found.add(PackageSpec(namespace.decode(), name.decode(), version.decode()))
+    return found
+
+
+def read_manifest(data: bytes) -> Tuple[str, str]:
+    """Return ``(name, version)`` from a ``typst.toml`` package manifest."""
+    text = data.decode("utf-8", errors="replace")
+    if tomllib is not None:
+        try:
+            package = tomllib.loads(text).get("package", {})
+        except tomllib.TOMLDecodeError as e:
+            raise PackageError(f"Invalid typst.toml: {e}")
+        name, version = package.get("name"), package.get("version")
+    else:
+        section = text.split("[package]", 1)[-1].split("\n[", 1)[0]
+        fields = dict(re.findall(r'^\s*(name|version)\s*=\s*"([^"]*)"', section, re.M))
+        name, version = fields.get("name"), fields.get("version")
+    if not isinstance(name, str) or not isinstance(version, str):
+        raise PackageError("typst.toml must set package name and version")
+    return name, version
+
+
+class PackageCache:
+    """Unpacked Typst packages on local disk with size-bounded LRU eviction.
+
+    A package directory's mtime records when it was last used. Every
+    worker pointing at the same directory shares the cache.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = 0,
+        max_entries: int = 0,
+        max_unpacked_bytes: int = 0,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_unpacked_bytes = max_unpacked_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._requirements: Dict[PackageSpec, Set[PackageSpec]] = {}
+        self._touched: Dict[PackageSpec, float] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, spec: PackageSpec) -> str:
+        return os.path.join(self.directory, spec.namespace, spec.name, spec.version)
+
+    def has(self, spec: PackageSpec) -> bool:
+        return bool(self.directory) and os.path.isfile(
+            os.path.join(self.path(spec), "typst.toml")
+        )
+
+    def packages(self) -> List[Dict[str, object]]:
+        """Installed packages, most recently used first."""
+        entries = [
+            {"package": str(spec), "bytes": size, "last_used": mtime}
+            for spec, mtime, size in self._scan()
+        ]
+        return sorted(entries, key=lambda e: e["last_used"], reverse=True)
+
+    def most_used(self, limit: int) -> List[PackageSpec]:
+        """The ``limit`` most recently used packages (warm-load candidates)."""
+        ordered = sorted(self._scan(), key=lambda entry: entry[1], reverse=True)
+        return [spec for spec, _, _ in ordered[:limit]]
+
+    def missing(self, sources: Iterable[bytes]) -> List[PackageSpec]:
+        """Packages ``sources`` import (directly or through other packages)
+        that are not installed; installed ones are marked as used.
+        """
+        pending = list(find_imports(sources))
+        seen: Set[PackageSpec] = set()
+        missing = []
+        while pending:
+            spec = pending.pop()
+            if spec in seen:
+                continue
+            seen.add(spec)
+            if not self.has(spec):
+                missing.append(spec)
+                continue
+            self._touch(spec)
+            pending.extend(self._package_imports(spec))
+        return sorted(missing)
+
+    def install(
+        self, stream: IO[bytes], namespace: str = "preview", replace: bool = False
+    ) -> Tuple[PackageSpec, bool]:
+        """Unpack a package tarball (``.tar.gz``, ``.tar`` ...) into the cache.
+
+        The name and version come from the archive's ``typst.toml``; a
+        single top-level directory around it is stripped. Returns
+        ``(spec, installed)``; an existing package is kept unless
+        ``replace`` is true. Raises :class:`PackageError`.
+        """
+        try:
+            archive = tarfile.open(fileobj=stream, mode="r:*")
+        except tarfile.TarError as e:
+            raise PackageError(f"Invalid package archive: {e}")
+        with archive:
+            files = self._read_members(archive)
+
+        if "typst.toml" not in files:
+            prefixes = {path.split("/", 1)[0] for path in files}
+            if len(prefixes) == 1 and f"{prefixes.pop()}/typst.toml" in files:
+                files = {path.split("/", 1)[1]: data for path, data in files.items()}
+            else:
+                raise PackageError("Package archive has no typst.toml")
+        spec = PackageSpec.create(namespace, *read_manifest(files["typst.toml"]))
+
+        target = self.path(spec)
+        if self.has(spec) and not replace:
+            self._touch(spec, force=True)
+            return spec, False
+        parent = os.path.dirname(target)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+        try:
+            for path, data in files.items():
+                dest = os.path.join(staging, *path.split("/"))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with open(dest, "wb") as f:
+                    f.write(data)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        with self._lock:
+            self._requirements.pop(spec, None)
+        self._maybe_evict(keep=spec)
+        return spec, True
+
+    def remove(self, spec: PackageSpec) -> bool:
+        target = self.path(spec)
+        if not os.path.isdir(target):
+            return False
+        shutil.rmtree(target, ignore_errors=True)
+        with self._lock:
+            self._requirements.pop(spec, None)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        entries = list(self._scan())
+        return {
+            "packages": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def _read_members(self, archive: tarfile.TarFile) -> Dict[str, bytes]:
+        files: Dict[str, bytes] = {}
+        total = 0
+        for member in archive:
+            if member.isdir():
+                continue
+            if not member.isfile():
+                continue  # links and devices have no place in a package
+            path = normalize_path(member.name)
+            if path is None or path in (".", ""):
+                raise PackageError(f"Unsafe path in package archive: {member.name}")
+            if self.max_entries and len(files) >= self.max_entries:
+                raise PackageError(f"Package has more than {self.max_entries} files", 413)
+            total += member.size
+            if self.max_unpacked_bytes and total > self.max_unpacked_bytes:
+                raise PackageError(
+                    f"Package exceeds {self.max_unpacked_bytes} bytes unpacked", 413
+                )
+            extracted = archive.extractfile(member)
+            files[path] = extracted.read() if extracted else b""
+        return files
+
+    def _package_imports(self, spec: PackageSpec) -> Set[PackageSpec]:
+        with self._lock:
+            cached = self._requirements.get(spec)
+        if cached is not None:
+            return cached
+        sources = []
+        for dirpath, _, filenames in os.walk(self.path(spec)):
+            for name in filenames:
+                if name.endswith(".typ"):
+                    try:
+                        with open(os.path.join(dirpath, name), "rb") as f:
+                            sources.append(f.read())
+                    except OSError:
+                        continue
+        found = find_imports(sources) - {spec}
+        with self._lock:
+            self._requirements[spec] = found
+        return found
+
+    def _touch(self, spec: PackageSpec, force: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if not force and now - self._touched.get(spec, 0) < _TOUCH_INTERVAL:
+                return
+            self._touched[spec] = now
+        try:
+            os.utime(self.path(spec))
+        except OSError:
+            pass
+
+    def _scan(self) -> Iterator[Tuple[PackageSpec, float, int]]:
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for namespace in os.listdir(self.directory):
+            ns_dir = os.path.join(self.directory, namespace)
+            if not os.path.isdir(ns_dir):
+                continue
+            for name in os.listdir(ns_dir):
+                name_dir = os.path.join(ns_dir, name)
+                if not os.path.isdir(name_dir):
+                    continue
+                for version in os.listdir(name_dir):
+                    try:
+                        spec = PackageSpec.create(namespace, name, version)
+                    except PackageError:
+                        continue  # staging directories
+                    path = os.path.join(name_dir, version)
+                    try:
+                        mtime = os.stat(path).st_mtime
+                    except OSError:
+                        continue
+                    yield spec, mtime, _tree_size(path)
+
+    def _maybe_evict(self, keep: PackageSpec) -> None:
+        if not self.max_bytes:
+            return
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for spec, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if spec == keep:
+                continue
+            if self.remove(spec):
+                total -= size
+                self.evictions += 1
+
+
+def _tree_size(directory: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                continue
+    return total
+
+
+class PackageService:
+    """Holds the configured :class:`PackageCache` for the app."""
+
+    def __init__(self):
+        self.cache = PackageCache()
+        self.allow_download = True
+        self.warm_count = 0
+
+    def init_app(self, app) -> None:
+        """Configure the package cache from a Flask app's config."""
+        directory = app.config.get("PACKAGE_DIR") or os.path.join(
+            tempfile.gettempdir(), "typst-api-packages"
+        )
+        self.cache = PackageCache(
+            directory,
+            max_bytes=app.config.get("PACKAGE_DIR_MAX_BYTES", 0),
+            max_entries=app.config.get("ZIP_MAX_ENTRIES", 0),
+            max_unpacked_bytes=app.config.get("ZIP_MAX_UNCOMPRESSED_BYTES", 0),
+        )
+        self.allow_download = app.config.get("PACKAGE_DOWNLOAD", False)
+        self.warm_count = app.config.get("PACKAGE_WARM_COUNT", 0)
+
+    def check(self, sources: Iterable[bytes]) -> None:
+        """Raise :class:`MissingPackagesError` if an import is not cached.
+
+        Best effort: only literal ``"@ns/name:version"`` strings are found,
+        so it answers most misses with 422 before compiling. An import it
+        misses fails the compile, since compilers cannot store downloads
+        (see :data:`~.pool.NO_DOWNLOAD_CACHE_PATH`). With ``PACKAGE_DOWNLOAD``
+        enabled, Typst may fetch missing packages into the cache instead.
+        """
+        if self.allow_download:
+            return
+        with metrics.stage("packages"):
+            missing = self.cache.missing(sources)
+        if missing:
+            raise MissingPackagesError(missing)
+
+    def warm_packages(self) -> List[str]:
+        """Specs of the packages workers should load at start."""
+        if not self.warm_count:
+            return []
+        return [str(spec) for spec in self.cache.most_used(self.warm_count)]
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report the package cache's eviction count for ``/metrics``."""
+        yield "package_cache_evictions_total", "counter", "Packages evicted", [
+            ({}, self.cache.evictions)
+        ]
+
+
+# Singleton instance for use across routes
+package_service = PackageService()
+metrics.collector(package_service.collect_metrics)
@@ -0,0 +1,273 @@
+"""Pool of warm, long-lived typst compilers."""
+
+import os
+import queue
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import typst
+
+from .fonts import FontIndex
+
+# Touches the parts of the stdlib a first compile pays for: text shaping,
+# headings, lists, tables, math layout and syntax highlighting
+WARMUP_SOURCE = b"""#set page(width: 10cm, height: auto)
+= Warm-up
+Some *strong*, _emphasized_ and `raw` text with a footnote.#footnote[Note]
+- A list item
++ An enumerated item
+#table(columns: 2, [A], [B], [1], [2])
+$ sum_(k=1)^n k = (n(n+1)) / 2 $
+```python
+def hello():
+    return "world"
+```
+"""
+
+# Package cache path for compilers that must not download: nothing can be
+# created under it, so a package missing from the package dir fails the
+# compile instead of being fetched into the offline cache
+NO_DOWNLOAD_CACHE_PATH = os.path.join(os.devnull, "typst-packages")
+
+# (source, root) pairs compiled by ``CompilerPool.warm``, optionally
+# followed by the sys_inputs to compile them with
+WarmDocuments = List[Tuple[Any, ...]]
+
+
+def load_warmup_documents(value) -> WarmDocuments:
+    """The built-in :data:`WARMUP_SOURCE` plus ``.typ`` files and directories of them.
+
+    Accepts a list or an ``os.pathsep``-separated string. Each file compiles
+    with its directory as project root; unreadable paths are skipped.
+    """
+    documents: WarmDocuments = [(WARMUP_SOURCE, None)]
+    if not value:
+        return documents
+    if isinstance(value, str):
+        value = value.split(os.pathsep)
+    for path in (os.path.abspath(os.path.expanduser(p)) for p in value if p):
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith(".typ")
+            )
+        else:
+            files = [path]
+        for file_path in files:
+            try:
+                with open(file_path, "rb") as f:
+                    documents.append((f.read(), os.path.dirname(file_path)))
+            except OSError:
+                continue
+    return documents
+
+
+class CompilerPool:
+    """Reusable ``typst.Compiler`` instances sharing a single font book.
+
+    Fonts are discovered once per pool (i.e. once per worker process) and
+    handed to every compiler, so requests only pay for the compile itself.
+    Each compile passes its own input, root and sys_inputs, overriding
+    whatever the previous request left on the instance.
+
+    A pool of size 0 disables pooling; every compile then builds a fresh
+    world, still on the shared font book.
+    """
+
+    def __init__(
+        self,
+        size: int = 0,
+        max_uses: int = 0,
+        ignore_system_fonts: bool = False,
+        font_paths: Sequence[str] = (),
+        font_index: Optional[FontIndex] = None,
+        package_dir: Optional[str] = None,
+        package_download: bool = False,
+        warm_packages: Sequence[str] = (),
+        warm_documents: Sequence[Tuple[Any, ...]] = (),
+        warm_formats: Sequence[str] = ("pdf",),
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.ignore_system_fonts = ignore_system_fonts
+        self.package_dir = package_dir
+        self.package_download = package_download
+        self.warm_packages = list(warm_packages)
+        self.warm_documents = list(warm_documents)
+        self.warm_formats = list(warm_formats)
+        self.warmed = False
+        self.font_index = font_index or FontIndex(
+            font_paths, include_system_fonts=not ignore_system_fonts
+        )
+        self._idle: "queue.LifoQueue[_PooledCompiler]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._empty_root: Optional[str] = None
+
+    @property
+    def fonts(self) -> typst.Fonts:
+        """Font book shared by all pooled compilers (discovered lazily)."""
+        return self.font_index.fonts()
+
+    @property
+    def empty_root(self) -> str:
+        """Empty project root used for in-memory sources.
+
+        Compilers remember the last root they were given, so raw sources
+        need an explicit one to avoid resolving files from another request.
+        """
+        with self._lock:
+            if self._empty_root is None:
+                self._empty_root = tempfile.mkdtemp(prefix="typst-api-root-")
+            return self._empty_root
+
+    def new_compiler(self) -> typst.Compiler:
+        """A compiler on the shared font book and the offline package cache.
+
+        Only with ``package_download`` may Typst store fetched packages in
+        the cache directory.
+        """
+        return typst.Compiler(
+            font_paths=self.fonts,
+            package_path=self.package_dir,
+            package_cache_path=(
+                self.package_dir if self.package_download else NO_DOWNLOAD_CACHE_PATH
+            ),
+        )
+
+    def warm(self) -> None:
+        """Create every pooled compiler and load the stdlib and warm packages.
+
+        Each compiler then compiles the warm documents in every warm
+        format, so its world, layout memo and export paths are hot before
+        the first request. Failures are ignored; a broken warm package or document
+        only costs its own compile.
+        """
+        source = "".join(f'#import "{spec}"\n' for spec in self.warm_packages).encode()
+        borrowed = []
+        try:
+            for _ in range(max(1, self.size)):
+                pooled = self._acquire() if self.size > 0 else None
+                if pooled is not None:
+                    borrowed.append(pooled)
+                compiler = pooled.compiler if pooled else self.new_compiler()
+                jobs = [(source, None, None, "pdf")] + [
+                    (document, root, inputs[0] if inputs else None, fmt)
+                    for document, root, *inputs in self.warm_documents
+                    for fmt in self.warm_formats
+                ]
+                for document, root, sys_inputs, fmt in jobs:
+                    try:
+                        compiler.compile(
+                            input=document,
+                            root=root or self.empty_root,
+                            format=fmt,
+                            sys_inputs=sys_inputs or None,
+                        )
+                    except Exception:
+                        pass
+        finally:
+            for pooled in borrowed:
+                self._release(pooled)
+        self.warmed = True
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+        }
+
+    @contextmanager
+    def compiler(self) -> Iterator[typst.Compiler]:
+        """Borrow a compiler for the duration of the ``with`` block."""
+        pooled = self._acquire()
+        try:
+            yield pooled.compiler
+        finally:
+            pooled.uses += 1
+            self._release(pooled)
+
+    def compile(
+        self,
+        input: Union[str, bytes],
+        root: Optional[str] = None,
+        sys_inputs: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> Union[bytes, List[bytes]]:
+        """Compile with a pooled compiler (or a cold one if pooling is off)."""
+        if self.size <= 0:
+            return self.new_compiler().compile(
+                input=input,
+                root=root or self.empty_root,
+                sys_inputs=sys_inputs or None,
+                **kwargs,
+            )
+
+        with self.compiler() as compiler:
+            return compiler.compile(
+                input=input,
+                root=root or self.empty_root,
+                sys_inputs=sys_inputs or None,
+                **kwargs,
+            )
+
+    def compile_exports(
+        self,
+        input: Union[str, bytes],
+        exports: Sequence[Dict[str, Any]],
+        root: Optional[str] = None,
+        sys_inputs: Optional[dict] = None,
+    ) -> List[Union[bytes, List[bytes]]]:
+        """Export one document several times (``format``/``ppi`` per export).
+
+        All exports run back to back on one compiler: Typst memoizes the
+        layout, so only the first export pays for it.
+        """
+        kwargs = {
+            "input": input,
+            "root": root or self.empty_root,
+            "sys_inputs": sys_inputs or None,
+        }
+        if self.size <= 0:
+            compiler = self.new_compiler()
+            return [compiler.compile(**kwargs, **export) for export in exports]
+        with self.compiler() as compiler:
+            return [compiler.compile(**kwargs, **export) for export in exports]
+
+    def _acquire(self) -> "_PooledCompiler":
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return _PooledCompiler(self.new_compiler())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def _release(self, pooled: "_PooledCompiler") -> None:
+        if self.max_uses and pooled.uses >= self.max_uses:
+            # Retire the instance so its per-world source/file caches are dropped
+            try:
+                pooled = _PooledCompiler(self.new_compiler())
+            except Exception:
+                # Keep serving from the old instance rather than losing the slot
+                pooled.uses = 0
+        self._idle.put(pooled)
+
+
+class _PooledCompiler:
+    __slots__ = ("compiler", "uses")
+
+    def __init__(self, compiler: typst.Compiler):
+        self.compiler = compiler
+        self.uses = 0
@@ -0,0 +1,275 @@
+"""Post-export stages: shrink compiled pages before they are cached and sent.
+
+Stages are selected per request (``postprocess=linearize,optimize``) and
+run in order on every page of the formats they apply to. Their results
+are cached next to the plain render, so a stage runs once per document.
+More stages can be added with :func:`register_stage`.
+
+Separately, single SVG responses are sent with a gzip or brotli
+``Content-Encoding`` when the client accepts one (``RENDER_CONTENT_ENCODINGS``).
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from .metrics import metrics
+from .thumbnails import pillow
+
+
+class PostProcessError(Exception):
+    """A stage cannot be applied as requested."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A bytes-to-bytes transform of pages in one of ``formats``."""
+
+    name: str
+    formats: FrozenSet[str]
+    run: Callable[[bytes], bytes]
+    # Returns an error message if an optional dependency is missing
+    unavailable: Callable[[], Optional[str]] = lambda: None
+
+
+STAGES: Dict[str, Stage] = {}
+
+
+def register_stage(
+    name: str,
+    formats: Iterable[str],
+    unavailable: Callable[[], Optional[str]] = lambda: None,
+) -> Callable[[Callable[[bytes], bytes]], Callable[[bytes], bytes]]:
+    """Decorator adding a stage under ``name`` for pages in ``formats``."""
+
+    def decorator(run: Callable[[bytes], bytes]) -> Callable[[bytes], bytes]:
+        STAGES[name] = Stage(name, frozenset(formats), run, unavailable)
+        return run
+
+    return decorator
+
+
+def resolve_stages(value, output_formats: Iterable[str]) -> Optional[List[str]]:
+    """Validate a stage list (comma-separated string or list) for a request.
+
+    Every stage must be known, available, and apply to at least one of
+    ``output_formats``. Returns None when no stages were given; raises
+    :class:`PostProcessError` (501 for a missing optional dependency).
+    """
+    if value is None or value == "" or value == []:
+        return None
+    names = value.split(",") if isinstance(value, str) else value
+    if not isinstance(names, list):
+        raise PostProcessError("postprocess must be a list or comma-separated string")
+    formats = set(output_formats)
+    stages: List[str] = []
+    for raw in names:
+        name = str(raw).strip().lower()
+        stage = STAGES.get(name)
+        if stage is None:
+            raise PostProcessError(
+                f"Unknown postprocess stage: {raw} (available: {', '.join(sorted(STAGES))})"
+            )
+        if not stage.formats & formats:
+            raise PostProcessError(
+                f"Stage {name} applies to {', '.join(sorted(stage.formats))} output only"
+            )
+        missing = stage.unavailable()
+        if missing:
+            raise PostProcessError(missing, 501)
+        if name not in stages:
+            stages.append(name)
+    return stages
+
+
+def applicable_stages(stages: Optional[List[str]], output_format: str) -> List[str]:
+    """The entries of ``stages`` that apply to ``output_format`` pages."""
+    return [name for name in stages or () if output_format in STAGES[name].formats]
+
+
+def postprocessed_key(cache_key: str, stages: List[str]) -> str:
+    """Cache key of a render's pages after ``stages`` (``cache_key`` itself if none)."""
+    if not stages:
+        return cache_key
+    encoded = json.dumps({"key": cache_key, "postprocess": stages}, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Savings:
+    """Bytes removed per stage, for ``/metrics``."""
+
+    def __init__(self):
+        self.saved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, before: int, after: int) -> None:
+        with self._lock:
+            self.saved[stage] = self.saved.get(stage, 0) + before - after
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        with self._lock:
+            saved = dict(self.saved)
+        yield "postprocess_saved_bytes_total", "counter", "Bytes removed by post-export stages", [
+            ({"stage": stage}, count) for stage, count in sorted(saved.items())
+        ]
+
+
+_savings = _Savings()
+metrics.collector(_savings.collect_metrics)
+
+
+def apply_stages(pages: List[bytes], output_format: str, stages: List[str]) -> List[bytes]:
+    """Run ``stages`` (see :func:`applicable_stages`) over every page, timed."""
+    for name in stages:
+        stage = STAGES[name]
+        before = sum(len(page) for page in pages)
+        with metrics.stage(f"postprocess_{name}", output_format):
+            pages = [stage.run(page) for page in pages]
+        _savings.add(name, before, sum(len(page) for page in pages))
+    return pages
+
+
+# -- PDF ----------------------------------------------------------------------
+
+
+def _pikepdf():
+    try:
+        import pikepdf
+    except ImportError:
+        return None
+    return pikepdf
+
+
+def _needs_pikepdf() -> Optional[str]:
+    if _pikepdf() is None:
+        return "PDF linearization requires pikepdf: pip install 'typst-api[postprocess]'"
+    return None
+
+
+@register_stage("linearize", {"pdf"}, _needs_pikepdf)
+def linearize_pdf(data: bytes) -> bytes:
+    """Linearize ("fast web view") with compressed object streams."""
+    pikepdf = _pikepdf()
+    out = io.BytesIO()
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        pdf.save(
+            out,
+            linearize=True,
+            compress_streams=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+    return out.getvalue()
+
+
+# -- PNG ----------------------------------------------------------------------
+
+
+def _needs_pillow() -> Optional[str]:
+    if pillow() is None:
+        return "PNG optimisation requires Pillow: pip install 'typst-api[thumbnails]'"
+    return None
+
+
+def _save_png(image, **kwargs) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True, **kwargs)
+    return out.getvalue()
+
+
+@register_stage("optimize", {"png"}, _needs_pillow)
+def optimize_png(data: bytes) -> bytes:
+    """Lossless recompression; the original is kept if it is already smaller."""
+    with pillow().open(io.BytesIO(data)) as image:
+        optimized = _save_png(image)
+    return optimized if len(optimized) < len(data) else data
+
+
+@register_stage("quantize", {"png"}, _needs_pillow)
+def quantize_png(data: bytes) -> bytes:
+    """Lossy: reduce to a 256-colour palette (alpha kept), then recompress."""
+    Image = pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        quantized = image.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE)
+        result = _save_png(quantized)
+    return result if len(result) < len(data) else data
+
+
+# -- SVG ----------------------------------------------------------------------
+
+# Attribute names are anchored so that e.g. ``data-id`` is left alone
+_SVG_ID = re.compile(r'(?<![\w-])id="([^"]+)"')
+_SVG_REF = re.compile(r'(href="#|url\(#)([^")]+)')
+_SVG_PATH = re.compile(r'(?<![\w-])d="([^"]*)"')
+_SVG_USE = re.compile(r"<use\b[^>]*>")
+_SVG_COLOR = re.compile(
+    r'(?<![\w-])(fill|stroke|stop-color)="#([0-9a-fA-F])\2([0-9a-fA-F])\3([0-9a-fA-F])\4"'
+)
+
+
+def _short_id(n: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    name = ""
+    while True:
+        n, r = divmod(n, 36)
+        name = digits[r] + name
+        if not n:
+            return "g" + name
+
+
+def _minify_path(match: "re.Match[str]") -> str:
+    d = re.sub(r"\s*([A-Za-z])\s*", r"\1", match.group(1))
+    return 'd="' + re.sub(r"\s+(-)", r"\1", d.strip()) + '"'
+
+
+@register_stage("minify", {"svg"})
+def minify_svg(data: bytes) -> bytes:
+    """Minify Typst's SVG without changing how it renders.
+
+    Shortens the long glyph ids, drops path-data whitespace and redundant
+    ``x="0"``/``y="0"`` on ``<use>``, and uses three-digit colours.
+    ``fill-rule="nonzero"`` is dropped only when nothing in the document
+    sets ``evenodd``, since it is inherited and otherwise may override an
+    ancestor's rule.
+    """
+    text = data.decode("utf-8")
+    ids = {old: _short_id(i) for i, old in enumerate(dict.fromkeys(_SVG_ID.findall(text)))}
+    text = _SVG_ID.sub(lambda m: f'id="{ids[m.group(1)]}"', text)
+    text = _SVG_REF.sub(lambda m: m.group(1) + ids.get(m.group(2), m.group(2)), text)
+    text = _SVG_PATH.sub(_minify_path, text)
+    if "evenodd" not in text:
+        text = text.replace(' fill-rule="nonzero"', "")
+    text = _SVG_USE.sub(lambda m: m.group(0).replace(' x="0"', "").replace(' y="0"', ""), text)
+    text = _SVG_COLOR.sub(r'\1="#\2\3\4"', text)
+    return text.encode("utf-8")
+
+
+# -- Content-Encoding ---------------------------------------------------------
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings(preferred: Iterable[str]) -> List[str]:
+    """The ``preferred`` content codings this process can produce, in order."""
+    return [e for e in preferred if e == "gzip" or (e == "br" and _brotli() is not None)]
+
+
+def content_encode(data: bytes, encoding: str) -> bytes:
+    """Compress ``data`` with ``gzip`` or ``br``."""
+    if encoding == "br":
+        return _brotli().compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
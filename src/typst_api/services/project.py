@@ -0,0 +1,129 @@
+"""In-memory Typst project file trees."""
+
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+
+class ProjectError(Exception):
+    """The uploaded project is invalid or exceeds a limit."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def normalize_path(name: str) -> Optional[str]:
+    """Return a safe relative POSIX path, or None if it escapes the root."""
+    name = name.replace("\\", "/")
+    if name.startswith("/"):
+        return None
+    normalized = posixpath.normpath(name)
+    if normalized == ".." or normalized.startswith("../"):
+        return None
+    return normalized
+
+
+def default_extract_dir() -> str:
+    """Prefer a RAM-backed directory for materialized projects."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class ProjectFiles:
+    """A Typst project held in memory as ``{relative path: bytes}``."""
+
+    def __init__(self, files: Optional[Dict[str, bytes]] = None):
+        self.files: Dict[str, bytes] = dict(files or {})
+
+    @classmethod
+    def from_zip(
+        cls,
+        stream: BinaryIO,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+    ) -> "ProjectFiles":
+        """Read ZIP members straight from ``stream`` without touching disk.
+
+        Raises ``zipfile.BadZipFile`` for non-ZIP input and
+        :class:`ProjectError` for unsafe paths or when the entry count or
+        total uncompressed size exceeds the given limits (zip bomb guard).
+        """
+        files: Dict[str, bytes] = {}
+        total = 0
+        with zipfile.ZipFile(stream) as archive:
+            members = [m for m in archive.infolist() if not m.is_dir()]
+            if max_entries and len(members) > max_entries:
+                raise ProjectError(
+                    f"Too many files in zip (limit {max_entries})", status_code=413
+                )
+            for member in members:
+                path = normalize_path(member.filename)
+                if path is None:
+                    raise ProjectError(f"Invalid path in zip: {member.filename}")
+                # file_size is attacker-controlled; also cap the bytes read
+                remaining = max_bytes - total if max_bytes else -1
+                if max_bytes and member.file_size > remaining:
+                    raise _too_large(max_bytes)
+                with archive.open(member) as f:
+                    data = f.read(remaining + 1 if max_bytes else -1)
+                total += len(data)
+                if max_bytes and total > max_bytes:
+                    raise _too_large(max_bytes)
+                files[path] = data
+        return cls(files)
+
+    def digest(self) -> str:
+        """Content hash over sorted paths and file contents."""
+        h = hashlib.sha256()
+        for path in sorted(self.files):
+            data = self.files[path]
+            h.update(path.encode("utf-8"))
+            h.update(b"\0")
+            h.update(len(data).to_bytes(8, "big"))
+            h.update(data)
+        return h.hexdigest()
+
+    def sources(self) -> List[bytes]:
+        """Contents of the project's ``.typ`` files."""
+        return [data for path, data in self.files.items() if path.endswith(".typ")]
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for data in self.files.values())
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @contextmanager
+    def materialize(self, base_dir: Optional[str] = None) -> Iterator[str]:
+        """Write the tree to a temporary root directory, removed on exit."""
+        root = tempfile.mkdtemp(prefix="typst-api-", dir=base_dir)
+        try:
+            self.write_to(root)
+            yield root
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def write_to(self, root: str, paths: Optional[Iterable[str]] = None) -> None:
+        """Write ``paths`` (all files by default) below an existing ``root``."""
+        for path in self.files if paths is None else paths:
+            target = os.path.join(root, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(self.files[path])
+
+
+def _too_large(max_bytes: int) -> ProjectError:
+    return ProjectError(
+        f"Zip contents exceed {max_bytes} bytes uncompressed", status_code=413
+    )
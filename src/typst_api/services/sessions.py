@@ -0,0 +1,327 @@
+"""Incremental compilation sessions for live preview.
+
+A session keeps one ``typst.Compiler`` and an on-disk project root alive
+between edits. Recompiling the same world after a small change lets Typst's
+memoisation skip the unchanged parts, and per-page hashes let the client
+fetch only the pages that actually changed.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import typst
+
+from .admission import admission_service
+from .compiler import CompileOptions, build_compile_kwargs, compiler_service
+from .executor import BackendBusyError, CompileError, CompileLimitError, CompileLimits
+from .metrics import metrics
+from .packages import package_service
+from .project import ProjectFiles, normalize_path
+
+# Page changes: 1-based page numbers whose output differs from the last compile
+Changed = List[int]
+
+
+class SessionError(Exception):
+    """A session request is invalid or cannot be served."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Session:
+    """A live project: its files on disk, a warm compiler and the last pages.
+
+    ``compiler`` is ``None`` when compiles go to the process backend, which
+    enforces the compile limits that an in-process compiler cannot.
+    """
+
+    def __init__(
+        self,
+        project: ProjectFiles,
+        entrypoint: str,
+        options: CompileOptions,
+        root: str,
+        compiler: Optional[typst.Compiler],
+    ):
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.entrypoint = entrypoint
+        self.options = options
+        self.root = root
+        self.compiler = compiler
+        self.version = 0
+        self.pages: List[bytes] = []
+        self.page_hashes: List[str] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def apply(
+        self,
+        path: str,
+        source: Optional[str] = None,
+        edits: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> None:
+        """Replace ``path`` with ``source`` or apply ``edits`` to its text.
+
+        Each edit is ``{"start": int, "end": int, "text": str}`` with
+        character offsets into the text as left by the previous edit.
+        """
+        self.write(path, self.edited(path, source, edits))
+
+    def edited(
+        self,
+        path: str,
+        source: Optional[str] = None,
+        edits: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> bytes:
+        """The content :meth:`apply` would give ``path``, leaving the session as is."""
+        if source is None:
+            current = self.project.files.get(path)
+            if current is None:
+                raise SessionError(f"File not found in session: {path}", 404)
+            try:
+                source = _apply_edits(current.decode("utf-8"), edits or [])
+            except UnicodeDecodeError:
+                raise SessionError(f"Cannot edit non-text file: {path}")
+        return source.encode("utf-8")
+
+    def write(self, path: str, data: bytes) -> None:
+        """Store ``data`` as ``path`` and bump the version."""
+        self.project.files[path] = data
+        self.project.write_to(self.root, [path])
+        self.version += 1
+
+    def compile(
+        self,
+        limits: Optional[CompileLimits] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> Changed:
+        """Recompile the session's world; returns the changed page numbers.
+
+        Without a compiler of its own the session compiles on the compile
+        backend, pinned to one worker by its id and bound by ``limits``.
+        Raises :class:`CompileError` (:class:`CompileLimitError` if the
+        compile was killed); the previous pages are kept.
+        """
+        kwargs = build_compile_kwargs(
+            os.path.join(self.root, self.entrypoint), self.root, self.options
+        )
+        output_format = self.options.output_format
+        try:
+            with metrics.stage("compile", output_format):
+                if self.compiler is None:
+                    result = compiler_service.backend.compile(
+                        kwargs, limits, cancelled, affinity=self.id
+                    )
+                else:
+                    sys_inputs = kwargs.pop("sys_inputs", None)
+                    result = self.compiler.compile(sys_inputs=sys_inputs, **kwargs)
+        except BackendBusyError:
+            metrics.compile_errors.inc(format=output_format, reason="busy")
+            raise
+        except CompileLimitError as e:
+            metrics.compile_errors.inc(format=output_format, reason=e.code)
+            self.error = str(e)
+            raise
+        except Exception as e:
+            metrics.compile_errors.inc(format=output_format, reason="compile")
+            self.error = str(e)
+            raise CompileError(str(e)) from e
+        metrics.compiles.inc(format=output_format)
+        self.error = None
+
+        pages = list(result) if isinstance(result, list) else [result]
+        hashes = [hashlib.sha256(page).hexdigest() for page in pages]
+        changed = [
+            n
+            for n, digest in enumerate(hashes, start=1)
+            if n > len(self.page_hashes) or self.page_hashes[n - 1] != digest
+        ]
+        self.pages, self.page_hashes = pages, hashes
+        return changed
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "version": self.version,
+            "entrypoint": self.entrypoint,
+            "format": self.options.output_format,
+            "page_count": len(self.pages),
+            "page_hashes": list(self.page_hashes),
+            "files": sorted(self.project.files),
+            "error": self.error,
+            "created_at": self.created_at,
+        }
+
+
+class SessionService:
+    """Per-worker registry of live sessions with an idle TTL and a cap."""
+
+    def __init__(self):
+        self.max_sessions = 0
+        self.ttl = 0.0
+        self.base_dir: Optional[str] = None
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Configure session limits from a Flask app's config."""
+        self.close_all()
+        self.max_sessions = app.config.get("SESSION_MAX", 0)
+        self.ttl = app.config.get("SESSION_TTL", 0)
+        self.base_dir = app.config.get("SESSION_DIR") or compiler_service.extract_dir
+
+    def create(
+        self, project: ProjectFiles, entrypoint: str, options: CompileOptions
+    ) -> Tuple[Session, Changed]:
+        """Open a session and compile it once.
+
+        Raises :class:`SessionError` (503 at the session cap),
+        :class:`CompileError` or :class:`BackendBusyError` (no compile
+        slot), in which case no session is kept.
+        """
+        with self._lock:
+            self._sweep()
+            if self.max_sessions and len(self._sessions) >= self.max_sessions:
+                raise SessionError("Too many live sessions", 503)
+
+        package_service.check(project.sources())
+        root = tempfile.mkdtemp(prefix="typst-api-session-", dir=self.base_dir)
+        project = ProjectFiles(project.files)
+        project.write_to(root)
+        compiler = None
+        if compiler_service.backend.name == "inline":
+            compiler = compiler_service.compiler_pool.new_compiler()
+        session = Session(project, entrypoint, options, root, compiler)
+        try:
+            with admission_service.controller.slot():
+                changed = session.compile(*compiler_service.request_limits())
+        except (CompileError, BackendBusyError):
+            session.close()
+            raise
+
+        with self._lock:
+            if self.max_sessions and len(self._sessions) >= self.max_sessions:
+                session.close()
+                raise SessionError("Too many live sessions", 503)
+            self._sessions[session.id] = session
+        return session, changed
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            self._sweep()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+            return session
+
+    def update(
+        self,
+        session_id: str,
+        path: Optional[str] = None,
+        source: Optional[str] = None,
+        edits: Optional[Sequence[Dict[str, Any]]] = None,
+        sys_inputs: Optional[Dict[str, str]] = None,
+        version: Optional[int] = None,
+    ) -> Tuple[Session, Changed]:
+        """Apply a change and recompile; returns the session and changed pages.
+
+        ``version`` (if given) must match the session's current version,
+        so an edit computed against stale text is rejected with 409.
+        Raises :class:`SessionError`, :class:`CompileError`
+        (:class:`~.packages.MissingPackagesError`) or
+        :class:`BackendBusyError`; the latter two leave the session as is.
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise SessionError("Session not found", 404)
+        target = normalize_path(path) if path else session.entrypoint
+        if target is None:
+            raise SessionError(f"Invalid path: {path}")
+
+        with session.lock:
+            if version is not None and version != session.version:
+                raise SessionError(
+                    f"Version mismatch: session is at {session.version}", 409
+                )
+            data = None
+            if source is not None or edits:
+                # Checked before applying, so a rejected edit leaves the session as is
+                data = session.edited(target, source=source, edits=edits)
+                package_service.check([data])
+            # Likewise a compile slot: a refused edit must not be half applied
+            with admission_service.controller.slot():
+                if data is not None:
+                    session.write(target, data)
+                if sys_inputs is not None:
+                    session.options = replace(session.options, sys_inputs=sys_inputs or None)
+                    session.version += 1
+                changed = session.compile(*compiler_service.request_limits())
+            session.last_used = time.monotonic()
+            return session, changed
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        with session.lock:
+            session.close()
+        return True
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+    def collect_metrics(self) -> Iterator[Tuple[str, str, str, list]]:
+        """Report live sessions for ``/metrics``."""
+        with self._lock:
+            live = len(self._sessions)
+        yield "sessions", "gauge", "Live preview sessions in this process", [({}, live)]
+
+    def _sweep(self) -> None:
+        """Close sessions idle for longer than the TTL (caller holds the lock)."""
+        if not self.ttl:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for session_id, session in list(self._sessions.items()):
+            if session.last_used >= cutoff or not session.lock.acquire(blocking=False):
+                continue  # fresh, or busy compiling
+            try:
+                del self._sessions[session_id]
+                session.close()
+            finally:
+                session.lock.release()
+
+
+def _apply_edits(text: str, edits: Sequence[Dict[str, Any]]) -> str:
+    for edit in edits:
+        try:
+            start, end, insert = int(edit["start"]), int(edit["end"]), str(edit["text"])
+        except (KeyError, TypeError, ValueError):
+            raise SessionError("Each edit needs integer start/end and text")
+        if not 0 <= start <= end <= len(text):
+            raise SessionError(f"Edit range {start}-{end} outside text of length {len(text)}")
+        text = text[:start] + insert + text[end:]
+    return text
+
+
+# Singleton instance for use across routes
+session_service = SessionService()
+metrics.collector(session_service.collect_metrics)
@@ -0,0 +1,388 @@
+"""Template registry: projects registered once, then rendered with data only.
+
+Each registration is an immutable, numbered version stored as an extracted
+tree on disk, shared by all workers pointing at the same directory::
+
+    <TEMPLATE_DIR>/<name>/<version>/meta.json
+    <TEMPLATE_DIR>/<name>/<version>/files/...
+
+Renders compile straight from that tree, so neither upload nor extraction
+is on the hot path. Data reaches the template either as ``sys_inputs`` or
+as a JSON file laid over the tree. Render cache keys derive from the
+version's content digest, never from its number.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import Response
+
+from .executor import CompileError
+from .metrics import metrics
+from .packages import package_service
+from .project import ProjectFiles, default_extract_dir, normalize_path
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+_DATA_PATH_RE = re.compile(r"^[A-Za-z0-9_.-]+\.json$")
+
+if TYPE_CHECKING:
+    from .compiler import CompileOptions
+
+DATA_MODES = ("inputs", "file")
+
+
+class TemplateError(Exception):
+    """A template cannot be registered or rendered as requested."""
+
+    def __init__(self, message: str, status_code: int = 400, details: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+@dataclass(frozen=True)
+class TemplateVersion:
+    """One registered version of a template."""
+
+    name: str
+    version: int
+    digest: str  # of the stored tree, including a file-mode sample
+    entrypoint: str
+    data: str  # "inputs" or "file"
+    data_path: str  # file mode: top-level JSON file the data is written to
+    sample: Any  # data the version was validated and warmed with
+    created_at: float
+    root: str
+
+    @property
+    def input(self) -> str:
+        return os.path.join(self.root, self.entrypoint)
+
+    def describe(self) -> Dict[str, Any]:
+        info = asdict(self)
+        del info["root"]
+        return info
+
+
+def data_inputs(data: Any) -> Dict[str, str]:
+    """``sys_inputs`` for inputs-mode data: strings as-is, other values as JSON."""
+    if not isinstance(data, dict):
+        raise TemplateError("data must be a JSON object for this template")
+    return {
+        str(key): value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+        for key, value in data.items()
+    }
+
+
+class TemplateRegistry:
+    """Versioned templates stored below ``directory``.
+
+    A version becomes visible once its ``meta.json`` exists, which is
+    written only after the tree compiled. Versions are never modified;
+    their metadata is cached in memory once read.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._meta: Dict[Tuple[str, int], TemplateVersion] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def names(self) -> List[str]:
+        if not self.directory:
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.directory)
+            if _NAME_RE.match(name) and self.versions(name)
+        )
+
+    def versions(self, name: str) -> List[int]:
+        """Registered version numbers of ``name``, oldest first."""
+        if not self.directory or not _NAME_RE.match(name):
+            return []
+        base = os.path.join(self.directory, name)
+        try:
+            entries = os.listdir(base)
+        except OSError:
+            return []
+        return sorted(
+            int(entry)
+            for entry in entries
+            if entry.isdigit() and os.path.exists(os.path.join(base, entry, "meta.json"))
+        )
+
+    def get(self, name: str, version: Optional[int] = None) -> TemplateVersion:
+        """A version of ``name`` (the latest by default); raises :class:`TemplateError` (404)."""
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                raise TemplateError(f"Template not found: {name}", 404)
+            version = versions[-1]
+        cached = self._meta.get((name, version))
+        if cached is not None:
+            return cached
+        path = os.path.join(self.directory, name, str(version))
+        try:
+            with open(os.path.join(path, "meta.json"), "rb") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise TemplateError(f"Template version not found: {name}@{version}", 404)
+        template = TemplateVersion(root=os.path.join(path, "files"), **meta)
+        self._meta[(name, version)] = template
+        return template
+
+    def stage(self, name: str, project: ProjectFiles) -> str:
+        """Write ``project`` to a new, not yet visible version directory."""
+        base = os.path.join(self.directory, name)
+        os.makedirs(base, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=base)
+        project.write_to(os.path.join(staging, "files"))
+        return staging
+
+    def publish(self, name: str, staging: str) -> int:
+        """Move a staged tree to the next free version number, still without metadata."""
+        base = os.path.join(self.directory, name)
+        while True:
+            taken = [int(e) for e in os.listdir(base) if e.isdigit()]
+            version = max(taken, default=0) + 1
+            try:
+                os.rename(staging, os.path.join(base, str(version)))
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                continue  # another worker took this number
+            return version
+
+    def commit(self, template: TemplateVersion) -> None:
+        """Write a published version's metadata, making it visible."""
+        path = os.path.dirname(template.root)
+        fd, tmp_path = tempfile.mkstemp(dir=path)
+        with os.fdopen(fd, "w") as f:
+            json.dump(template.describe(), f, sort_keys=True)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+        self._meta[(template.name, template.version)] = template
+
+    @staticmethod
+    def discard(path: str) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class TemplateService:
+    """Registers, validates, warms and renders templates."""
+
+    def __init__(self):
+        self.registry = TemplateRegistry()
+        self.overlay_dir: Optional[str] = None
+
+    def init_app(self, app) -> None:
+        """Configure the registry from a Flask app's config."""
+        directory = app.config.get("TEMPLATE_DIR") or os.path.join(
+            tempfile.gettempdir(), "typst-api-templates"
+        )
+        self.registry = TemplateRegistry(directory)
+        self.overlay_dir = app.config.get("ZIP_EXTRACT_DIR") or default_extract_dir()
+
+    def warm_documents(self) -> List[Tuple[str, str, Optional[Dict[str, str]]]]:
+        """The latest version of every template with its sample, for ``WARMUP_ENABLED``."""
+        documents = []
+        for name in self.registry.names():
+            template = self.registry.get(name)
+            sys_inputs = None
+            if template.data == "inputs":
+                sys_inputs = data_inputs(template.sample or {})
+            documents.append((template.input, template.root, sys_inputs))
+        return documents
+
+    def register(
+        self,
+        name: str,
+        project: ProjectFiles,
+        entrypoint: str = "main.typ",
+        data: str = "inputs",
+        data_path: str = "data.json",
+        sample: Any = None,
+    ) -> Tuple[TemplateVersion, bool]:
+        """Validate, store and warm-compile a new version of ``name``.
+
+        Registering the latest version's content and settings again
+        returns it unchanged. Returns ``(template, created)``; raises
+        :class:`TemplateError` (422 if the template does not compile),
+        :class:`~.packages.MissingPackagesError` or
+        :class:`~.executor.BackendBusyError`.
+        """
+        from .compiler import CompileOptions, build_compile_kwargs, compiler_service
+
+        if not _NAME_RE.match(name):
+            raise TemplateError(
+                "Template names are 1-64 letters, digits, '.', '_' or '-'"
+            )
+        if data not in DATA_MODES:
+            raise TemplateError(f"data must be one of: {', '.join(DATA_MODES)}")
+        if not _DATA_PATH_RE.match(data_path):
+            raise TemplateError("data_path must be a top-level .json file name")
+        entrypoint = normalize_path(entrypoint) or entrypoint
+        if entrypoint not in project:
+            raise TemplateError(f"Entrypoint not found: {entrypoint}")
+        if data == "inputs":
+            sys_inputs = data_inputs({} if sample is None else sample)
+        else:
+            sys_inputs = None
+            if entrypoint == data_path:
+                raise TemplateError("data_path must not be the entrypoint")
+            if sample is not None:
+                project.files[data_path] = json.dumps(sample).encode("utf-8")
+        package_service.check(project.sources())
+
+        digest = project.digest()
+        settings = {
+            "entrypoint": entrypoint,
+            "data": data,
+            "data_path": data_path,
+            "sample": sample,
+        }
+        versions = self.registry.versions(name)
+        if versions:
+            latest = self.registry.get(name, versions[-1])
+            if latest.digest == digest and all(
+                getattr(latest, key) == value for key, value in settings.items()
+            ):
+                return latest, False
+
+        with metrics.stage("store"):
+            staging = self.registry.stage(name, project)
+            version = self.registry.publish(name, staging)
+        path = os.path.join(self.registry.directory, name, str(version))
+        template = TemplateVersion(
+            name=name,
+            version=version,
+            digest=digest,
+            created_at=time.time(),
+            root=os.path.join(path, "files"),
+            **settings,
+        )
+        # Compiled at its final path, so this worker's compilers stay warm for it
+        options = CompileOptions(sys_inputs=sys_inputs)
+        try:
+            pages = compiler_service.compile_pages(
+                build_compile_kwargs(template.input, template.root, options)
+            )
+        except CompileError as e:
+            self.registry.discard(path)
+            raise TemplateError("Template failed to compile", 422, details=str(e))
+        except BaseException:
+            self.registry.discard(path)
+            raise
+        if not pages:
+            self.registry.discard(path)
+            raise TemplateError("Template produced no output", 422)
+        self.registry.commit(template)
+        return template, True
+
+    def render(
+        self,
+        name: str,
+        version: Optional[int],
+        data: Any,
+        options: "CompileOptions",
+    ) -> Tuple[Response, int]:
+        """Render a template version (the latest by default) with ``data``.
+
+        Goes through the render cache like any render, keyed by the
+        version's content and the data; ``X-Template-Version`` names the
+        version used. Raises :class:`TemplateError`.
+        """
+        from .compiler import compiler_service
+
+        template = self.registry.get(name, version)
+        digest, sys_inputs, overlay = self.resolve_data(template, data)
+        options = replace(options, sys_inputs=sys_inputs)
+        compile_input = partial(self.compile_input, template, data, overlay)
+        if options.outputs:
+            render = compiler_service.render_input_exports
+        else:
+            render = compiler_service.render_input
+        response, status = compiler_service.respond(
+            partial(render, digest, template.entrypoint, options, compile_input), options
+        )
+        response.headers["X-Template-Version"] = str(template.version)
+        return response, status
+
+    def resolve_data(
+        self, template: TemplateVersion, data: Any
+    ) -> Tuple[str, Optional[Dict[str, str]], bool]:
+        """``(cache digest, sys_inputs, overlay)`` for rendering ``template`` with ``data``.
+
+        Omitted data renders with the version's sample. File-mode data is
+        part of the digest; inputs-mode data is keyed as ``sys_inputs``.
+        """
+        if data is None:
+            data = template.sample
+            if template.data == "file":
+                return template.digest, None, False
+        if template.data == "inputs":
+            return template.digest, data_inputs({} if data is None else data), False
+        encoded = json.dumps(
+            {"template": template.digest, "data_path": template.data_path, "data": data},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest(), None, True
+
+    @contextmanager
+    def compile_input(
+        self, template: TemplateVersion, data: Any = None, overlay: bool = False
+    ) -> Iterator[Tuple[str, str]]:
+        """Yield ``(input, root)`` for ``template``.
+
+        With ``overlay``, the root is a scratch directory linking to the
+        stored tree, with ``data`` written to the data file.
+        """
+        if not overlay:
+            yield template.input, template.root
+            return
+        with metrics.stage("materialize"):
+            root = tempfile.mkdtemp(prefix="typst-api-template-", dir=self.overlay_dir)
+            try:
+                _link_tree(template.root, root, template.entrypoint, skip=template.data_path)
+                with open(os.path.join(root, template.data_path), "w") as f:
+                    json.dump(data, f)
+            except OSError:
+                shutil.rmtree(root, ignore_errors=True)
+                raise
+        try:
+            yield os.path.join(root, template.entrypoint), root
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def _link_tree(source: str, target: str, entrypoint: str, skip: str) -> None:
+    """Symlink ``source``'s entries into ``target``, copying the entrypoint.
+
+    Typst wants the entrypoint itself inside the root, so the directories
+    on its path are recreated and the file copied; everything else is a
+    link. ``skip`` (the data file) is left out at the top level.
+    """
+    parts = entrypoint.split("/")
+    for depth, part in enumerate(parts):
+        for entry in os.listdir(source):
+            if entry != part and not (depth == 0 and entry == skip):
+                os.symlink(os.path.join(source, entry), os.path.join(target, entry))
+        source, target = os.path.join(source, part), os.path.join(target, part)
+        if depth < len(parts) - 1:
+            os.mkdir(target)
+    shutil.copyfile(source, target)
+
+
+# Singleton instance for use across routes
+template_service = TemplateService()
@@ -0,0 +1,159 @@
+"""First-page thumbnails sized to fit a pixel box.
+
+A thumbnail is derived from a PNG render of the document: downscaled from a
+cached base render when one is at hand, otherwise rasterised at the PPI that
+fits the box (the page size being read from any cached PDF, SVG or PNG
+render). Resizing and JPEG/WebP encoding need Pillow
+(``pip install 'typst-api[thumbnails]'``); without it thumbnails are PNGs
+rasterised at the fitted PPI.
+"""
+
+import hashlib
+import io
+import json
+import re
+import struct
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+THUMBNAIL_FORMATS: Dict[str, str] = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_SVG_SIZE = re.compile(rb'<svg[^>]*?\swidth="([\d.]+)pt"[^>]*?\sheight="([\d.]+)pt"')
+_PDF_MEDIABOX = re.compile(
+    rb"/MediaBox\s*\[\s*([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s*\]"
+)
+
+
+class ThumbnailError(Exception):
+    """A thumbnail cannot be produced as requested."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class ThumbnailOptions:
+    """Bounding box in pixels (None: unbounded) and output encoding."""
+
+    width: Optional[int] = 256
+    height: Optional[int] = 256
+    format: str = "png"
+    quality: int = 80
+
+    @property
+    def mimetype(self) -> str:
+        return THUMBNAIL_FORMATS[self.format]
+
+
+def thumbnail_cache_key(
+    source_digest: str,
+    entrypoint: Optional[str],
+    sys_inputs: Optional[Dict[str, str]],
+    thumb: ThumbnailOptions,
+) -> str:
+    """Cache key (and strong ETag) for a thumbnail of a source or project."""
+    parts = {
+        "source": source_digest,
+        "entrypoint": entrypoint,
+        "sys_inputs": sorted((sys_inputs or {}).items()),
+        "thumbnail": [thumb.width, thumb.height, thumb.format, thumb.quality],
+    }
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def pillow():
+    """The ``PIL.Image`` module, or None if Pillow is not installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def png_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Pixel size from a PNG's IHDR chunk."""
+    if not data.startswith(_PNG_SIGNATURE) or len(data) < 24:
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def page_size(data: bytes, output_format: str, ppi: float = 144.0) -> Optional[Tuple[float, float]]:
+    """Size in points of a rendered page (``ppi`` applies to PNG renders)."""
+    if output_format == "png":
+        dims = png_dimensions(data)
+        if dims is None:
+            return None
+        return dims[0] * 72 / ppi, dims[1] * 72 / ppi
+    if output_format == "svg":
+        match = _SVG_SIZE.search(data[:4096])
+        if match is None:
+            return None
+        return float(match.group(1)), float(match.group(2))
+    if output_format == "pdf":
+        match = _PDF_MEDIABOX.search(data)
+        if match is None:
+            return None
+        x0, y0, x1, y1 = (float(v) for v in match.groups())
+        return abs(x1 - x0), abs(y1 - y0)
+    return None
+
+
+def fit_ppi(size: Tuple[float, float], thumb: ThumbnailOptions) -> float:
+    """Largest PPI at which a page of ``size`` points fits the thumbnail box."""
+    width_pt, height_pt = size
+    candidates = []
+    if thumb.width:
+        candidates.append(thumb.width * 72 / width_pt)
+    if thumb.height:
+        candidates.append(thumb.height * 72 / height_pt)
+    return min(candidates)
+
+
+def covers(png: bytes, thumb: ThumbnailOptions) -> bool:
+    """Whether downscaling ``png`` can fill the thumbnail box."""
+    dims = png_dimensions(png)
+    if dims is None:
+        return False
+    scales = []
+    if thumb.width:
+        scales.append(thumb.width / dims[0])
+    if thumb.height:
+        scales.append(thumb.height / dims[1])
+    return min(scales) <= 1
+
+
+def encode(png: bytes, thumb: ThumbnailOptions) -> bytes:
+    """Fit ``png`` into the thumbnail box and encode it in the thumbnail format.
+
+    Without Pillow the PNG is returned as-is (it must already be rendered
+    at the fitted PPI) and only PNG output is possible.
+    """
+    Image = pillow()
+    if Image is None:
+        if thumb.format != "png":
+            raise ThumbnailError(
+                f"{thumb.format} thumbnails require Pillow: "
+                "pip install 'typst-api[thumbnails]'",
+                501,
+            )
+        return png
+    with Image.open(io.BytesIO(png)) as image:
+        image.thumbnail(
+            (thumb.width or image.width, thumb.height or image.height),
+            Image.Resampling.LANCZOS,
+        )
+        if thumb.format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        if thumb.format == "png":
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.save(out, format=thumb.format.upper(), quality=thumb.quality)
+    return out.getvalue()
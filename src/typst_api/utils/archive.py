@@ -0,0 +1,67 @@
+"""Streaming multi-file response bodies (ZIP and multipart/mixed)."""
+
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+# Entries are (filename, mimetype, data)
+Entry = Tuple[str, str, bytes]
+
+# Already-compressed formats gain nothing from deflate
+_STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".pdf")
+
+
+class _ChunkBuffer:
+    """Unseekable sink that hands out what was written since the last drain.
+
+    Having no ``tell``/``seek`` makes ``zipfile`` use data descriptors
+    instead of rewriting local headers, so entries can be sent as they
+    are added.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[Entry]) -> Iterator[bytes]:
+    """Yield a ZIP archive chunk by chunk, one entry at a time."""
+    sink = _ChunkBuffer()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for filename, _, data in entries:
+            compress = (
+                zipfile.ZIP_STORED
+                if filename.lower().endswith(_STORED_EXTENSIONS)
+                else zipfile.ZIP_DEFLATED
+            )
+            archive.writestr(filename, data, compress_type=compress)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def stream_multipart(entries: Iterable[Entry], boundary: str) -> Iterator[bytes]:
+    """Yield a multipart/mixed body, one part per entry."""
+    delimiter = f"--{boundary}\r\n".encode("ascii")
+    for filename, mimetype, data in entries:
+        yield delimiter + (
+            f"Content-Type: {mimetype}\r\n"
+            f'Content-Disposition: attachment; filename="{filename}"\r\n'
+            f"Content-Length: {len(data)}\r\n\r\n"
+        ).encode("ascii")
+        yield data
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode("ascii")
@@ -1,7 +1,7 @@
 """Input parsing and validation utilities."""
 
 import json
-from typing import Dict, Optional, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 VALID_FORMATS: Set[str] = {"pdf", "png", "svg"}
 
@@ -12,15 +12,19 @@ FORMAT_MIMETYPES: Dict[str, str] = {
 }
 
 
-def parse_format(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
-    """Validate and return output format.
+def parse_format(
+    value: Optional[str], formats: Set[str] = VALID_FORMATS
+) -> Tuple[Optional[str], Optional[str]]:
+    """Validate and return output format (one of ``formats``).
 
     Returns:
         (format, None) on success
         (None, bad_format) on failure
     """
+    if value is not None and not isinstance(value, str):
+        return None, str(value)  # e.g. a number in a JSON body
     fmt = (value or "pdf").lower()
-    if fmt not in VALID_FORMATS:
+    if fmt not in formats:
         return None, fmt
     return fmt, None
 
@@ -38,6 +42,24 @@ def parse_ppi(value) -> Tuple[Optional[float], Optional[str]]:
         return None, str(value)
 
 
+def parse_bounded_int(value, low: int, high: int) -> Tuple[Optional[int], Optional[str]]:
+    """Validate an integer in ``[low, high]``; None and "" pass through as None.
+
+    Returns:
+        (value, None) on success
+        (None, bad_value) on failure
+    """
+    if value is None or str(value).strip() == "":
+        return None, None
+    try:
+        number = int(value)
+    except (ValueError, TypeError):
+        return None, str(value)
+    if not low <= number <= high:
+        return None, str(value)
+    return number, None
+
+
 def parse_sys_inputs(
     raw: Optional[str],
 ) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
@@ -56,3 +78,176 @@ def parse_sys_inputs(
     if not isinstance(data, dict):
         return None, "sys_inputs must be a JSON object"
     return {str(k): str(v) for k, v in data.items()}, None
+
+
+def parse_outputs(
+    value, default_ppi: float = 144.0
+) -> Tuple[Optional[List[Tuple[str, float]]], Optional[str]]:
+    """Parse a list of exports such as ``pdf,svg,png@72,png@300``.
+
+    Accepts a comma-separated string or a list. ``png`` without ``@ppi``
+    uses ``default_ppi``; other formats take no ppi. Duplicates are dropped.
+
+    Returns:
+        (None, None) when no outputs were given
+        ([(format, ppi), ...], None) on success
+        (None, error_message) on failure
+    """
+    if value is None or value == "" or value == []:
+        return None, None
+    items = value.split(",") if isinstance(value, str) else value
+    if not isinstance(items, list):
+        return None, "outputs must be a list or comma-separated string"
+
+    outputs: List[Tuple[str, float]] = []
+    for item in items:
+        fmt, _, ppi_raw = str(item).strip().lower().partition("@")
+        if fmt not in VALID_FORMATS:
+            return None, f"Unsupported output: {item}"
+        ppi = default_ppi
+        if ppi_raw:
+            if fmt != "png":
+                return None, f"ppi only applies to png outputs: {item}"
+            try:
+                ppi = float(ppi_raw)
+            except ValueError:
+                return None, f"Invalid ppi in output: {item}"
+        if fmt != "png":
+            ppi = 144.0
+        if (fmt, ppi) not in outputs:
+            outputs.append((fmt, ppi))
+    return outputs, None
+
+
+def format_outputs(outputs: List[Tuple[str, float]]) -> str:
+    """Inverse of :func:`parse_outputs`, e.g. ``pdf,png@72``."""
+    return ",".join(f"{fmt}@{ppi:g}" if fmt == "png" else fmt for fmt, ppi in outputs)
+
+
+VALID_ARCHIVES: Set[str] = {"zip", "multipart"}
+
+PageRanges = List[Tuple[int, Optional[int]]]
+
+
+def parse_pages(value) -> Tuple[Optional[PageRanges], Optional[str]]:
+    """Parse a page selection such as ``1-3,7``, ``5-`` or ``all``.
+
+    Page numbers are 1-based; an open-ended range runs to the last page.
+
+    Returns:
+        (None, None) when no selection was given
+        (ranges, None) on success
+        (None, error_message) on failure
+    """
+    if value is None or str(value).strip() == "":
+        return None, None
+    text = str(value).strip().lower()
+    if text == "all":
+        return [(1, None)], None
+
+    ranges: PageRanges = []
+    for part in text.split(","):
+        part = part.strip()
+        try:
+            if "-" in part:
+                start_raw, end_raw = part.split("-", 1)
+                start = int(start_raw)
+                end = int(end_raw) if end_raw.strip() else None
+            else:
+                start = end = int(part)
+        except ValueError:
+            return None, f"Invalid pages value: {value}"
+        if start < 1 or (end is not None and end < start):
+            return None, f"Invalid pages value: {value}"
+        ranges.append((start, end))
+    return ranges, None
+
+
+def format_pages(ranges: PageRanges) -> str:
+    """Inverse of :func:`parse_pages`, e.g. ``[(1, 3), (7, 7)]`` -> ``1-3,7``."""
+    parts = []
+    for start, end in ranges:
+        if end is None:
+            parts.append(f"{start}-")
+        elif start == end:
+            parts.append(str(start))
+        else:
+            parts.append(f"{start}-{end}")
+    return ",".join(parts)
+
+
+def parse_archive(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Validate and return the multi-page archive type.
+
+    Returns:
+        (archive, None) on success
+        (None, bad_archive) on failure
+    """
+    if value is not None and not isinstance(value, str):
+        return None, str(value)  # e.g. a number in a JSON body
+    archive = (value or "zip").lower()
+    if archive not in VALID_ARCHIVES:
+        return None, archive
+    return archive, None
+
+
+def resolve_pages(ranges: PageRanges, page_count: int) -> List[int]:
+    """Expand page ranges into 1-based page numbers that exist.
+
+    Pages past the end of the document are dropped; duplicates keep their
+    first position.
+    """
+    selected: List[int] = []
+    seen: Set[int] = set()
+    for start, end in ranges:
+        last = page_count if end is None else min(end, page_count)
+        for number in range(start, last + 1):
+            if number not in seen:
+                seen.add(number)
+                selected.append(number)
+    return selected
+
+
+VALID_BATCH_OUTPUTS: Set[str] = {"zip", "ndjson"}
+
+
+def parse_records(raw) -> Tuple[Optional[List[Dict[str, str]]], Optional[str]]:
+    """Parse batch ``sys_inputs`` records.
+
+    Accepts a list (already-decoded JSON), a JSON array string, or NDJSON
+    (one JSON object per line) as str or bytes.
+
+    Returns:
+        (records, None) on success
+        (None, error_message) on failure
+    """
+    if raw is None:
+        return None, "No records provided"
+    if isinstance(raw, bytes):
+        try:
+            raw = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return None, "records must be UTF-8 encoded"
+
+    if isinstance(raw, str):
+        text = raw.strip()
+        try:
+            if text.startswith("["):
+                items = json.loads(text)
+            else:
+                items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError:
+            return None, "Invalid JSON in records"
+    elif isinstance(raw, list):
+        items = raw
+    else:
+        return None, "records must be a JSON array or NDJSON"
+
+    records = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f"Record {i} must be a JSON object"
+        records.append({str(k): str(v) for k, v in item.items()})
+    if not records:
+        return None, "No records provided"
+    return records, None
@@ -0,0 +1,94 @@
+"""Request body ingestion: spool uploads to memory up to a threshold."""
+
+import select
+import socket
+import ssl
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Callable, Dict, Optional
+
+from flask import Request, current_app
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Environ key under which the ASGI front end exposes its disconnect flag
+DISCONNECTED_KEY = "typst_api.disconnected"
+
+
+def spool_stream(
+    stream: IO[bytes],
+    max_memory: int = DEFAULT_SPOOL_MAX_MEMORY,
+    dir: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> SpooledTemporaryFile:
+    """Copy ``stream`` chunk by chunk into a spooled file and rewind it.
+
+    Bodies up to ``max_memory`` bytes stay in memory; larger ones roll over
+    to a temporary file in ``dir``. Works for chunked request bodies, whose
+    length is unknown up front. The request's ``MAX_CONTENT_LENGTH`` is
+    enforced by the stream itself.
+    """
+    spool = SpooledTemporaryFile(max_size=max_memory, mode="w+b", dir=dir)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def spool_request_body(request: Request) -> SpooledTemporaryFile:
+    """Spool the raw request body using the app's upload settings."""
+    config = current_app.config
+    return spool_stream(
+        request.stream,
+        max_memory=config.get("UPLOAD_SPOOL_MAX_MEMORY", DEFAULT_SPOOL_MAX_MEMORY),
+        dir=config.get("UPLOAD_SPOOL_DIR"),
+    )
+
+
+class SpoolingRequest(Request):
+    """Request whose multipart file parts use the app's spool settings.
+
+    Werkzeug's default rolls every upload over to disk past 500KB; this
+    keeps uploads up to ``UPLOAD_SPOOL_MAX_MEMORY`` in memory instead.
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ) -> IO[bytes]:
+        config = current_app.config
+        return SpooledTemporaryFile(
+            max_size=config.get("UPLOAD_SPOOL_MAX_MEMORY", DEFAULT_SPOOL_MAX_MEMORY),
+            mode="rb+",
+            dir=config.get("UPLOAD_SPOOL_DIR"),
+        )
+
+
+def disconnect_checker(environ: Dict[str, Any]) -> Optional[Callable[[], bool]]:
+    """Return a callable telling whether the request's client has hung up.
+
+    Works with the ASGI front end and with the sockets gunicorn and the
+    Werkzeug dev server expose in the WSGI environ; returns None where the
+    connection cannot be probed (other servers, TLS terminated in-process).
+    """
+    if DISCONNECTED_KEY in environ:
+        return environ[DISCONNECTED_KEY]
+    sock = environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+    if not isinstance(sock, socket.socket) or isinstance(sock, ssl.SSLSocket):
+        return None
+
+    def disconnected() -> bool:
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # Readable with nothing to read means the peer closed the connection
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
+            return True
+
+    return disconnected
@@ -21,6 +21,17 @@ def client(app):
         yield client
 
 
+@pytest.fixture
+def store(app, tmp_path):
+    """A fresh asset store in which POSTed renders are stored and linked."""
+    from typst_api.services.assets import AssetStore, asset_service
+    from typst_api.services.compiler import compiler_service
+
+    asset_service.store = AssetStore(str(tmp_path), 0)
+    compiler_service.store_submissions = True
+    return asset_service.store
+
+
 @pytest.fixture
 def sample_zip():
     """Create a valid in-memory ZIP containing a minimal Typst file."""
@@ -0,0 +1,151 @@
+"""Tests for admission control."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from typst_api.services.admission import (
+    AdmissionController,
+    AdmissionError,
+    TokenBucket,
+    admission_service,
+    default_max_in_flight,
+)
+
+
+class TestTokenBucket:
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=1, burst=2)
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert 0 < bucket.take() <= 1
+
+
+class TestCompileSlots:
+    def test_queue_full_is_refused(self):
+        controller = AdmissionController(max_in_flight=1, queue_max=0)
+        with controller.slot():
+            with pytest.raises(AdmissionError) as excinfo:
+                with controller.slot():
+                    pass
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.retry_after >= 1
+        assert controller.stats()["rejected"] == {"queue_full": 1}
+
+    def test_waiter_times_out(self):
+        controller = AdmissionController(max_in_flight=1, queue_max=1, queue_timeout=0.05)
+        with controller.slot():
+            with pytest.raises(AdmissionError, match="Timed out"):
+                with controller.slot():
+                    pass
+        assert controller.stats()["waiting"] == 0
+
+    def test_waiter_gets_released_slot(self):
+        controller = AdmissionController(max_in_flight=1, queue_max=1, queue_timeout=5)
+        acquired = threading.Event()
+
+        def wait_for_slot():
+            with controller.slot():
+                acquired.set()
+
+        with controller.slot():
+            thread = threading.Thread(target=wait_for_slot)
+            thread.start()
+            time.sleep(0.05)
+            assert controller.stats()["waiting"] == 1
+        thread.join(timeout=5)
+        assert acquired.is_set()
+        assert controller.stats()["in_flight"] == 0
+
+    def test_background_ignores_queue_bound(self):
+        controller = AdmissionController(max_in_flight=1, queue_max=0)
+        done = threading.Event()
+
+        def background():
+            with controller.slot(background=True):
+                done.set()
+
+        with controller.slot():
+            thread = threading.Thread(target=background)
+            thread.start()
+            time.sleep(0.05)
+            assert not done.is_set()
+        thread.join(timeout=5)
+        assert done.is_set()
+
+
+class TestClientLimits:
+    def test_concurrency(self):
+        controller = AdmissionController(client_max_in_flight=1)
+        assert controller.enter_client("ip:a") is None
+        assert controller.enter_client("ip:a") is not None
+        assert controller.enter_client("ip:b") is None
+        controller.leave_client("ip:a")
+        assert controller.enter_client("ip:a") is None
+
+    def test_rate(self):
+        controller = AdmissionController(client_rate=0.5, client_burst=1)
+        assert controller.enter_client("key:x") is None
+        message, retry_after = controller.enter_client("key:x")
+        assert "Rate limit" in message
+        assert retry_after == 2
+
+    def test_idle_clients_are_forgotten(self):
+        controller = AdmissionController(client_max_in_flight=1, max_clients=2)
+        controller.enter_client("ip:busy")
+        controller.enter_client("ip:idle")
+        controller.leave_client("ip:idle")
+        controller.enter_client("ip:new")
+        assert set(controller._clients) == {"ip:busy", "ip:new"}
+
+
+class TestDefaultMaxInFlight:
+    @pytest.mark.parametrize(
+        "config, expected",
+        [
+            ({"COMPILER_POOL_SIZE": 2}, 2),
+            ({"COMPILER_POOL_SIZE": 0}, 64),
+            ({"COMPILE_BACKEND": "process", "COMPILE_WORKERS": 3}, 3),
+            ({"COMPILE_BACKEND": "process"}, 64),
+            ({"COMPILER_POOL_SIZE": 128}, 64),
+        ],
+    )
+    def test_capped_by_backend(self, monkeypatch, config, expected):
+        monkeypatch.setattr("os.cpu_count", lambda: 64)
+        assert default_max_in_flight(config) == expected
+
+
+class TestAdmissionRoutes:
+    def test_rate_limited_client_gets_429(self, app, client):
+        app.config.update(ADMISSION_CLIENT_RATE=0.01, ADMISSION_CLIENT_BURST=1)
+        admission_service.init_app(app)
+        source = {"source": "Hello"}
+        assert client.post("/render/raw", json=source).status_code == 200
+        response = client.post("/render/raw", json=source)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        # API keys get their own bucket
+        response = client.post("/render/raw", json=source, headers={"X-API-Key": "k1"})
+        assert response.status_code == 200
+
+    def test_saturated_node_gets_503(self, app, client):
+        app.config.update(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_QUEUE_MAX=0)
+        admission_service.init_app(app)
+        with admission_service.controller.slot():
+            response = client.post("/render/raw", json={"source": "Hello"})
+        assert response.status_code == 503
+        assert response.get_json()["error"] == "Compiler busy"
+        assert "Retry-After" in response.headers
+        assert client.post("/render/raw", json={"source": "Hello"}).status_code == 200
+
+    def test_saturated_node_refuses_batch_records(self, app, client):
+        app.config.update(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_QUEUE_MAX=0)
+        admission_service.init_app(app)
+        body = {"source": "Hello", "records": [{}, {}], "output": "ndjson"}
+        with admission_service.controller.slot():
+            # Records are refused like the request, not queued without a deadline
+            response = client.post("/render/batch", json=body)
+            lines = [json.loads(line) for line in response.data.splitlines()]
+        assert [line["error"] for line in lines] == ["Compiler busy"] * 2
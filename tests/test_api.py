@@ -1,9 +1,12 @@
 """API test suite for typst-api."""
 
+import base64
 import io
 import json
 import zipfile
 
+import pytest
+
 
 # ---------------------------------------------------------------------------
 # GET /
@@ -22,7 +25,7 @@ class TestIndex:
 
 
 # ---------------------------------------------------------------------------
-# GET /health
+# GET /health, /livez, /readyz
 # ---------------------------------------------------------------------------
 
 
@@ -34,6 +37,111 @@ class TestHealth:
         assert data["status"] == "healthy"
         assert data["compiler"] == "typst-py"
 
+    def test_livez_never_compiles(self, client):
+        from typst_api.services.health import health_service
+
+        resp = client.get("/livez")
+        assert resp.status_code == 200
+        assert resp.get_json()["status"] == "alive"
+        assert health_service.probes == 0
+
+    def test_readyz_uses_cached_probe(self, client):
+        from typst_api.services.health import health_service
+
+        for _ in range(3):
+            resp = client.get("/readyz")
+            assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["status"] == "ready"
+        assert data["probe"]["ok"] is True
+        assert health_service.probes == 1
+
+    def test_readyz_reflects_saturation(self, client):
+        from typst_api.services.admission import admission_service
+
+        controller = admission_service.controller
+        controller.in_flight = controller.waiting = controller.max_in_flight
+        try:
+            resp = client.get("/readyz")
+        finally:
+            controller.in_flight = controller.waiting = 0
+        assert resp.status_code == 503
+        data = resp.get_json()
+        assert data["saturation"] == 2.0
+        assert data["reasons"] == ["compile slots are saturated"]
+        # Saturation alone does not make the node unhealthy
+        assert client.get("/health").status_code == 200
+
+    def test_not_ready_while_warming_up(self, client, monkeypatch):
+        import threading
+
+        from typst_api.services.compiler import compiler_service
+        from typst_api.services.health import health_service
+
+        release = threading.Event()
+        monkeypatch.setattr(compiler_service, "warm", lambda: release.wait(5))
+        health_service.start()
+        resp = client.get("/readyz")
+        assert resp.status_code == 503
+        assert resp.get_json()["reasons"] == ["warming up"]
+        assert client.get("/livez").status_code == 200
+
+        release.set()
+        assert health_service._first_result.wait(5)
+        assert client.get("/readyz").status_code == 200
+        assert health_service.warmup_seconds is not None
+
+    def test_failed_probe(self, client, monkeypatch):
+        from typst_api.services.compiler import compiler_service
+        from typst_api.services.health import health_service
+
+        def broken(timeout):
+            raise RuntimeError("no fonts")
+
+        monkeypatch.setattr(compiler_service, "probe", broken)
+        health_service.probe()
+        resp = client.get("/readyz")
+        assert resp.status_code == 503
+        assert "no fonts" in resp.get_json()["reasons"][0]
+        assert client.get("/health").get_json()["status"] == "unhealthy"
+
+    def test_probe_does_not_wait_for_the_pool(self, client):
+        import threading
+
+        from typst_api.services.compiler import compiler_service
+        from typst_api.services.health import health_service
+
+        pool = compiler_service.compiler_pool
+        held = [pool._acquire() for _ in range(pool.size)]
+        try:
+            probe = threading.Thread(target=health_service.probe, daemon=True)
+            probe.start()
+            probe.join(10)
+            assert not probe.is_alive()
+            assert health_service._result.ok
+        finally:
+            for pooled in held:
+                pool._release(pooled)
+
+    def test_probe_on_saturated_process_backend_is_busy(self, app, client):
+        from typst_api.services.compiler import compiler_service
+        from typst_api.services.health import health_service
+
+        app.config.update(COMPILE_BACKEND="process", COMPILE_WORKERS=1)
+        compiler_service.init_app(app)
+        backend = compiler_service.backend
+        try:
+            worker = backend._acquire()
+            health_service.timeout = 0.2
+            result = health_service.probe()
+            assert result.busy and not result.ok
+            assert client.get("/readyz").get_json()["reasons"] == [
+                "compile backend is busy"
+            ]
+            backend._put_idle(worker)
+        finally:
+            backend.shutdown()
+
 
 # ---------------------------------------------------------------------------
 # GET /fonts
@@ -43,8 +151,13 @@ class TestHealth:
 class TestFonts:
     def test_fonts_endpoint(self, client):
         resp = client.get("/fonts")
-        # Typst CLI may not be installed in test env
-        assert resp.status_code in (200, 503)
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["count"] == len(data["fonts"]) == len(data["families"])
+        # typst's embedded fonts are always available
+        assert "Libertinus Serif" in data["fonts"]
+        variant = data["families"][0]["variants"][0]
+        assert {"style", "weight", "stretch", "embedded"} <= set(variant)
 
 
 # ---------------------------------------------------------------------------
@@ -187,6 +300,43 @@ class TestRender:
         assert resp.status_code == 200
         assert resp.data[:5] == b"%PDF-"
 
+    def test_zip_too_many_entries(self, app, client):
+        app.config["ZIP_MAX_ENTRIES"] = 1
+        from typst_api.services.compiler import compiler_service
+
+        compiler_service.init_app(app)
+        resp = client.post(
+            "/render",
+            data={"file": (self._zip(2), "test.zip")},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 413
+
+    def test_zip_nested_import(self, client):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", '#import "lib/util.typ": x\n#x')
+            zf.writestr("lib/util.typ", '#import "../data.typ": y\n#let x = y')
+            zf.writestr("data.typ", "#let y = [nested]")
+        buf.seek(0)
+        resp = client.post(
+            "/render",
+            data={"file": (buf, "test.zip")},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        assert resp.data[:5] == b"%PDF-"
+
+    @staticmethod
+    def _zip(count):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", "hello")
+            for i in range(1, count):
+                zf.writestr(f"extra{i}.typ", "extra")
+        buf.seek(0)
+        return buf
+
     def test_render_with_sys_inputs(self, client):
         buf = io.BytesIO()
         with zipfile.ZipFile(buf, "w") as zf:
@@ -220,6 +370,12 @@ class TestRenderRaw:
         assert resp.status_code == 400
         assert resp.get_json()["error"] == "No source provided"
 
+    @pytest.mark.parametrize("source", [123, ["Hello"], {"text": "Hello"}])
+    def test_non_string_source(self, client, source):
+        resp = client.post("/render/raw", json={"source": source})
+        assert resp.status_code == 400
+        assert resp.get_json() == {"error": "source must be a string", "field": "source"}
+
     def test_raw_pdf_json(self, client):
         resp = client.post(
             "/render/raw",
@@ -311,3 +467,414 @@ class TestRenderRaw:
         data = resp.get_json()
         assert "error" in data
         assert "details" in data
+
+
+# ---------------------------------------------------------------------------
+# Render cache
+# ---------------------------------------------------------------------------
+
+
+class TestRenderCache:
+    def test_raw_repeat_is_cache_hit(self, client):
+        body = json.dumps({"source": "Cached", "sys_inputs": {"a": "1"}})
+        first = client.post("/render/raw", data=body, content_type="application/json")
+        second = client.post("/render/raw", data=body, content_type="application/json")
+        assert first.headers["X-Render-Cache"] == "miss"
+        assert second.headers["X-Render-Cache"] == "hit"
+        assert first.data == second.data
+
+    def test_zip_repeat_is_cache_hit(self, client):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", "Cached zip")
+        payload = buf.getvalue()
+
+        def upload():
+            return client.post(
+                "/render",
+                data={"file": (io.BytesIO(payload), "test.zip"), "format": "svg"},
+                content_type="multipart/form-data",
+            )
+
+        assert upload().headers["X-Render-Cache"] == "miss"
+        assert upload().headers["X-Render-Cache"] == "hit"
+
+    def test_different_format_is_miss(self, client):
+        client.post(
+            "/render/raw",
+            data=json.dumps({"source": "Fmt"}),
+            content_type="application/json",
+        )
+        resp = client.post(
+            "/render/raw",
+            data=json.dumps({"source": "Fmt", "format": "svg"}),
+            content_type="application/json",
+        )
+        assert resp.headers["X-Render-Cache"] == "miss"
+
+
+# ---------------------------------------------------------------------------
+# Multi-page output
+# ---------------------------------------------------------------------------
+
+THREE_PAGES = "#set page(width: 5cm, height: 5cm)\nOne\n#pagebreak()\nTwo\n#pagebreak()\nThree"
+
+
+class TestMultiPage:
+    def test_default_returns_first_page(self, client):
+        resp = client.post("/render/raw", json={"source": THREE_PAGES, "format": "svg"})
+        assert resp.status_code == 200
+        assert "image/svg+xml" in resp.content_type
+        assert resp.headers["X-Page-Count"] == "3"
+
+    def test_all_pages_as_zip(self, client):
+        resp = client.post(
+            "/render/raw",
+            json={"source": THREE_PAGES, "format": "png", "ppi": 36, "pages": "all"},
+        )
+        assert resp.status_code == 200
+        assert resp.content_type == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+            assert zf.namelist() == ["page-1.png", "page-2.png", "page-3.png"]
+            assert zf.read("page-2.png")[:4] == b"\x89PNG"
+
+    def test_page_range_from_zip_upload(self, client):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", THREE_PAGES)
+        buf.seek(0)
+        resp = client.post(
+            "/render",
+            data={"file": (buf, "test.zip"), "format": "svg", "pages": "2-3"},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+            assert zf.namelist() == ["page-2.svg", "page-3.svg"]
+
+    def test_single_selected_page(self, client):
+        first = client.post("/render/raw", json={"source": THREE_PAGES, "format": "svg"})
+        third = client.post(
+            "/render/raw", json={"source": THREE_PAGES, "format": "svg", "pages": "3"}
+        )
+        assert "image/svg+xml" in third.content_type
+        assert third.data != first.data
+
+    def test_multipart_archive(self, client):
+        resp = client.post(
+            "/render/raw",
+            json={
+                "source": THREE_PAGES,
+                "format": "svg",
+                "pages": "1,3",
+                "archive": "multipart",
+            },
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "multipart/mixed"
+        boundary = resp.mimetype_params["boundary"]
+        assert resp.data.count(f"--{boundary}\r\n".encode()) == 2
+        assert resp.data.endswith(f"--{boundary}--\r\n".encode())
+
+    def test_out_of_range(self, client):
+        resp = client.post(
+            "/render/raw", json={"source": THREE_PAGES, "format": "svg", "pages": "9"}
+        )
+        assert resp.status_code == 400
+        assert resp.get_json()["page_count"] == 3
+
+    def test_pages_rejected_for_pdf(self, client):
+        resp = client.post("/render/raw", json={"source": THREE_PAGES, "pages": "1"})
+        assert resp.status_code == 400
+
+    @pytest.mark.parametrize("archive", ["tar", 1])
+    def test_invalid_archive(self, client, archive):
+        resp = client.post(
+            "/render/raw",
+            json={"source": THREE_PAGES, "format": "svg", "pages": "all", "archive": archive},
+        )
+        assert resp.status_code == 400
+        assert "Unsupported archive" in resp.get_json()["error"]
+
+
+# ---------------------------------------------------------------------------
+# Several outputs from one layout
+# ---------------------------------------------------------------------------
+
+
+class TestOutputs:
+    def test_formats_and_resolutions_in_one_request(self, client):
+        from typst_api.services.metrics import metrics
+
+        def backend_jobs():
+            return metrics.stage_seconds.count(route="/render/raw", stage="compile", format="multi")
+
+        jobs = backend_jobs()
+        resp = client.post(
+            "/render/raw",
+            json={"source": THREE_PAGES, "outputs": "pdf,svg,png@36,png@72"},
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+            assert zf.namelist() == [
+                "output.pdf",
+                "output.svg",
+                "output-36ppi.png",
+                "output-72ppi.png",
+            ]
+            assert zf.read("output.pdf")[:5] == b"%PDF-"
+        # One backend job for all four exports
+        assert backend_jobs() == jobs + 1
+
+    def test_exports_are_cached_individually(self, client):
+        client.post("/render/raw", json={"source": THREE_PAGES, "outputs": "svg,png@36"})
+        resp = client.post("/render/raw", json={"source": THREE_PAGES, "format": "svg"})
+        assert resp.headers["X-Render-Cache"] == "hit"
+        resp = client.post(
+            "/render/raw", json={"source": THREE_PAGES, "outputs": ["png@36", "svg"]}
+        )
+        assert resp.headers["X-Render-Cache"] == "hit"
+
+    def test_page_selection_applies_to_images(self, client):
+        resp = client.post(
+            "/render/raw",
+            json={"source": THREE_PAGES, "outputs": "pdf,svg", "pages": "2-3"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["X-Page-Count"] == "3"
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+            assert zf.namelist() == ["output.pdf", "output-page-2.svg", "output-page-3.svg"]
+
+    def test_invalid_outputs(self, client):
+        for outputs in ("pdf,docx", "svg@72", "png@x"):
+            resp = client.post("/render/raw", json={"source": "Hi", "outputs": outputs})
+            assert resp.status_code == 400
+
+    def test_too_many_outputs(self, client):
+        outputs = ",".join(f"png@{ppi}" for ppi in range(10, 200, 10))
+        resp = client.post("/render/raw", json={"source": "Hi", "outputs": outputs})
+        assert resp.status_code == 400
+        assert "Too many outputs" in resp.get_json()["error"]
+
+
+# ---------------------------------------------------------------------------
+# POST /render/batch
+# ---------------------------------------------------------------------------
+
+MERGE_SOURCE = '#let name = sys.inputs.at("name")\nDear #name'
+
+
+class TestRenderBatch:
+    def test_json_source_to_zip(self, client):
+        resp = client.post(
+            "/render/batch",
+            json={
+                "source": MERGE_SOURCE,
+                "records": [{"name": "Ann"}, {"name": "Bob"}, {"name": "Cy"}],
+                "format": "svg",
+            },
+        )
+        assert resp.status_code == 200
+        assert resp.content_type == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+            assert zf.namelist() == ["1.svg", "2.svg", "3.svg", "manifest.json"]
+            assert zf.read("1.svg") != zf.read("2.svg")
+            manifest = json.loads(zf.read("manifest.json"))
+        assert [m["status"] for m in manifest] == ["ok", "ok", "ok"]
+
+    def test_zip_project_with_ndjson_records_file(self, client):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", '#import "lib.typ": greet\n#greet(sys.inputs.name)')
+            zf.writestr("lib.typ", "#let greet(name) = [Hello, #name!]")
+        buf.seek(0)
+        records = io.BytesIO(b'{"name": "Ann"}\n{"name": "Bob"}\n')
+        resp = client.post(
+            "/render/batch",
+            data={
+                "file": (buf, "project.zip"),
+                "records": (records, "records.ndjson"),
+                "output": "ndjson",
+            },
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "application/x-ndjson"
+        lines = [json.loads(line) for line in resp.data.splitlines()]
+        assert [line["index"] for line in lines] == [0, 1]
+        assert all(line["status"] == "ok" for line in lines)
+        assert base64.b64decode(lines[0]["data"])[:5] == b"%PDF-"
+
+    def test_per_item_errors(self, client):
+        resp = client.post(
+            "/render/batch",
+            json={
+                "source": MERGE_SOURCE,
+                "records": [{"name": "Ann"}, {"other": "x"}],
+                "output": "ndjson",
+            },
+        )
+        assert resp.status_code == 200
+        lines = [json.loads(line) for line in resp.data.splitlines()]
+        assert lines[0]["status"] == "ok"
+        assert lines[1]["status"] == "error"
+        assert lines[1]["error"] == "Typst compilation failed"
+
+    def test_missing_records(self, client):
+        resp = client.post("/render/batch", json={"source": MERGE_SOURCE})
+        assert resp.status_code == 400
+        assert resp.get_json()["field"] == "records"
+
+    def test_missing_project(self, client):
+        resp = client.post("/render/batch", json={"records": [{"a": "1"}]})
+        assert resp.status_code == 400
+
+    @pytest.mark.parametrize("field", [{"output": 2}, {"format": 2}, {"format": ["pdf"]}])
+    def test_non_string_options(self, client, field):
+        body = {"source": MERGE_SOURCE, "records": [{"name": "A"}], **field}
+        resp = client.post("/render/batch", json=body)
+        assert resp.status_code == 400
+        assert "Unsupported" in resp.get_json()["error"]
+
+    def test_non_string_source(self, client):
+        resp = client.post("/render/batch", json={"source": 123, "records": [{"a": "1"}]})
+        assert resp.status_code == 400
+        assert resp.get_json()["field"] == "source"
+
+    def test_too_many_records(self, app, client):
+        app.config["BATCH_MAX_RECORDS"] = 2
+        resp = client.post(
+            "/render/batch",
+            json={"source": MERGE_SOURCE, "records": [{"name": str(i)} for i in range(3)]},
+        )
+        assert resp.status_code == 413
+
+    def test_invalid_output(self, client):
+        resp = client.post(
+            "/render/batch",
+            json={"source": MERGE_SOURCE, "records": [{"name": "a"}], "output": "tar"},
+        )
+        assert resp.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# GET /metrics and Server-Timing
+# ---------------------------------------------------------------------------
+
+
+class TestMetrics:
+    def test_metrics_exposition(self, client):
+        client.post("/render/raw", json={"source": "= Metrics"})
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+        text = resp.get_data(as_text=True)
+        assert 'stage="compile",format="pdf"' in text
+        assert "typst_api_render_cache_lookups_total" in text
+        assert "typst_api_compiles_in_flight" in text
+        assert 'typst_api_jobs{status="queued"}' in text
+        assert "typst_api_process_rss_bytes" in text
+
+    def test_compile_errors_counted(self, client):
+        from typst_api.services.metrics import metrics
+
+        before = metrics.compile_errors.value(format="pdf", reason="compile")
+        client.post("/render/raw", json={"source": "#let x = "})
+        after = metrics.compile_errors.value(format="pdf", reason="compile")
+        assert after == before + 1
+
+    def test_server_timing_header(self, client):
+        resp = client.post("/render/raw", json={"source": "= Timing"})
+        timing = resp.headers["Server-Timing"]
+        assert "compile;dur=" in timing
+        assert "total;dur=" in timing
+
+    def test_server_timing_zip_stages(self, client, multi_file_zip):
+        resp = client.post(
+            "/render",
+            data={"file": (multi_file_zip, "project.zip")},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        timing = resp.headers["Server-Timing"]
+        for stage in ("upload", "extract", "materialize", "compile", "encode"):
+            assert f"{stage};dur=" in timing
+
+    def test_server_timing_disabled(self, app, client):
+        from typst_api.services.metrics import metrics
+
+        metrics.server_timing = False
+        resp = client.post("/render/raw", json={"source": "= Timing"})
+        assert "Server-Timing" not in resp.headers
+
+    def test_metrics_disabled(self, app, client):
+        app.config["METRICS_ENABLED"] = False
+        assert client.get("/metrics").status_code == 404
+
+
+# ---------------------------------------------------------------------------
+# Raw request bodies, Range and conditional responses
+# ---------------------------------------------------------------------------
+
+
+class TestStreaming:
+    def test_raw_text_body(self, client):
+        resp = client.post(
+            "/render/raw?format=svg",
+            data="= Raw body".encode(),
+            content_type="text/plain; charset=utf-8",
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "image/svg+xml"
+
+    def test_raw_text_body_empty(self, client):
+        resp = client.post("/render/raw", data=b"", content_type="text/plain")
+        assert resp.status_code == 400
+
+    def test_raw_zip_body(self, client, sample_zip_custom_entry):
+        resp = client.post(
+            "/render?entrypoint=report.typ&format=png",
+            data=sample_zip_custom_entry.read(),
+            content_type="application/zip",
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "image/png"
+
+    def test_chunked_zip_body(self, client, multi_file_zip):
+        resp = client.post(
+            "/render",
+            input_stream=multi_file_zip,
+            content_type="application/zip",
+            headers={"Transfer-Encoding": "chunked"},
+            environ_overrides={"wsgi.input_terminated": True},
+        )
+        assert resp.status_code == 200
+        assert resp.data[:5] == b"%PDF-"
+
+    def test_invalid_raw_zip_body(self, client):
+        resp = client.post("/render", data=b"not a zip", content_type="application/zip")
+        assert resp.status_code == 400
+
+    def test_content_length(self, client):
+        resp = client.post("/render/raw", json={"source": "= Length"})
+        assert int(resp.headers["Content-Length"]) == len(resp.data)
+        assert resp.headers["ETag"]
+
+    def test_range_and_etag_on_job_result(self, client):
+        from tests.test_jobs import wait_for
+
+        job_id = client.post("/jobs", json={"source": "= Range"}).get_json()["id"]
+        wait_for(client, job_id)
+        url = f"/jobs/{job_id}/result"
+        full = client.get(url)
+        assert full.headers["Accept-Ranges"] == "bytes"
+
+        partial = client.get(url, headers={"Range": "bytes=0-99"})
+        assert partial.status_code == 206
+        assert partial.data == full.data[:100]
+        assert partial.headers["Content-Range"] == f"bytes 0-99/{len(full.data)}"
+
+        cached = client.get(url, headers={"If-None-Match": full.headers["ETag"]})
+        assert cached.status_code == 304
+        assert cached.data == b""
@@ -0,0 +1,131 @@
+"""Tests for the ASGI front end."""
+
+import asyncio
+import json
+
+import pytest
+
+from typst_api import create_async_app
+from typst_api.asgi import build_environ
+from typst_api.utils.streams import disconnect_checker
+
+SOURCE = b"#set page(width: 10cm, height: 5cm)\nHello"
+
+
+@pytest.fixture
+def asgi_app():
+    app = create_async_app("testing")
+    yield app
+    app.close()
+
+
+def call(app, method, path, body_chunks=(b"",), headers=(), query=b"", disconnect=None):
+    """Run one HTTP request through the ASGI app; return (status, headers, body)."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 5000),
+    }
+    chunks = list(body_chunks)
+    sent = []
+
+    async def run():
+        hang_up = disconnect or asyncio.Event()
+
+        async def receive():
+            if chunks:
+                chunk = chunks.pop(0)
+                return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+            await hang_up.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+
+    asyncio.run(run())
+    start = sent[0]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict((k.decode(), v.decode()) for k, v in start["headers"]), body
+
+
+class TestAsyncApp:
+    def test_health(self, asgi_app):
+        status, _, body = call(asgi_app, "GET", "/health")
+        assert status == 200
+        assert json.loads(body)["status"] == "healthy"
+
+    def test_chunked_upload_compiles(self, asgi_app):
+        status, headers, body = call(
+            asgi_app,
+            "POST",
+            "/render/raw",
+            body_chunks=[SOURCE[:10], SOURCE[10:]],
+            headers=[("content-type", "text/plain"), ("transfer-encoding", "chunked")],
+            query=b"format=pdf",
+        )
+        assert status == 200
+        assert headers["content-type"] == "application/pdf"
+        assert body.startswith(b"%PDF")
+
+    def test_body_over_limit_is_rejected_before_dispatch(self, asgi_app):
+        asgi_app.app.config["MAX_CONTENT_LENGTH"] = 8
+        status, _, body = call(asgi_app, "POST", "/render/raw", body_chunks=[SOURCE])
+        assert status == 413
+        assert "error" in json.loads(body)
+
+    def test_lifespan_shuts_down_executor(self, asgi_app):
+        asgi_app.executor
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(asgi_app({"type": "lifespan"}, receive, send))
+        assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        assert asgi_app._executor is None
+
+
+class TestBuildEnviron:
+    def test_headers_and_paths(self):
+        import io
+
+        scope = {
+            "method": "POST",
+            "path": "/api/render/raw",
+            "root_path": "/api",
+            "query_string": b"format=png",
+            "headers": [
+                (b"content-type", b"text/plain"),
+                (b"x-tag", b"a"),
+                (b"x-tag", b"b"),
+                (b"content-length", b"999"),
+            ],
+        }
+        environ = build_environ(scope, io.BytesIO(b"abc"))
+        assert environ["SCRIPT_NAME"] == "/api"
+        assert environ["PATH_INFO"] == "/render/raw"
+        assert environ["QUERY_STRING"] == "format=png"
+        assert environ["CONTENT_TYPE"] == "text/plain"
+        assert environ["CONTENT_LENGTH"] == "3"
+        assert environ["HTTP_X_TAG"] == "a,b"
+
+    def test_disconnect_flag(self):
+        flag = []
+        environ = {"typst_api.disconnected": lambda: bool(flag)}
+        disconnected = disconnect_checker(environ)
+        assert not disconnected()
+        flag.append(True)
+        assert disconnected()
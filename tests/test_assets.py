@@ -0,0 +1,274 @@
+"""Tests for the content-addressed asset store."""
+
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+
+import pytest
+
+from typst_api.services.assets import AssetError, AssetRefs, AssetStore, parse_asset_refs
+from typst_api.services.project import ProjectFiles
+
+LIB = b"#let greet(name) = [Hello, #name!]"
+MAIN = b'#set page(width: 10cm, height: 5cm)\n#import "lib.typ": greet\n#greet("World")'
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _blake2b(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+class TestParseAssetRefs:
+    def test_nothing_referenced(self):
+        assert parse_asset_refs(None, None) == (None, None)
+
+    def test_assets_as_json_string(self):
+        refs, err = parse_asset_refs(None, json.dumps({"./lib.typ": _sha(LIB)}))
+        assert err is None
+        assert refs.assets == {"lib.typ": _sha(LIB)}
+
+    def test_invalid_hash(self):
+        _, err = parse_asset_refs("abc", None)
+        assert "sha256" in err
+
+    def test_path_traversal(self):
+        _, err = parse_asset_refs(None, {"../x.typ": _sha(LIB)})
+        assert "Invalid asset path" in err
+
+
+class TestAssetStore:
+    def test_put_is_idempotent(self, tmp_path):
+        store = AssetStore(str(tmp_path))
+        assert store.put(LIB) == (_sha(LIB), True)
+        assert store.put(LIB) == (_sha(LIB), False)
+        assert store.get(_sha(LIB)) == LIB
+
+    def test_resolve_project_with_overrides(self, tmp_path):
+        store = AssetStore(str(tmp_path))
+        digest, files = store.put_project(ProjectFiles({"main.typ": MAIN, "lib.typ": LIB}))
+        assert files == {"lib.typ": _sha(LIB), "main.typ": _sha(MAIN)}
+        other, _ = store.put(b"#let greet(name) = [Hi, #name!]")
+        project = store.resolve(AssetRefs(project=digest, assets={"lib.typ": other}))
+        assert project.files["lib.typ"].startswith(b"#let greet(name) = [Hi")
+        assert project.files["main.typ"] == MAIN
+
+    def test_resolve_reports_every_missing_hash(self, tmp_path):
+        store = AssetStore(str(tmp_path))
+        missing = ["a" * 64, "b" * 64]
+        with pytest.raises(AssetError) as exc:
+            store.resolve(AssetRefs(assets={"x.typ": missing[0], "y.typ": missing[1]}))
+        assert exc.value.status_code == 404
+        assert exc.value.missing == missing
+
+    def test_plain_asset_is_not_a_project(self, tmp_path):
+        store = AssetStore(str(tmp_path))
+        digest, _ = store.put(LIB)
+        with pytest.raises(AssetError, match="Not a stored project"):
+            store.resolve(AssetRefs(project=digest))
+
+    def test_lru_eviction(self, tmp_path):
+        store = AssetStore(str(tmp_path), max_bytes=250)
+        first, _ = store.put(b"a" * 100)
+        second, _ = store.put(b"b" * 100)
+        os.utime(store._path(first), (1, 1))
+        os.utime(store._path(second), (2, 2))
+        third, _ = store.put(b"c" * 100)
+        assert not store.has(first)
+        assert store.has(second) and store.has(third)
+        assert store.evictions == 1
+
+    def test_stored_project_is_never_partly_evicted(self, tmp_path):
+        store = AssetStore(str(tmp_path), max_bytes=250)
+        other, _ = store.put(b"x" * 50)
+        # Recently read, so the project's own files are older
+        os.utime(store._path(other), (time.time() + 60,) * 2)
+        digest, _ = store.put_project(ProjectFiles({"a.typ": b"a" * 100, "b.typ": b"b" * 100}))
+        assert not store.has(other)
+        assert set(store.resolve(AssetRefs(project=digest)).files) == {"a.typ", "b.typ"}
+
+    def test_not_rescanned_on_every_put_at_budget(self, tmp_path, monkeypatch):
+        store = AssetStore(str(tmp_path), max_bytes=1000)
+        scans = []
+        scan = store._scan
+        monkeypatch.setattr(store, "_scan", lambda: scans.append(1) or scan())
+        for i in range(200):
+            store.put(b"%010d" % i)
+        assert store.evictions > 0
+        assert len(scans) < 20
+
+
+class TestAssetRoutes:
+    def test_put_and_get(self, client, store):
+        response = client.put("/assets", data=LIB)
+        assert response.status_code == 201
+        assert response.get_json() == {"hash": _sha(LIB), "size": len(LIB)}
+        assert client.put("/assets", data=LIB).status_code == 200
+
+        response = client.get(f"/assets/{_sha(LIB)}")
+        assert response.status_code == 200
+        assert response.data == LIB
+        assert client.head(f"/assets/{'0' * 64}").status_code == 404
+
+    def test_put_at_hash_verifies_body(self, client, store):
+        assert client.put(f"/assets/{_sha(LIB)}", data=LIB).status_code == 201
+        response = client.put(f"/assets/{'0' * 64}", data=LIB)
+        assert response.status_code == 400
+        assert response.get_json()["hash"] == _sha(LIB)
+
+    def test_put_project_raw_zip(self, client, store):
+        response = client.put(
+            "/projects",
+            data=_zip({"main.typ": MAIN, "lib.typ": LIB}).read(),
+            content_type="application/zip",
+        )
+        assert response.status_code == 201
+        assert response.get_json()["files"]["lib.typ"] == _sha(LIB)
+
+
+class TestRenderWithAssets:
+    def test_render_stored_project_without_upload(self, client, store):
+        digest, _ = store.put_project(ProjectFiles({"main.typ": MAIN, "lib.typ": LIB}))
+        response = client.post("/render", data={"project": digest})
+        assert response.status_code == 200
+        assert response.data[:4] == b"%PDF"
+
+    def test_delta_zip_over_stored_project(self, client, store):
+        digest, _ = store.put_project(ProjectFiles({"main.typ": MAIN, "lib.typ": LIB}))
+        response = client.post(
+            "/render",
+            data={
+                "project": digest,
+                "file": (_zip({"main.typ": b'#import "lib.typ": greet\n#greet("Delta")'}),
+                         "delta.zip"),
+            },
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+
+    def test_raw_source_with_assets(self, client, store):
+        digest, _ = store.put(LIB)
+        response = client.post(
+            "/render/raw",
+            json={
+                "source": MAIN.decode(),
+                "format": "svg",
+                "assets": {"lib.typ": digest},
+            },
+        )
+        assert response.status_code == 200
+        assert b"<svg" in response.data
+
+    def test_missing_assets_listed(self, client, store):
+        response = client.post("/render/raw", json={"source": "x", "project": "f" * 64})
+        assert response.status_code == 404
+        assert response.get_json()["missing"] == ["f" * 64]
+
+    def test_invalid_reference(self, client, store):
+        response = client.post("/render", data={"project": "nope"})
+        assert response.status_code == 400
+
+    def test_job_with_assets(self, client, store):
+        digest, _ = store.put_project(ProjectFiles({"main.typ": MAIN, "lib.typ": LIB}))
+        response = client.post("/jobs", data={"project": digest})
+        assert response.status_code == 202
+
+
+class TestStoredRender:
+    def test_submissions_are_not_stored_by_default(self, client):
+        response = client.post("/render/raw", json={"source": "Hello"})
+        assert response.status_code == 200
+        assert "Content-Location" not in response.headers
+
+    def test_post_links_get_url(self, client, store):
+        response = client.post("/render/raw", json={"source": "Hello", "format": "svg"})
+        assert response.status_code == 200
+        location = response.headers["Content-Location"]
+        assert location == f"/render/{_sha(b'Hello')}?format=svg"
+
+        response = client.get(location)
+        assert response.status_code == 200
+        assert b"<svg" in response.data
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+    def test_if_none_match_skips_compile(self, client, store):
+        from typst_api.services.metrics import metrics
+
+        digest, _ = store.put_project(ProjectFiles({"main.typ": MAIN, "lib.typ": LIB}))
+        url = f"/render/{digest}?format=png&ppi=72"
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert not etag.startswith("W/")
+
+        compiles = metrics.compiles.value(format="png")
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert "Cache-Control" in response.headers
+        assert metrics.compiles.value(format="png") == compiles
+
+        # Different options, different representation
+        other = client.get(f"/render/{digest}?format=png&ppi=96")
+        assert other.headers["ETag"] != etag
+
+    def test_get_after_post_is_a_cache_hit(self, client, store):
+        for body in ({"source": "Hello"}, {"source": "Hello", "outputs": "pdf,svg"}):
+            response = client.post("/render/raw", json=body)
+            assert response.headers["X-Render-Cache"] == "miss"
+            response = client.get(response.headers["Content-Location"])
+            assert response.status_code == 200
+            assert response.headers["X-Render-Cache"] == "hit"
+
+    def test_etag_names_the_bytes_served(self, client, store):
+        from typst_api.services.cache import render_cache_key
+        from typst_api.services.compiler import CompileOptions, compiler_service
+
+        digest, _ = store.put(b"Hello")
+        url = f"/render/{digest}"
+        first = client.get(url)
+        assert first.headers["ETag"] == f'"{_blake2b(first.data)}"'
+
+        # A recompile embeds another compile time, so the bytes differ
+        recompiled = first.data.replace(b"Typst", b"typst")
+        project_digest = ProjectFiles({"main.typ": b"Hello"}).digest()
+        key = render_cache_key(project_digest, "main.typ", CompileOptions())
+        compiler_service.render_cache.put(key, [recompiled])
+        resumed = client.get(
+            url, headers={"Range": "bytes=100-", "If-Range": first.headers["ETag"]}
+        )
+        # The stale If-Range gets the whole new document, never a spliced one
+        assert resumed.status_code == 200
+        assert resumed.data == recompiled
+        assert resumed.headers["ETag"] == f'"{_blake2b(recompiled)}"'
+
+    def test_zip_upload_links_project(self, client, store):
+        response = client.post(
+            "/render",
+            data={"file": (_zip({"main.typ": MAIN, "lib.typ": LIB}), "p.zip")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert client.get(response.headers["Content-Location"]).data == response.data
+
+    def test_unknown_hash(self, client, store):
+        response = client.get(f"/render/{'e' * 64}")
+        assert response.status_code == 404
+        assert response.get_json()["missing"] == ["e" * 64]
+
+    def test_invalid_hash(self, client, store):
+        assert client.get("/render/nope").status_code == 400
@@ -0,0 +1,78 @@
+"""Smoke tests for the benchmark suite."""
+
+import json
+import os
+import zlib
+
+from benchmarks import runner, workloads
+
+
+class TestWorkloads:
+    def test_all_workloads_build(self):
+        built = workloads.load()
+        assert [w.name for w in built] == list(workloads.WORKLOADS)
+        for workload in built:
+            assert workload.entrypoint in workload.files
+
+    def test_noise_png_is_valid(self):
+        png = workloads.images(count=1, size=4).files["img/000.png"]
+        assert png.startswith(b"\x89PNG\r\n\x1a\n")
+        # IDAT payload inflates to height * (filter byte + width * 3)
+        idat = png.index(b"IDAT")
+        length = int.from_bytes(png[idat - 4:idat], "big")
+        assert len(zlib.decompress(png[idat + 4:idat + 4 + length])) == 4 * (1 + 4 * 3)
+
+
+class TestStats:
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+        assert runner.percentile(samples, 50) == 50
+        assert runner.percentile(samples, 95) == 95
+        assert runner.percentile(samples, 99) == 99
+        assert runner.percentile([], 50) == 0.0
+
+    def test_measure_counts_errors(self):
+        calls = iter([None, ValueError("boom"), None, None])
+
+        def call():
+            outcome = next(calls)
+            if outcome is not None:
+                raise outcome
+
+        stats = runner.measure(call, iterations=3, concurrency=1, warmup=1)
+        assert stats["errors"] == 1
+        assert stats["first_error"] == "boom"
+        assert stats["latency_ms"]["p50"] >= 0
+
+    def test_compare_flags_p95_regressions(self):
+        baseline = {
+            "results": [{"workload": "hello", "mode": "http", "latency_ms": {"p95": 10.0}}]
+        }
+        slow = [{"workload": "hello", "mode": "http", "latency_ms": {"p95": 13.0}}]
+        ok = [{"workload": "hello", "mode": "http", "latency_ms": {"p95": 11.0}}]
+        assert runner.compare(slow, baseline, 0.2)
+        assert not runner.compare(ok, baseline, 0.2)
+
+
+class TestRunner:
+    def test_service_and_http_calls(self, app):
+        workload = workloads.hello()
+        runner.service_call(workload)()
+        server, url = runner.start_local_server(app)
+        try:
+            runner.http_call(workload, url)()
+            runner.http_call(workloads.multi_file(chapters=2), url)()
+        finally:
+            server.shutdown()
+
+    def test_main_writes_json(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(os, "environ", dict(os.environ))
+        output = tmp_path / "results.json"
+        code = runner.main(
+            ["-w", "hello", "-n", "2", "-c", "1", "--warmup", "0", "-o", str(output)]
+        )
+        assert code == 0
+        report = json.loads(output.read_text())
+        assert {r["mode"] for r in report["results"]} == {"service", "http"}
+        assert report["results"][0]["peak_rss_bytes"] > 0
+        assert report["meta"]["overrides"] == {"RENDER_CACHE_MAX_BYTES": "0"}
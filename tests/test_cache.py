@@ -0,0 +1,88 @@
+"""Tests for the render output cache."""
+
+import os
+
+from typst_api.services.cache import RenderCache, render_cache_key
+from typst_api.services.compiler import CompileOptions
+
+
+class TestRenderCacheKey:
+    def test_sys_inputs_order_does_not_matter(self):
+        a = CompileOptions(sys_inputs={"a": "1", "b": "2"})
+        b = CompileOptions(sys_inputs={"b": "2", "a": "1"})
+        assert render_cache_key("x", None, a) == render_cache_key("x", None, b)
+
+    def test_ppi_ignored_for_pdf(self):
+        a = CompileOptions(output_format="pdf", ppi=72.0)
+        b = CompileOptions(output_format="pdf", ppi=300.0)
+        assert render_cache_key("x", None, a) == render_cache_key("x", None, b)
+
+    def test_ppi_matters_for_png(self):
+        a = CompileOptions(output_format="png", ppi=72.0)
+        b = CompileOptions(output_format="png", ppi=300.0)
+        assert render_cache_key("x", None, a) != render_cache_key("x", None, b)
+
+    def test_entrypoint_matters(self):
+        opts = CompileOptions()
+        assert render_cache_key("x", "a.typ", opts) != render_cache_key("x", "b.typ", opts)
+
+
+class TestRenderCache:
+    def test_disabled_cache_never_hits(self):
+        cache = RenderCache(max_bytes=0)
+        cache.put("k", [b"data"])
+        assert cache.get("k") is None
+
+    def test_hit_and_miss_counters(self):
+        cache = RenderCache(max_bytes=1024)
+        assert cache.get("k") is None
+        cache.put("k", [b"data"])
+        assert cache.get("k") == [b"data"]
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["bytes"] == 4
+
+    def test_lru_eviction(self):
+        cache = RenderCache(max_bytes=10)
+        cache.put("a", [b"aaaa"])
+        cache.put("b", [b"bbbb"])
+        cache.get("a")  # a is now most recently used
+        cache.put("c", [b"cccc"])
+        assert cache.get("b") is None
+        assert cache.get("a") == [b"aaaa"]
+        assert cache.stats()["evictions"] == 1
+
+    def test_oversized_entry_not_stored(self):
+        cache = RenderCache(max_bytes=4)
+        cache.put("k", [b"too large"])
+        assert cache.get("k") is None
+
+    def test_disk_tier_survives_memory_clear(self, tmp_path):
+        cache = RenderCache(max_bytes=1024, disk_dir=str(tmp_path))
+        cache.put("abcd", [b"page1", b"", b"page3"])
+        cache.clear()
+        assert cache.get("abcd") == [b"page1", b"", b"page3"]
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_disk_tier_shared_between_instances(self, tmp_path):
+        RenderCache(max_bytes=0, disk_dir=str(tmp_path)).put("abcd", [b"x"])
+        assert RenderCache(max_bytes=0, disk_dir=str(tmp_path)).get("abcd") == [b"x"]
+
+    def test_disk_eviction(self, tmp_path):
+        cache = RenderCache(max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=20)
+        cache.put("aa01", [b"x" * 10])
+        cache.put("aa02", [b"y" * 10])
+        assert cache.get("aa01") is None
+        assert cache.get("aa02") == [b"y" * 10]
+
+    def test_disk_tier_is_not_rescanned_on_every_put(self, tmp_path, monkeypatch):
+        cache = RenderCache(max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=1000)
+        walks = []
+        real_walk = os.walk
+        monkeypatch.setattr(os, "walk", lambda path: walks.append(path) or real_walk(path))
+        for i in range(20):
+            cache.put(f"k{i:03d}", [b"x" * 92])
+        # One recount at start, then one per eviction down to the low-water mark
+        assert len(walks) < 10
+        assert sum(len(files) for _, _, files in real_walk(tmp_path)) <= 10
@@ -0,0 +1,207 @@
+"""Tests for compile execution backends."""
+
+import time
+
+import pytest
+
+from typst_api.services.executor import (
+    BackendBusyError,
+    CompileCancelledError,
+    CompileError,
+    CompileLimits,
+    CompileMemoryError,
+    CompileTimeoutError,
+    InlineBackend,
+    ProcessBackend,
+)
+from typst_api.services.pool import CompilerPool
+
+
+# Takes tens of seconds; only ever run under a limit that kills it
+SLOW = b"#let x = 0\n#for i in range(50000000) { x += 1 }\n#x"
+
+
+@pytest.fixture
+def process_backend():
+    backend = ProcessBackend(workers=1, max_jobs=2)
+    yield backend
+    backend.shutdown()
+
+
+class TestInlineBackend:
+    def test_compile_returns_pages(self):
+        backend = InlineBackend(CompilerPool(size=1))
+        pages = backend.compile({"input": b"Hello", "format": "pdf"})
+        assert len(pages) == 1
+        assert pages[0][:5] == b"%PDF-"
+
+    def test_compile_error(self):
+        backend = InlineBackend(CompilerPool(size=1))
+        with pytest.raises(CompileError):
+            backend.compile({"input": b'#import "missing.typ"', "format": "pdf"})
+
+    def test_compile_exports(self):
+        backend = InlineBackend(CompilerPool(size=1))
+        results = backend.compile_exports(
+            {"input": b"Hello"}, [{"format": "pdf"}, {"format": "png", "ppi": 36}]
+        )
+        assert [r[0][:4] for r in results] == [b"%PDF", b"\x89PNG"]
+
+    def test_skips_compile_for_disconnected_client(self):
+        backend = InlineBackend(CompilerPool(size=1))
+        with pytest.raises(CompileCancelledError):
+            backend.compile({"input": SLOW}, cancelled=lambda: True)
+
+
+class TestProcessBackend:
+    def test_compile_in_worker(self, process_backend):
+        pages = process_backend.compile({"input": b"Hello", "format": "pdf"})
+        assert pages[0][:5] == b"%PDF-"
+        assert process_backend.stats()["workers"] == 1
+
+    def test_compile_error_keeps_worker(self, process_backend):
+        with pytest.raises(CompileError):
+            process_backend.compile({"input": b"#let", "format": "pdf"})
+        assert process_backend.compile({"input": b"ok", "format": "svg"})
+
+    def test_worker_recycled_after_max_jobs(self, process_backend):
+        first = process_backend._all[:] or None
+        for _ in range(3):
+            process_backend.compile({"input": b"Hello", "format": "svg"})
+        assert process_backend.stats()["recycled"] == 1
+        assert process_backend._all != first
+
+    @pytest.mark.parametrize(
+        "limits, cancelled, error",
+        [
+            (CompileLimits(timeout=0.5), None, CompileTimeoutError),
+            (CompileLimits(max_memory_bytes=1), None, CompileMemoryError),
+            (CompileLimits(), lambda: True, CompileCancelledError),
+        ],
+    )
+    def test_runaway_compile_is_killed(self, process_backend, limits, cancelled, error):
+        with pytest.raises(error):
+            process_backend.compile({"input": SLOW, "format": "pdf"}, limits, cancelled)
+        assert process_backend.stats()["killed"] == 1
+        # The killed worker was replaced
+        assert process_backend.compile({"input": b"ok", "format": "pdf"})
+
+    def test_exports_and_affinity(self):
+        backend = ProcessBackend(workers=2)
+        try:
+            # Two workers exist; repeat compiles of a document go to its worker
+            first = backend._acquire()
+            backend._put_idle(backend._acquire())
+            backend._put_idle(first)
+            results = backend.compile_exports(
+                {"input": b"Hello"}, [{"format": "svg"}, {"format": "pdf"}], affinity="doc"
+            )
+            assert results[0][0].startswith(b"<svg")
+            assert backend.compile({"input": b"Hello", "format": "pdf"}, affinity="doc")
+            assert backend.stats()["affinity_hits"] == 1
+        finally:
+            backend.shutdown()
+
+    def test_warm_spawns_every_worker(self):
+        backend = ProcessBackend(workers=2)
+        try:
+            backend.warm()
+            assert backend.stats()["workers"] == 2
+            assert len(backend._idle) == 2
+            assert backend.compile({"input": b"Hello", "format": "pdf"})
+            assert backend.stats()["workers"] == 2
+        finally:
+            backend.shutdown()
+
+    def test_failed_spawn_frees_its_slot(self, monkeypatch):
+        backend = ProcessBackend(workers=1)
+        try:
+            monkeypatch.setattr(backend._ctx, "Process", lambda **kwargs: 1 / 0)
+            with pytest.raises(ZeroDivisionError):
+                backend.compile({"input": b"Hello", "format": "pdf"})
+            assert backend._starting == 0
+            monkeypatch.undo()
+            assert backend.compile({"input": b"Hello", "format": "pdf"})
+        finally:
+            backend.shutdown()
+
+    def test_retired_worker_is_replaced_in_the_background(self, monkeypatch):
+        backend = ProcessBackend(workers=1)
+        try:
+            backend.compile({"input": b"Hello", "format": "pdf"})
+            worker = backend._acquire()
+            monkeypatch.setattr(backend._ctx, "Process", lambda **kwargs: 1 / 0)
+            backend._retire(worker, kill=True)
+            assert worker not in backend._all
+            deadline = time.monotonic() + 5
+            while backend._starting and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # The failed replacement left its slot free for the next acquire
+            assert backend._starting == 0 and backend._all == []
+            monkeypatch.undo()
+            assert backend.compile({"input": b"Hello", "format": "pdf"})
+        finally:
+            backend.shutdown()
+
+    def test_busy_when_no_worker_frees_in_time(self, process_backend):
+        worker = process_backend._acquire()
+        with pytest.raises(BackendBusyError):
+            process_backend.compile({"input": b"Hello"}, wait=0.1)
+        process_backend._put_idle(worker)
+        assert process_backend.compile({"input": b"Hello", "format": "pdf"}, wait=0.1)
+
+    def test_busy_when_max_pending_reached(self):
+        backend = ProcessBackend(workers=1, max_pending=1)
+        backend._pending = 1
+        with pytest.raises(BackendBusyError):
+            backend.compile({"input": b"Hello"})
+
+
+class TestServiceBackend:
+    def test_render_through_process_backend(self, app, client):
+        from typst_api.services.compiler import compiler_service
+
+        app.config.update(COMPILE_BACKEND="process", COMPILE_WORKERS=1)
+        compiler_service.init_app(app)
+        try:
+            resp = client.post("/render/raw", json={"source": "Hello"})
+            assert resp.status_code == 200
+            assert resp.data[:5] == b"%PDF-"
+            assert compiler_service.backend.name == "process"
+        finally:
+            compiler_service.backend.shutdown()
+
+    def test_route_timeout_reported(self, app, client):
+        from typst_api.services.compiler import compiler_service
+
+        app.config.update(
+            COMPILE_BACKEND="process",
+            COMPILE_WORKERS=1,
+            COMPILE_ROUTE_LIMITS={"/render/raw": {"timeout": 0.5}},
+        )
+        compiler_service.init_app(app)
+        try:
+            assert compiler_service.limits_for("/render").timeout == 60
+            resp = client.post("/render/raw", json={"source": SLOW.decode()})
+            assert resp.status_code == 504
+            assert resp.get_json()["code"] == "compile_timeout"
+        finally:
+            compiler_service.backend.shutdown()
+
+    def test_inline_backend_has_no_default_limits(self, app, caplog):
+        from typst_api.services.compiler import compiler_service
+
+        compiler_service.init_app(app)
+        assert compiler_service.limits_for("/render") == CompileLimits()
+        assert "only enforced" not in caplog.text
+
+        app.config["COMPILE_TIMEOUT"] = 30
+        compiler_service.init_app(app)
+        assert "only enforced" in caplog.text
+
+    def test_unknown_backend_rejected(self, app):
+        from typst_api.services.compiler import compiler_service
+
+        app.config["COMPILE_BACKEND"] = "gpu"
+        with pytest.raises(ValueError):
+            compiler_service.init_app(app)
@@ -0,0 +1,71 @@
+"""Tests for the font index."""
+
+import glob
+import os
+import shutil
+
+import pytest
+
+from typst_api.services.fonts import FontIndex, parse_font_paths
+from typst_api.services.pool import CompilerPool
+
+SYSTEM_FONTS = sorted(glob.glob("/usr/share/fonts/**/*.ttf", recursive=True))
+
+
+@pytest.fixture
+def font_dir(tmp_path):
+    if not SYSTEM_FONTS:
+        pytest.skip("no system .ttf font to copy")
+    directory = tmp_path / "fonts"
+    directory.mkdir()
+    shutil.copy(SYSTEM_FONTS[0], directory)
+    return str(directory)
+
+
+def _families(index):
+    return {f["family"] for f in index.families()}
+
+
+class TestFontIndex:
+    def test_embedded_fonts_only(self):
+        index = FontIndex(include_system_fonts=False)
+        families = index.families()
+        assert families
+        assert all(v["embedded"] for f in families for v in f["variants"])
+
+    def test_cache_file_reused(self, tmp_path):
+        cache = str(tmp_path / "index.json")
+        first = FontIndex(include_system_fonts=False, cache_file=cache)
+        first.load()
+        assert first.source == "scan"
+        second = FontIndex(include_system_fonts=False, cache_file=cache)
+        assert second.load() == first.load()
+        assert second.source == "cache"
+
+    def test_cache_invalidated_by_dir_mtime(self, tmp_path, font_dir):
+        cache = str(tmp_path / "index.json")
+        FontIndex([font_dir], include_system_fonts=False, cache_file=cache).load()
+        os.remove(os.path.join(font_dir, os.listdir(font_dir)[0]))
+        stat = os.stat(font_dir)
+        os.utime(font_dir, (stat.st_atime, stat.st_mtime + 10))
+
+        index = FontIndex([font_dir], include_system_fonts=False, cache_file=cache)
+        index.load()
+        assert index.source == "scan"
+
+    def test_extra_font_dir(self, font_dir):
+        base = _families(FontIndex(include_system_fonts=False))
+        extended = _families(FontIndex([font_dir], include_system_fonts=False))
+        assert extended > base
+
+    def test_compiles_use_extra_font_dir(self, font_dir):
+        index = FontIndex([font_dir], include_system_fonts=False)
+        family = (_families(index) - _families(FontIndex(include_system_fonts=False))).pop()
+        pool = CompilerPool(size=0, font_index=index)
+        source = f'#set text(font: "{family}", fallback: false)\nHello'.encode()
+        assert pool.compile(source, format="pdf")[:4] == b"%PDF"
+
+    def test_parse_font_paths(self):
+        assert parse_font_paths(None) == []
+        assert parse_font_paths(os.pathsep.join(["/a", "/b"])) == ["/a", "/b"]
+        assert parse_font_paths(["/a"]) == ["/a"]
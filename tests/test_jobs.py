@@ -0,0 +1,165 @@
+"""Tests for the asynchronous job API."""
+
+import io
+import time
+import zipfile
+
+import pytest
+
+from typst_api.services.compiler import CompileOptions
+from typst_api.services.jobs import (
+    CANCELLED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    InMemoryJobBackend,
+    JobSpec,
+    QueueFullError,
+    RedisJobBackend,
+)
+from typst_api.services.project import ProjectFiles
+
+
+def wait_for(client, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] not in (QUEUED, RUNNING):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def make_spec(source=b"Hello", **options):
+    return JobSpec(ProjectFiles({"main.typ": source}), "main.typ", CompileOptions(**options))
+
+
+class TestJobRoutes:
+    def test_raw_job_lifecycle(self, client):
+        resp = client.post("/jobs", json={"source": "Hello *job*"})
+        assert resp.status_code == 202
+        job = resp.get_json()
+        assert job["status"] == QUEUED
+        assert resp.headers["Location"] == f"/jobs/{job['id']}"
+
+        assert wait_for(client, job["id"])["status"] == SUCCEEDED
+        result = client.get(job["result_url"])
+        assert result.status_code == 200
+        assert result.data[:5] == b"%PDF-"
+
+    def test_zip_job(self, client):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("main.typ", '#import "lib.typ": x\n#x')
+            zf.writestr("lib.typ", "#let x = [lib]")
+        buf.seek(0)
+        resp = client.post(
+            "/jobs",
+            data={"file": (buf, "p.zip"), "format": "svg", "priority": "5"},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 202
+        assert resp.get_json()["priority"] == 5
+        job = wait_for(client, resp.get_json()["id"])
+        assert job["status"] == SUCCEEDED
+        result = client.get(f"/jobs/{job['id']}/result")
+        assert b"<svg" in result.data
+
+    def test_failed_job(self, client):
+        job_id = client.post("/jobs", json={"source": "#let"}).get_json()["id"]
+        assert wait_for(client, job_id)["status"] == "failed"
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.status_code == 500
+        assert result.get_json()["error"] == "Typst compilation failed"
+
+    def test_validation_errors_are_synchronous(self, client):
+        assert client.post("/jobs", json={}).status_code == 400
+        assert client.post("/jobs", json={"source": "x", "priority": "hi"}).status_code == 400
+
+    def test_unknown_job(self, client):
+        assert client.get("/jobs/nope").status_code == 404
+        assert client.get("/jobs/nope/result").status_code == 404
+        assert client.delete("/jobs/nope").status_code == 404
+
+    def test_queue_full(self, client, monkeypatch):
+        from typst_api.services.jobs import job_service
+
+        monkeypatch.setattr(job_service.backend, "submit", _raise_queue_full)
+        resp = client.post("/jobs", json={"source": "x"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+
+
+def _raise_queue_full(*args, **kwargs):
+    raise QueueFullError("Job queue is full")
+
+
+class TestInMemoryJobBackend:
+    def test_priority_order(self):
+        backend = InMemoryJobBackend()
+        low = backend.submit(make_spec(), priority=0)
+        high = backend.submit(make_spec(), priority=10)
+        assert backend.next_job(0)[0] == high["id"]
+        assert backend.next_job(0)[0] == low["id"]
+        assert backend.next_job(0) is None
+
+    def test_bounded_queue(self):
+        backend = InMemoryJobBackend(max_queued=1)
+        backend.submit(make_spec())
+        with pytest.raises(QueueFullError):
+            backend.submit(make_spec())
+
+    def test_cancel_queued(self):
+        backend = InMemoryJobBackend()
+        job = backend.submit(make_spec())
+        assert backend.cancel(job["id"])["status"] == CANCELLED
+        assert backend.next_job(0) is None
+
+    def test_result_ttl(self):
+        backend = InMemoryJobBackend(result_ttl=0.01)
+        job = backend.submit(make_spec())
+        backend.next_job(0)
+        backend.finish(job["id"], pages=[b"x"])
+        assert backend.result(job["id"]) == [b"x"]
+        time.sleep(0.02)
+        assert backend.get(job["id"]) is None
+
+    def test_max_results_evicts_oldest(self):
+        backend = InMemoryJobBackend(max_results=1)
+        ids = []
+        for _ in range(2):
+            ids.append(backend.submit(make_spec())["id"])
+            backend.next_job(0)
+            backend.finish(ids[-1], pages=[b"x"])
+        assert backend.get(ids[0]) is None
+        assert backend.get(ids[1])["status"] == SUCCEEDED
+
+
+class TestRedisJobBackend:
+    @pytest.fixture
+    def backend(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisJobBackend(fakeredis.FakeRedis(), max_queued=2, result_ttl=60)
+
+    def test_round_trip(self, backend):
+        job = backend.submit(make_spec(output_format="svg", pages=[(1, None)]))
+        job_id, spec = backend.next_job(1)
+        assert job_id == job["id"]
+        assert spec.project.files == {"main.typ": b"Hello"}
+        assert spec.options.pages == [(1, None)]
+        backend.finish(job_id, pages=[b"a", b"b"])
+        assert backend.get(job_id)["status"] == SUCCEEDED
+        assert backend.result(job_id) == [b"a", b"b"]
+
+    def test_priority_and_bound(self, backend):
+        backend.submit(make_spec(), priority=0)
+        high = backend.submit(make_spec(), priority=3)
+        with pytest.raises(QueueFullError):
+            backend.submit(make_spec())
+        assert backend.next_job(1)[0] == high["id"]
+
+    def test_cancel(self, backend):
+        job = backend.submit(make_spec())
+        assert backend.cancel(job["id"])["status"] == CANCELLED
+        assert backend.stats()[QUEUED] == 0
+        assert 0 < backend.client.ttl(backend._key(job["id"])) <= 60
@@ -0,0 +1,56 @@
+"""Tests for the metrics registry."""
+
+from typst_api.services.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class TestMetricTypes:
+    def test_counter_per_label_set(self):
+        counter = Counter("c_total", "help", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        counter.inc(kind="b")
+        assert counter.value(kind="a") == 3
+        assert 'c_total{kind="b"} 1' in counter.render()
+
+    def test_gauge_set_and_dec(self):
+        gauge = Gauge("g", "help")
+        gauge.set(5)
+        gauge.dec()
+        assert gauge.value() == 4
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram("h", "help", buckets=(0.1, 1.0))
+        hist.observe(0.05)
+        hist.observe(0.5)
+        hist.observe(5.0)
+        lines = hist.render()
+        assert 'h_bucket{le="0.1"} 1' in lines
+        assert 'h_bucket{le="1"} 2' in lines
+        assert 'h_bucket{le="+Inf"} 3' in lines
+        assert "h_count 3" in lines
+        assert hist.count() == 3
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("c_total", "help", ("path",))
+        counter.inc(path='a"b\\c')
+        assert 'c_total{path="a\\"b\\\\c"} 1' in counter.render()
+
+
+class TestMetricsRegistry:
+    def test_render_includes_collectors(self):
+        registry = MetricsRegistry(namespace="t")
+
+        @registry.collector
+        def collect():
+            yield "depth", "gauge", "Queue depth", [({"queue": "jobs"}, 7)]
+
+        text = registry.render()
+        assert "# TYPE t_depth gauge" in text
+        assert 't_depth{queue="jobs"} 7' in text
+        assert "# TYPE t_stage_seconds histogram" in text
+
+    def test_stage_outside_request(self):
+        registry = MetricsRegistry(namespace="t")
+        with registry.stage("compile", "pdf"):
+            pass
+        assert registry.stage_seconds.count(route="job", stage="compile", format="pdf") == 1
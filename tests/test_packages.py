@@ -0,0 +1,181 @@
+"""Tests for the offline Typst package cache."""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+from typst_api import main
+from typst_api.services.packages import (
+    PackageCache,
+    PackageError,
+    PackageSpec,
+    find_imports,
+    package_service,
+)
+
+IMPORT = (
+    b'#set page(width: 10cm, height: 5cm)\n#import "@preview/hello:0.1.0": greet\n'
+    b'#greet("World")'
+)
+
+
+def _tarball(name="hello", version="0.1.0", prefix="", extra=None):
+    files = {
+        "typst.toml": (
+            f'[package]\nname = "{name}"\nversion = "{version}"\nentrypoint = "lib.typ"\n'
+        ).encode(),
+        "lib.typ": b"#let greet(name) = [Hello, #name!]",
+        **(extra or {}),
+    }
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as archive:
+        for path, data in files.items():
+            info = tarfile.TarInfo(prefix + path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture
+def cache(app, tmp_path):
+    from typst_api.services.compiler import compiler_service
+
+    app.config["PACKAGE_DIR"] = str(tmp_path / "packages")
+    package_service.init_app(app)
+    compiler_service.init_app(app)
+    return package_service.cache
+
+
+class TestPackageSpec:
+    def test_parse(self):
+        assert PackageSpec.parse("@preview/cetz:0.3.2") == PackageSpec(
+            "preview", "cetz", "0.3.2"
+        )
+
+    @pytest.mark.parametrize("value", ["cetz", "@preview/cetz:latest", "@../x:1.0.0"])
+    def test_parse_invalid(self, value):
+        with pytest.raises(PackageError):
+            PackageSpec.parse(value)
+
+    def test_find_imports(self):
+        assert find_imports([IMPORT, b'#import "lib.typ"']) == {
+            PackageSpec("preview", "hello", "0.1.0")
+        }
+
+
+class TestPackageCache:
+    def test_install_and_missing(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        spec, installed = cache.install(_tarball())
+        assert (str(spec), installed) == ("@preview/hello:0.1.0", True)
+        assert cache.install(_tarball()) == (spec, False)
+        assert cache.missing([IMPORT]) == []
+        assert cache.missing([b'#import "@preview/other:1.0.0"']) == [
+            PackageSpec("preview", "other", "1.0.0")
+        ]
+
+    def test_strips_top_level_directory(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        spec, _ = cache.install(_tarball(prefix="hello-0.1.0/"))
+        assert os.path.isfile(os.path.join(cache.path(spec), "lib.typ"))
+
+    def test_transitive_imports(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        cache.install(_tarball(extra={"dep.typ": b'#import "@preview/base:1.0.0"'}))
+        assert cache.missing([IMPORT]) == [PackageSpec("preview", "base", "1.0.0")]
+
+    def test_rejects_unsafe_paths(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        with pytest.raises(PackageError, match="Unsafe path"):
+            cache.install(_tarball(extra={"../evil.typ": b""}))
+
+    def test_rejects_missing_manifest(self, tmp_path):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as archive:
+            info = tarfile.TarInfo("lib.typ")
+            archive.addfile(info, io.BytesIO(b""))
+        buf.seek(0)
+        with pytest.raises(PackageError, match="typst.toml"):
+            PackageCache(str(tmp_path)).install(buf)
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        old, _ = cache.install(_tarball("old"))
+        os.utime(cache.path(old), (1, 1))
+        size = cache.stats()["bytes"]
+        cache.max_bytes = size + size // 2
+        new, _ = cache.install(_tarball("new"))
+        assert not cache.has(old)
+        assert cache.has(new)
+        assert cache.evictions == 1
+
+    def test_most_used(self, tmp_path):
+        cache = PackageCache(str(tmp_path))
+        first, _ = cache.install(_tarball("first"))
+        second, _ = cache.install(_tarball("second"))
+        os.utime(cache.path(first), (1, 1))
+        assert cache.most_used(1) == [second]
+
+
+class TestPackageRoutes:
+    def test_seed_list_and_delete(self, client, cache):
+        response = client.put(
+            "/packages", data=_tarball().read(), content_type="application/gzip"
+        )
+        assert response.status_code == 201
+        assert response.get_json()["package"] == "@preview/hello:0.1.0"
+
+        response = client.post(
+            "/packages",
+            data={"file": (_tarball(), "hello.tar.gz")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+
+        listed = client.get("/packages").get_json()
+        assert [p["package"] for p in listed["packages"]] == ["@preview/hello:0.1.0"]
+
+        assert client.delete("/packages/preview/hello/0.1.0").status_code == 200
+        assert client.delete("/packages/preview/hello/0.1.0").status_code == 404
+
+    def test_invalid_archive(self, client, cache):
+        response = client.put("/packages", data=b"nope", content_type="application/gzip")
+        assert response.status_code == 400
+
+    def test_render_with_cached_package(self, client, cache):
+        cache.install(_tarball())
+        response = client.post("/render/raw", json={"source": IMPORT.decode()})
+        assert response.status_code == 200
+        assert response.data[:4] == b"%PDF"
+
+    def test_packages_are_warmed_after_init(self, app, cache):
+        from typst_api.services.compiler import compiler_service
+
+        cache.install(_tarball())
+        compiler_service.init_app(app)
+        pool = compiler_service.compiler_pool
+        assert pool.warm_packages == ["@preview/hello:0.1.0"]
+        # Not in init_app: it may run in a server master before the fork
+        assert not pool.warmed
+        compiler_service.warm()
+        assert pool.warmed
+
+    def test_missing_package_is_reported(self, client, cache):
+        response = client.post("/render/raw", json={"source": IMPORT.decode()})
+        assert response.status_code == 422
+        assert response.get_json()["missing"] == ["@preview/hello:0.1.0"]
+
+
+class TestPackagesCommand:
+    def test_seed_and_list(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setenv("TYPST_API_PACKAGE_DIR", str(tmp_path))
+        tarball = tmp_path / "hello.tar.gz"
+        tarball.write_bytes(_tarball().read())
+        main(["packages", "seed", str(tarball)])
+        main(["packages", "list"])
+        out = capsys.readouterr().out
+        assert "@preview/hello:0.1.0 installed" in out
+        assert "@preview/hello:0.1.0\t" in out
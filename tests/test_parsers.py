@@ -0,0 +1,72 @@
+"""Tests for input parsing helpers."""
+
+from typst_api.utils.parsers import (
+    format_outputs,
+    parse_archive,
+    parse_outputs,
+    parse_pages,
+    parse_records,
+    resolve_pages,
+)
+
+
+class TestParsePages:
+    def test_absent(self):
+        assert parse_pages(None) == (None, None)
+        assert parse_pages("") == (None, None)
+
+    def test_all(self):
+        assert parse_pages("all") == ([(1, None)], None)
+
+    def test_ranges(self):
+        assert parse_pages("1-3, 7, 9-") == ([(1, 3), (7, 7), (9, None)], None)
+
+    def test_invalid(self):
+        for value in ("0", "3-1", "a-b", "1,,2"):
+            ranges, err = parse_pages(value)
+            assert ranges is None
+            assert "Invalid pages" in err
+
+
+class TestResolvePages:
+    def test_clamps_to_page_count(self):
+        assert resolve_pages([(2, None)], 4) == [2, 3, 4]
+        assert resolve_pages([(3, 10)], 4) == [3, 4]
+        assert resolve_pages([(9, 9)], 4) == []
+
+    def test_deduplicates(self):
+        assert resolve_pages([(1, 2), (2, 3), (1, 1)], 5) == [1, 2, 3]
+
+
+class TestParseArchive:
+    def test_default_and_invalid(self):
+        assert parse_archive(None) == ("zip", None)
+        assert parse_archive("MULTIPART") == ("multipart", None)
+        assert parse_archive("tar") == (None, "tar")
+        assert parse_archive(1) == (None, "1")
+
+
+class TestParseOutputs:
+    def test_formats_and_ppi(self):
+        outputs, err = parse_outputs("pdf, PNG@72,png,pdf", default_ppi=96)
+        assert err is None
+        assert outputs == [("pdf", 144.0), ("png", 72.0), ("png", 96.0)]
+        assert format_outputs(outputs) == "pdf,png@72,png@96"
+
+    def test_absent_and_invalid(self):
+        assert parse_outputs(None) == (None, None)
+        assert parse_outputs("gif")[1] == "Unsupported output: gif"
+        assert parse_outputs({"pdf": 1})[1] is not None
+
+
+class TestParseRecords:
+    def test_json_array_and_ndjson(self):
+        assert parse_records('[{"a": 1}]') == ([{"a": "1"}], None)
+        assert parse_records(b'{"a": 1}\n\n{"b": "x"}\n') == ([{"a": "1"}, {"b": "x"}], None)
+        assert parse_records([{"a": True}]) == ([{"a": "True"}], None)
+
+    def test_invalid(self):
+        assert parse_records(None)[1] == "No records provided"
+        assert parse_records("[]")[1] == "No records provided"
+        assert parse_records("{bad")[1] == "Invalid JSON in records"
+        assert parse_records("[1]")[1] == "Record 0 must be a JSON object"
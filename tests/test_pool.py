@@ -0,0 +1,119 @@
+"""Tests for the warm compiler pool."""
+
+import os
+import threading
+
+import pytest
+
+from typst_api.services.pool import WARMUP_SOURCE, CompilerPool, load_warmup_documents
+
+
+class TestCompilerPool:
+    def test_reuses_instances(self):
+        pool = CompilerPool(size=2)
+        for _ in range(5):
+            assert pool.compile(b"Hello", format="pdf")[:5] == b"%PDF-"
+        assert pool.stats()["created"] == 1
+
+    def test_disabled_pool_compiles_cold(self):
+        pool = CompilerPool(size=0)
+        assert pool.compile(b"Hello", format="pdf")[:5] == b"%PDF-"
+        assert pool.stats()["created"] == 0
+
+    def test_sys_inputs_do_not_leak_between_compiles(self):
+        pool = CompilerPool(size=1)
+        source = b'#sys.inputs.at("x", default: "unset")'
+        with_input = pool.compile(source, format="svg", sys_inputs={"x": "set"})
+        without = pool.compile(source, format="svg")
+        assert with_input != without
+        assert without == CompilerPool(size=0).compile(source, format="svg")
+
+    def test_root_does_not_leak_between_compiles(self, tmp_path):
+        (tmp_path / "lib.typ").write_text("#let x = 1")
+        pool = CompilerPool(size=1)
+        source = b'#import "lib.typ": x\n#x'
+        pool.compile(source, root=str(tmp_path), format="svg")
+        try:
+            pool.compile(source, format="svg")
+        except Exception as e:
+            assert "not found" in str(e)
+        else:
+            raise AssertionError("raw compile resolved a file from a previous root")
+
+    def test_recycles_after_max_uses(self):
+        pool = CompilerPool(size=1, max_uses=2)
+        with pool.compiler() as first:
+            pass
+        with pool.compiler() as second:
+            pass
+        with pool.compiler() as third:
+            pass
+        assert first is second
+        assert third is not first
+
+    def test_failed_recycle_keeps_the_slot(self, monkeypatch):
+        pool = CompilerPool(size=1, max_uses=1)
+        with pool.compiler() as first:
+            monkeypatch.setattr(pool, "new_compiler", lambda: 1 / 0)
+        with pool.compiler() as second:
+            pass
+        assert second is first
+        assert pool.stats()["idle"] == 1
+
+    def test_nothing_is_downloaded_into_the_package_dir(self, tmp_path):
+        pool = CompilerPool(package_dir=str(tmp_path))
+        # A spec built at runtime, which the import pre-scan cannot see
+        source = b'#import "@preview/" + "cetz:0.3.2"'
+        with pytest.raises(Exception):
+            pool.compile(source, format="pdf")
+        assert os.listdir(tmp_path) == []
+
+    def test_bounded_under_concurrency(self):
+        pool = CompilerPool(size=2)
+        errors = []
+
+        def work():
+            try:
+                pool.compile(b"Hello", format="svg")
+            except Exception as e:  # pragma: no cover - surfaced below
+                errors.append(e)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert pool.stats()["created"] <= 2
+
+
+class TestWarmup:
+    def test_load_documents(self, tmp_path):
+        (tmp_path / "b.typ").write_text("B")
+        (tmp_path / "a.typ").write_text("A")
+        (tmp_path / "notes.txt").write_text("skip")
+        single = tmp_path / "sub"
+        single.mkdir()
+        (single / "c.typ").write_text("C")
+
+        documents = load_warmup_documents(
+            [str(tmp_path), str(single / "c.typ"), str(tmp_path / "missing.typ")]
+        )
+        assert documents == [
+            (WARMUP_SOURCE, None),
+            (b"A", str(tmp_path)),
+            (b"B", str(tmp_path)),
+            (b"C", str(single)),
+        ]
+        assert load_warmup_documents(None) == [(WARMUP_SOURCE, None)]
+
+    def test_warm_compiles_documents_in_each_format(self):
+        pool = CompilerPool(
+            size=2,
+            warm_documents=[(WARMUP_SOURCE, None), (b"#broken(", None)],
+            warm_formats=["pdf", "png"],
+        )
+        pool.warm()
+        assert pool.warmed
+        assert pool.stats()["created"] == 2
+        assert pool.stats()["idle"] == 2
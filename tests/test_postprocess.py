@@ -0,0 +1,159 @@
+"""Tests for post-export stages and SVG content encoding."""
+
+import gzip
+import xml.dom.minidom
+
+import pytest
+
+from typst_api.services import postprocess
+from typst_api.services.metrics import metrics
+from typst_api.services.postprocess import (
+    PostProcessError,
+    available_encodings,
+    minify_svg,
+    postprocessed_key,
+    resolve_stages,
+)
+
+SOURCE = "#set page(width: 10cm, height: 5cm)\n= Title\nHello *World* $x^2 + y^2$"
+
+
+def _compile(output_format):
+    import typst
+
+    pages = typst.compile(SOURCE.encode(), format=output_format, ppi=72)
+    return pages[0] if isinstance(pages, list) else pages
+
+
+class TestResolveStages:
+    def test_string_and_list(self):
+        assert resolve_stages("minify, minify", ["svg"]) == ["minify"]
+        assert resolve_stages(["MINIFY"], ["svg"]) == ["minify"]
+        assert resolve_stages("", ["svg"]) is None
+
+    def test_unknown_stage(self):
+        with pytest.raises(PostProcessError, match="Unknown postprocess stage"):
+            resolve_stages("shrink", ["svg"])
+
+    def test_stage_must_apply_to_a_format(self):
+        with pytest.raises(PostProcessError, match="svg output only"):
+            resolve_stages("minify", ["pdf"])
+        assert resolve_stages("minify", ["pdf", "svg"]) == ["minify"]
+
+    def test_missing_dependency_is_501(self, monkeypatch):
+        monkeypatch.setattr(postprocess, "_pikepdf", lambda: None)
+        with pytest.raises(PostProcessError) as info:
+            resolve_stages("linearize", ["pdf"])
+        assert info.value.status_code == 501
+
+    def test_key_depends_on_stages(self):
+        assert postprocessed_key("k", []) == "k"
+        assert postprocessed_key("k", ["optimize"]) != postprocessed_key("k", ["quantize"])
+
+
+class TestStages:
+    def test_minify_svg(self):
+        svg = _compile("svg")
+        minified = minify_svg(svg)
+        assert len(minified) < len(svg)
+        document = xml.dom.minidom.parseString(minified)
+        ids = {e.getAttribute("id") for e in document.getElementsByTagName("*")} - {""}
+        for use in document.getElementsByTagName("use"):
+            assert use.getAttribute("xlink:href")[1:] in ids
+
+    def test_minify_svg_keeps_what_rendering_depends_on(self):
+        svg = (
+            b'<svg xmlns="http://www.w3.org/2000/svg"><g fill-rule="evenodd">'
+            b'<path id="glyph-long-name" data-id="label" data-d="a  b" '
+            b'fill-rule="nonzero" d="M 0 0 L 1 1"/></g></svg>'
+        )
+        minified = minify_svg(svg)
+        assert b'data-id="label"' in minified
+        assert b'data-d="a  b"' in minified
+        assert b'id="g0"' in minified and b'd="M0 0L1 1"' in minified
+        # Overrides the inherited evenodd, so it must stay
+        assert b'fill-rule="nonzero"' in minified
+        assert b'fill-rule="nonzero"' not in minify_svg(svg.replace(b"evenodd", b"nonzero"))
+
+    @pytest.mark.parametrize("stage", ["optimize", "quantize"])
+    def test_png_never_grows(self, stage):
+        pytest.importorskip("PIL")
+        png = _compile("png")
+        result = postprocess.STAGES[stage].run(png)
+        assert result.startswith(b"\x89PNG")
+        assert len(result) <= len(png)
+
+    def test_linearize_pdf(self):
+        pytest.importorskip("pikepdf")
+        result = postprocess.linearize_pdf(_compile("pdf"))
+        assert b"/Linearized" in result[:1024]
+
+    def test_available_encodings(self, monkeypatch):
+        monkeypatch.setattr(postprocess, "_brotli", lambda: None)
+        assert available_encodings(["br", "gzip", "zstd"]) == ["gzip"]
+
+
+class TestRenderPostprocess:
+    def test_minified_render_is_cached_and_derived(self, client):
+        plain = client.post("/render/raw", json={"source": SOURCE, "format": "svg"})
+        assert plain.headers["X-Render-Cache"] == "miss"
+
+        compiles = metrics.compiles.value(format="svg")
+        body = {"source": SOURCE, "format": "svg", "postprocess": "minify"}
+        response = client.post("/render/raw", json=body)
+        assert response.status_code == 200
+        assert response.headers["X-Render-Cache"] == "derived"
+        assert len(response.data) < len(plain.data)
+        assert metrics.compiles.value(format="svg") == compiles
+
+        response = client.post("/render/raw", json=body)
+        assert response.headers["X-Render-Cache"] == "hit"
+
+    def test_stage_for_another_format_is_skipped_in_outputs(self, client):
+        response = client.post(
+            "/render/raw",
+            json={"source": SOURCE, "outputs": "pdf,svg", "postprocess": ["minify"]},
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {"format": "pdf", "postprocess": "minify"},
+            {"format": "svg", "postprocess": "nope"},
+        ],
+    )
+    def test_invalid_stages(self, client, body):
+        response = client.post("/render/raw", json={"source": SOURCE, **body})
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_stored_link_keeps_stages(self, client, store):
+        response = client.post(
+            "/render/raw", json={"source": SOURCE, "format": "svg", "postprocess": "minify"}
+        )
+        assert "postprocess=minify" in response.headers["Content-Location"]
+
+
+class TestContentEncoding:
+    def test_svg_is_gzipped_for_accepting_clients(self, client, monkeypatch):
+        monkeypatch.setattr(postprocess, "_brotli", lambda: None)
+        client.application.config["RENDER_CONTENT_ENCODINGS"] = ["br", "gzip"]
+        from typst_api.services.compiler import compiler_service
+
+        compiler_service.init_app(client.application)
+        body = {"source": SOURCE, "format": "svg"}
+        plain = client.post("/render/raw", json=body)
+        assert "Content-Encoding" not in plain.headers
+        assert "Accept-Encoding" in plain.headers["Vary"]
+
+        response = client.post("/render/raw", json=body, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(response.data) == plain.data
+        assert response.headers["ETag"] != plain.headers["ETag"]
+
+    def test_other_formats_are_not_encoded(self, client):
+        response = client.post(
+            "/render/raw", json={"source": SOURCE}, headers={"Accept-Encoding": "gzip"}
+        )
+        assert "Content-Encoding" not in response.headers
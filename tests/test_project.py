@@ -0,0 +1,67 @@
+"""Tests for in-memory project loading."""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from typst_api.services.project import ProjectError, ProjectFiles, normalize_path
+
+
+def make_zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+class TestNormalizePath:
+    def test_relative_paths(self):
+        assert normalize_path("main.typ") == "main.typ"
+        assert normalize_path("./a/../b/c.typ") == "b/c.typ"
+
+    def test_escaping_paths_rejected(self):
+        assert normalize_path("../etc/passwd") is None
+        assert normalize_path("/etc/passwd") is None
+        assert normalize_path("a/../../b") is None
+
+
+class TestProjectFiles:
+    def test_from_zip(self):
+        project = ProjectFiles.from_zip(make_zip({"main.typ": "hi", "img/a.txt": "x"}))
+        assert project.files == {"main.typ": b"hi", "img/a.txt": b"x"}
+
+    def test_bad_zip(self):
+        with pytest.raises(zipfile.BadZipFile):
+            ProjectFiles.from_zip(io.BytesIO(b"not a zip"))
+
+    def test_entry_limit(self):
+        with pytest.raises(ProjectError) as exc:
+            ProjectFiles.from_zip(make_zip({"a": "1", "b": "2", "c": "3"}), max_entries=2)
+        assert exc.value.status_code == 413
+
+    def test_uncompressed_size_limit(self):
+        bomb = make_zip({"main.typ": "0" * 100_000})
+        with pytest.raises(ProjectError) as exc:
+            ProjectFiles.from_zip(bomb, max_bytes=1000)
+        assert exc.value.status_code == 413
+
+    def test_traversal_member_rejected(self):
+        with pytest.raises(ProjectError):
+            ProjectFiles.from_zip(make_zip({"../evil.typ": "x"}))
+
+    def test_digest_ignores_archive_order(self):
+        a = ProjectFiles.from_zip(make_zip({"a": "1", "b": "2"}))
+        b = ProjectFiles.from_zip(make_zip({"b": "2", "a": "1"}))
+        assert a.digest() == b.digest()
+        assert a.digest() != ProjectFiles({"a": b"1", "b": b"3"}).digest()
+
+    def test_materialize_cleans_up(self, tmp_path):
+        project = ProjectFiles({"main.typ": b"hi", "lib/x.typ": b"x"})
+        with project.materialize(str(tmp_path)) as root:
+            with open(os.path.join(root, "lib", "x.typ"), "rb") as f:
+                assert f.read() == b"x"
+        assert not os.path.exists(root)
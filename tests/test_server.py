@@ -0,0 +1,77 @@
+"""Tests for production server configuration."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from typst_api.server import gunicorn_options
+
+
+class TestGunicornOptions:
+    def test_defaults(self, app):
+        options = gunicorn_options(app)
+        assert options["bind"] == "0.0.0.0:8000"
+        assert options["worker_class"] == "gthread"
+        assert options["preload_app"] is True
+        assert options["workers"] >= 1
+
+    def test_env_override(self, monkeypatch):
+        from typst_api import create_app
+
+        monkeypatch.setenv("TYPST_API_SERVER_WORKERS", "3")
+        monkeypatch.setenv("TYPST_API_SERVER_BIND", "127.0.0.1:9000")
+        options = gunicorn_options(create_app("testing"))
+        assert options["workers"] == 3
+        assert options["bind"] == "127.0.0.1:9000"
+
+    def test_async_worker_class(self, app):
+        options = gunicorn_options(app, asynchronous=True)
+        assert options["worker_class"] == "uvicorn_worker.UvicornWorker"
+
+
+class TestServe:
+    @pytest.mark.parametrize("preload, master_apps", [("true", 1), ("false", 0)])
+    def test_master_builds_the_app_only_when_preloading(
+        self, monkeypatch, preload, master_apps
+    ):
+        import typst_api
+        from gunicorn.app.base import BaseApplication
+
+        from typst_api.server import serve
+
+        built = []
+        monkeypatch.setenv("TYPST_API_SERVER_PRELOAD", preload)
+        monkeypatch.setattr(typst_api, "create_app", lambda name: built.append(name) or name)
+        monkeypatch.setattr(BaseApplication, "run", lambda self: built.append("run"))
+        serve("testing")
+        assert built == ["testing"] * master_apps + ["run"]
+
+
+# Forks after create_app() like a preloading gunicorn master, then warms up
+# and renders in the child as a worker would
+FORK_SCRIPT = """
+import os
+import signal
+from typst_api import create_app
+from typst_api.services.compiler import compiler_service
+
+app = create_app("default")
+pid = os.fork()
+if pid == 0:
+    signal.alarm(45)  # a hung child must not outlive the test
+    compiler_service.warm()
+    response = app.test_client().post("/render/raw", json={"source": "Hello"})
+    os._exit(0 if response.status_code == 200 else 1)
+_, status = os.waitpid(pid, 0)
+raise SystemExit(os.waitstatus_to_exitcode(status))
+"""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_workers_compile_after_fork(tmp_path):
+    # A fresh interpreter: this one has compiled already, which is what hangs
+    env = dict(os.environ, TYPST_API_TEMPLATE_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, "-c", FORK_SCRIPT], env=env, timeout=60)
+    assert result.returncode == 0
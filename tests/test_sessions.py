@@ -0,0 +1,228 @@
+"""Tests for live preview sessions."""
+
+import pytest
+
+from typst_api.services.compiler import CompileOptions
+from typst_api.services.executor import CompileError
+from typst_api.services.project import ProjectFiles
+from typst_api.services.sessions import SessionError, SessionService, _apply_edits
+
+TWO_PAGES = "#set page(width: 8cm, height: 4cm)\nFirst\n#pagebreak()\nSecond"
+
+
+@pytest.fixture
+def service(app):
+    service = SessionService()
+    service.init_app(app)
+    yield service
+    service.close_all()
+
+
+def _project(source=TWO_PAGES):
+    return ProjectFiles({"main.typ": source.encode()})
+
+
+class TestApplyEdits:
+    def test_sequential_edits(self):
+        assert _apply_edits("Hello World", [
+            {"start": 6, "end": 11, "text": "Typst"},
+            {"start": 0, "end": 0, "text": "> "},
+        ]) == "> Hello Typst"
+
+    def test_out_of_range(self):
+        with pytest.raises(SessionError):
+            _apply_edits("abc", [{"start": 2, "end": 9, "text": ""}])
+
+    def test_malformed_edit(self):
+        with pytest.raises(SessionError):
+            _apply_edits("abc", [{"start": "x", "end": 1}])
+
+
+class TestSessionService:
+    def test_only_changed_pages_reported(self, service):
+        session, changed = service.create(_project(), "main.typ", CompileOptions("svg"))
+        assert changed == [1, 2]
+        start = TWO_PAGES.index("Second")
+        _, changed = service.update(
+            session.id, edits=[{"start": start, "end": start + 6, "text": "Zweite"}]
+        )
+        assert changed == [2]
+        assert session.version == 1
+
+    def test_unchanged_source_reports_nothing(self, service):
+        session, _ = service.create(_project(), "main.typ", CompileOptions("svg"))
+        _, changed = service.update(session.id, source=TWO_PAGES)
+        assert changed == []
+
+    def test_edit_imported_file(self, service):
+        project = ProjectFiles(
+            {
+                "main.typ": b'#import "lib.typ": name\nHello #name',
+                "lib.typ": b'#let name = "A"',
+            }
+        )
+        session, _ = service.create(project, "main.typ", CompileOptions("svg"))
+        before = session.page_hashes[0]
+        _, changed = service.update(session.id, path="lib.typ", source='#let name = "B"')
+        assert changed == [1]
+        assert session.page_hashes[0] != before
+
+    def test_compile_error_keeps_last_pages(self, service):
+        session, _ = service.create(_project(), "main.typ", CompileOptions("svg"))
+        pages = list(session.pages)
+        with pytest.raises(CompileError):
+            service.update(session.id, source="#let x = ")
+        assert session.pages == pages
+        assert session.error
+        assert session.version == 1
+
+    def test_version_mismatch(self, service):
+        session, _ = service.create(_project(), "main.typ", CompileOptions("svg"))
+        with pytest.raises(SessionError) as e:
+            service.update(session.id, source="x", version=5)
+        assert e.value.status_code == 409
+
+    def test_session_cap(self, service):
+        service.max_sessions = 1
+        service.create(_project(), "main.typ", CompileOptions("svg"))
+        with pytest.raises(SessionError) as e:
+            service.create(_project(), "main.typ", CompileOptions("svg"))
+        assert e.value.status_code == 503
+
+    def test_idle_sessions_expire(self, service):
+        service.ttl = 60
+        session, _ = service.create(_project(), "main.typ", CompileOptions("svg"))
+        session.last_used -= 120
+        assert service.get(session.id) is None
+
+    def test_failed_create_is_not_kept(self, service):
+        with pytest.raises(CompileError):
+            service.create(_project("#let x = "), "main.typ", CompileOptions("svg"))
+        assert list(service.collect_metrics())[0][3] == [({}, 0)]
+
+
+class TestSessionRoutes:
+    def test_lifecycle(self, client):
+        resp = client.post("/sessions", json={"source": TWO_PAGES})
+        assert resp.status_code == 201
+        data = resp.get_json()
+        assert data["format"] == "svg"
+        assert data["changed"] == [1, 2]
+        assert resp.headers["Location"] == data["session_url"]
+        session_id = data["id"]
+
+        resp = client.patch(
+            f"/sessions/{session_id}",
+            json={"source": TWO_PAGES.replace("First", "Erste"), "version": 0},
+        )
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["changed"] == [1]
+        assert [p["page"] for p in data["pages"]] == [1]
+        assert data["version"] == 1
+
+        resp = client.get(f"/sessions/{session_id}/pages/2")
+        assert resp.status_code == 200
+        assert resp.mimetype == "image/svg+xml"
+        etag = resp.headers["ETag"]
+        resp = client.get(
+            f"/sessions/{session_id}/pages/2", headers={"If-None-Match": etag}
+        )
+        assert resp.status_code == 304
+
+        assert client.delete(f"/sessions/{session_id}").status_code == 200
+        assert client.get(f"/sessions/{session_id}").status_code == 404
+
+    def test_zip_session(self, client, multi_file_zip):
+        resp = client.post(
+            "/sessions",
+            data={"file": (multi_file_zip, "project.zip"), "format": "png"},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 201
+        data = resp.get_json()
+        assert data["files"] == ["lib.typ", "main.typ"]
+        resp = client.patch(
+            f"/sessions/{data['id']}",
+            json={"path": "lib.typ", "source": "#let greet(name) = [Hi, #name!]"},
+        )
+        assert resp.get_json()["changed"] == [1]
+
+    def test_pdf_rejected(self, client):
+        resp = client.post("/sessions", json={"source": "Hi", "format": "pdf"})
+        assert resp.status_code == 400
+
+    def test_compile_error_returns_version(self, client):
+        session_id = client.post("/sessions", json={"source": "Hi"}).get_json()["id"]
+        resp = client.patch(f"/sessions/{session_id}", json={"source": "#let x = "})
+        assert resp.status_code == 500
+        assert resp.get_json()["version"] == 1
+
+    def test_missing_package_is_rejected_before_applying(self, client):
+        session_id = client.post("/sessions", json={"source": "Hi"}).get_json()["id"]
+        source = '#import "@preview/nope-not-cached:0.1.0"'
+        resp = client.patch(f"/sessions/{session_id}", json={"source": source})
+        assert resp.status_code == 422
+        assert resp.get_json()["missing"] == ["@preview/nope-not-cached:0.1.0"]
+        assert client.get(f"/sessions/{session_id}").get_json()["version"] == 0
+
+        resp = client.post("/sessions", json={"source": source})
+        assert resp.status_code == 422
+
+    def test_invalid_patch(self, client):
+        session_id = client.post("/sessions", json={"source": "Hi"}).get_json()["id"]
+        resp = client.patch(f"/sessions/{session_id}", json={"edits": "nope"})
+        assert resp.status_code == 400
+        assert client.patch("/sessions/missing", json={"source": "x"}).status_code == 404
+
+    def test_page_out_of_range(self, client):
+        session_id = client.post("/sessions", json={"source": "Hi"}).get_json()["id"]
+        assert client.get(f"/sessions/{session_id}/pages/3").status_code == 404
+
+    def test_session_cap_returns_retry_after(self, app, client):
+        from typst_api.services.sessions import session_service
+
+        session_service.max_sessions = 1
+        client.post("/sessions", json={"source": "Hi"})
+        resp = client.post("/sessions", json={"source": "Hi"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+
+    def test_process_backend_enforces_limits(self, app, client):
+        from typst_api.services.compiler import compiler_service
+
+        app.config.update(
+            COMPILE_BACKEND="process",
+            COMPILE_WORKERS=1,
+            COMPILE_ROUTE_LIMITS={"/sessions/<session_id>": {"timeout": 0.5}},
+        )
+        compiler_service.init_app(app)
+        try:
+            resp = client.post("/sessions", json={"source": TWO_PAGES})
+            assert resp.status_code == 201
+            assert [p["page"] for p in resp.get_json()["pages"]] == [1, 2]
+            session_id = resp.get_json()["id"]
+            slow = "#let x = 0\n#for i in range(50000000) { x += 1 }\n#x"
+            resp = client.patch(f"/sessions/{session_id}", json={"source": slow})
+            assert resp.status_code == 504
+            assert resp.get_json()["code"] == "compile_timeout"
+            assert resp.get_json()["version"] == 1
+            # The last good pages are kept
+            assert client.get(f"/sessions/{session_id}/pages/2").status_code == 200
+        finally:
+            compiler_service.backend.shutdown()
+
+    def test_refused_edit_is_not_applied(self, app, client):
+        from typst_api.services.admission import admission_service
+
+        session_id = client.post("/sessions", json={"source": "Hi"}).get_json()["id"]
+        app.config.update(ADMISSION_MAX_IN_FLIGHT=1, ADMISSION_QUEUE_MAX=0)
+        admission_service.init_app(app)
+        with admission_service.controller.slot():
+            resp = client.patch(f"/sessions/{session_id}", json={"source": "Bye"})
+        assert resp.status_code == 503
+        session = client.get(f"/sessions/{session_id}").get_json()
+        assert session["version"] == 0
+        # The retried edit still matches the version it was computed against
+        resp = client.patch(f"/sessions/{session_id}", json={"source": "Bye", "version": 0})
+        assert resp.status_code == 200
@@ -0,0 +1,45 @@
+"""Tests for request body spooling."""
+
+import io
+import socket
+
+from typst_api.utils.streams import SpoolingRequest, disconnect_checker, spool_stream
+
+
+class TestSpoolStream:
+    def test_small_body_stays_in_memory(self):
+        spool = spool_stream(io.BytesIO(b"x" * 100), max_memory=1024, chunk_size=16)
+        assert not spool._rolled
+        assert spool.read() == b"x" * 100
+
+    def test_large_body_rolls_over(self, tmp_path):
+        data = b"y" * 5000
+        spool = spool_stream(io.BytesIO(data), max_memory=1024, dir=str(tmp_path))
+        assert spool._rolled
+        assert spool.read() == data
+
+
+class TestSpoolingRequest:
+    def test_file_parts_use_configured_threshold(self, app):
+        app.config["UPLOAD_SPOOL_MAX_MEMORY"] = 1234
+        with app.test_request_context():
+            stream = SpoolingRequest({})._get_file_stream(10**6, "application/zip")
+        assert stream._max_size == 1234
+
+
+class TestDisconnectChecker:
+    def test_detects_closed_peer(self):
+        server, client = socket.socketpair()
+        try:
+            disconnected = disconnect_checker({"gunicorn.socket": server})
+            assert not disconnected()
+            client.sendall(b"GET / HTTP/1.1\r\n")  # pipelined data is not a hang-up
+            assert not disconnected()
+            server.recv(64)
+            client.close()
+            assert disconnected()
+        finally:
+            server.close()
+
+    def test_unknown_server(self):
+        assert disconnect_checker({}) is None
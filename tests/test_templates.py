@@ -0,0 +1,173 @@
+"""Tests for the template registry."""
+
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+from typst_api import create_app
+from typst_api.services.templates import template_service
+
+# One page per ``pages`` input
+INPUTS_SOURCE = (
+    "#set page(width: 10cm, height: 5cm)\n"
+    '#for i in range(int(sys.inputs.at("pages", default: "1"))) [Page #i #pagebreak(weak: true)]'
+)
+FILE_SOURCE = (
+    '#import "../lib/page.typ": page-for\n'
+    '#let data = json("/data.json")\n'
+    "#for name in data.names [#page-for(name)]"
+)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("TYPST_API_TEMPLATE_DIR", str(tmp_path / "templates"))
+    return create_app("testing")
+
+
+def _file_template_zip():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("src/main.typ", FILE_SOURCE)
+        zf.writestr(
+            "lib/page.typ",
+            "#let page-for(name) = [#set page(width: 10cm, height: 5cm)\n"
+            "Hello #name #pagebreak(weak: true)]",
+        )
+    buf.seek(0)
+    return buf
+
+
+def _register_file_template(client, sample):
+    return client.put(
+        "/templates/letter",
+        data={
+            "file": (_file_template_zip(), "letter.zip"),
+            "entrypoint": "src/main.typ",
+            "data": "file",
+            "sample": json.dumps(sample),
+        },
+        content_type="multipart/form-data",
+    )
+
+
+class TestRegister:
+    def test_register_and_list(self, client):
+        response = client.put(
+            "/templates/report", json={"source": INPUTS_SOURCE, "sample": {"pages": 2}}
+        )
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body["version"] == 1
+        assert body["sample"] == {"pages": 2}
+        assert response.headers["Location"] == "/templates/report/1"
+
+        listed = client.get("/templates").get_json()
+        assert [t["name"] for t in listed["templates"]] == ["report"]
+        assert client.get("/templates/report/1").get_json()["digest"] == body["digest"]
+
+    def test_versions_are_immutable(self, client):
+        first = client.put("/templates/report", json={"source": INPUTS_SOURCE})
+        again = client.put("/templates/report", json={"source": INPUTS_SOURCE})
+        assert again.status_code == 200
+        assert again.get_json()["version"] == 1
+
+        changed = client.put("/templates/report", json={"source": INPUTS_SOURCE + "\nv2"})
+        assert changed.status_code == 201
+        assert changed.get_json()["version"] == 2
+        versions = client.get("/templates/report").get_json()
+        assert versions["latest"] == 2
+        assert versions["versions"][0]["digest"] == first.get_json()["digest"]
+
+        response = client.post("/templates/report/render", json={"version": 1})
+        assert response.headers["X-Template-Version"] == "1"
+
+    def test_broken_template_is_not_registered(self, client):
+        response = client.put("/templates/broken", json={"source": "#let x = ("})
+        assert response.status_code == 422
+        assert "details" in response.get_json()
+        assert client.get("/templates/broken").status_code == 404
+
+    @pytest.mark.parametrize(
+        "name, body",
+        [
+            ("../etc", {}),
+            ("report", {"data": "yaml"}),
+            ("report", {"data": "file", "data_path": "sub/data.json"}),
+            ("report", {"sample": ["not", "an", "object"]}),
+        ],
+    )
+    def test_invalid_registration(self, client, name, body):
+        response = client.put(f"/templates/{name}", json={"source": INPUTS_SOURCE, **body})
+        assert response.status_code in (400, 404)
+
+    def test_warm_documents_use_the_sample(self, client):
+        client.put("/templates/report", json={"source": INPUTS_SOURCE, "sample": {"pages": 2}})
+        [(input, root, sys_inputs)] = template_service.warm_documents()
+        assert input == os.path.join(root, "main.typ")
+        assert sys_inputs == {"pages": "2"}
+
+
+class TestRender:
+    def test_inputs_mode(self, client):
+        client.put("/templates/report", json={"source": INPUTS_SOURCE, "sample": {"pages": 2}})
+
+        body = {"data": {"pages": 3}, "format": "svg"}
+        response = client.post("/templates/report/render", json=body)
+        assert response.status_code == 200
+        assert response.mimetype == "image/svg+xml"
+        assert response.headers["X-Page-Count"] == "3"
+        assert response.headers["X-Render-Cache"] == "miss"
+
+        again = client.post("/templates/report/render", json=body)
+        assert again.headers["X-Render-Cache"] == "hit"
+        assert again.headers["ETag"] == response.headers["ETag"]
+
+        sample = client.post("/templates/report/render", json={"format": "svg"})
+        assert sample.headers["X-Page-Count"] == "2"
+
+    def test_file_mode_lays_data_over_the_stored_tree(self, client):
+        registered = _register_file_template(client, {"names": ["A"]})
+        assert registered.status_code == 201
+
+        response = client.post(
+            "/templates/letter/render?format=svg", json={"data": {"names": ["A", "B", "C"]}}
+        )
+        assert response.status_code == 200
+        assert response.headers["X-Page-Count"] == "3"
+
+        # The stored sample is untouched and used when no data is sent
+        response = client.post("/templates/letter/render?format=svg")
+        assert response.headers["X-Page-Count"] == "1"
+
+    def test_options_from_query(self, client):
+        client.put("/templates/report", json={"source": INPUTS_SOURCE})
+        response = client.post(
+            "/templates/report/render?format=png&ppi=72", json={"data": {"pages": 2}}
+        )
+        assert response.mimetype == "image/png"
+
+    @pytest.mark.parametrize(
+        "body, status",
+        [
+            ({"version": 9}, 404),
+            ({"version": "x"}, 400),
+            ({"data": ["pages"]}, 400),
+            ({"format": "docx"}, 400),
+            # Non-string options in the JSON body
+            ({"format": 2}, 400),
+            ({"format": ["pdf"]}, 400),
+            ({"format": "svg", "pages": "1-2", "archive": 1}, 400),
+            ({"outputs": "pdf,svg", "archive": ["zip"]}, 400),
+        ],
+    )
+    def test_errors(self, client, body, status):
+        client.put("/templates/report", json={"source": INPUTS_SOURCE})
+        response = client.post("/templates/report/render", json=body)
+        assert response.status_code == status
+
+    def test_unknown_template(self, client):
+        assert client.post("/templates/nope/render", json={}).status_code == 404
@@ -0,0 +1,130 @@
+"""Tests for first-page thumbnails."""
+
+import pytest
+
+from typst_api.services import thumbnails
+from typst_api.services.metrics import metrics
+from typst_api.services.thumbnails import (
+    ThumbnailError,
+    ThumbnailOptions,
+    covers,
+    encode,
+    fit_ppi,
+    page_size,
+    png_dimensions,
+)
+
+# 10cm x 5cm: 283.46pt x 141.73pt
+SOURCE = "#set page(width: 10cm, height: 5cm)\nHello\n#pagebreak()\nWorld"
+
+
+def _compiles():
+    return metrics.compiles.value(format="png")
+
+
+class TestPageSize:
+    @pytest.mark.parametrize("output_format", ["pdf", "svg", "png"])
+    def test_from_render(self, output_format):
+        import typst
+
+        pages = typst.compile(SOURCE.encode(), format=output_format, ppi=72)
+        page = pages[0] if isinstance(pages, list) else pages
+        width, height = page_size(page, output_format, 72)
+        assert width == pytest.approx(283.46, abs=1)
+        assert height == pytest.approx(141.73, abs=1)
+
+    def test_fit_ppi(self):
+        assert fit_ppi((144, 72), ThumbnailOptions(width=100, height=100)) == 50
+        assert fit_ppi((144, 72), ThumbnailOptions(width=None, height=100)) == 100
+
+    def test_covers(self):
+        png = b"\x89PNG\r\n\x1a\n" + b"\0\0\0\rIHDR" + (200).to_bytes(4, "big") * 2
+        assert png_dimensions(png) == (200, 200)
+        assert covers(png, ThumbnailOptions(width=100, height=300))
+        assert not covers(png, ThumbnailOptions(width=300, height=300))
+
+    def test_webp_needs_pillow(self, monkeypatch):
+        monkeypatch.setattr(thumbnails, "pillow", lambda: None)
+        with pytest.raises(ThumbnailError) as excinfo:
+            encode(b"", ThumbnailOptions(format="webp"))
+        assert excinfo.value.status_code == 501
+
+
+class TestThumbnailRoutes:
+    def test_first_page_fits_box(self, client):
+        response = client.post("/render/thumbnail", json={"source": SOURCE, "width": 100})
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert png_dimensions(response.data) == (100, 50)
+
+    def test_cached_thumbnail_and_derived_sizes(self, client):
+        pytest.importorskip("PIL")
+        response = client.post("/render/thumbnail", json={"source": SOURCE})
+        assert response.headers["X-Render-Cache"] == "miss"
+        compiles = _compiles()
+
+        response = client.post("/render/thumbnail", json={"source": SOURCE})
+        assert response.headers["X-Render-Cache"] == "hit"
+        # Another size comes from the cached base render without compiling
+        response = client.post("/render/thumbnail", json={"source": SOURCE, "height": 40})
+        assert response.headers["X-Render-Cache"] == "derived"
+        assert png_dimensions(response.data)[1] == 40
+        assert _compiles() == compiles
+
+    def test_derived_from_cached_pdf(self, client):
+        pytest.importorskip("PIL")
+        client.post("/render/raw", json={"source": SOURCE})
+        compiles = _compiles()
+        response = client.post("/render/thumbnail", json={"source": SOURCE, "width": 50})
+        assert response.headers["X-Render-Cache"] == "miss"
+        assert png_dimensions(response.data) == (50, 25)
+        # One rasterisation at the fitted PPI, no base render
+        assert _compiles() == compiles + 1
+
+    def test_without_pillow_renders_at_fitted_ppi(self, client, monkeypatch):
+        from typst_api.services import compiler
+
+        monkeypatch.setattr(thumbnails, "pillow", lambda: None)
+        monkeypatch.setattr(compiler, "pillow", lambda: None)
+        response = client.post("/render/thumbnail", json={"source": SOURCE, "width": 120})
+        assert response.status_code == 200
+        assert png_dimensions(response.data) == (120, 60)
+
+    @pytest.mark.parametrize("output_format,magic", [("jpeg", b"\xff\xd8"), ("webp", b"RIFF")])
+    def test_encodings(self, client, output_format, magic):
+        pytest.importorskip("PIL")
+        response = client.post(
+            "/render/thumbnail",
+            json={"source": SOURCE, "format": output_format, "quality": 50},
+        )
+        assert response.status_code == 200
+        assert response.mimetype == f"image/{output_format}"
+        assert response.data.startswith(magic)
+
+    def test_zip_upload(self, client, sample_zip):
+        response = client.post(
+            "/render/thumbnail",
+            data={"file": (sample_zip, "p.zip"), "width": "64"},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert png_dimensions(response.data)[0] == 64
+
+    @pytest.mark.parametrize(
+        "body",
+        [{"width": 0}, {"height": "big"}, {"quality": 101}, {"format": "gif"}],
+    )
+    def test_invalid_params(self, client, body):
+        response = client.post("/render/thumbnail", json={"source": SOURCE, **body})
+        assert response.status_code == 400
+
+    def test_stored_thumbnail_is_cacheable(self, client, store):
+        location = client.post("/render/raw", json={"source": SOURCE}).headers[
+            "Content-Location"
+        ]
+        url = location.split("?")[0] + "/thumbnail?width=80"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert "immutable" in response.headers["Cache-Control"]
+        response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304